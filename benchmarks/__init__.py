@@ -0,0 +1 @@
+"""Offline benchmarks against a simulated iTerm2."""
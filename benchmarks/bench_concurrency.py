@@ -0,0 +1,142 @@
+"""Concurrency benchmark: small calls while a huge buffer is being read.
+
+One session of a ``FakeITerm`` holds a multi-MB buffer with color escapes,
+which ``--readers`` tasks read in a loop (``iterm_read_output`` and
+``iterm_watch_session``). Meanwhile a probe sends ``iterm_send_keys`` to
+another session every ``--probe-interval`` seconds. The probe latency and
+the event-loop lag (the ``loop.lag`` metric) are reported with stage
+offloading off and on. With ``--max-p95-ms``, the run fails if the probe
+p95 with offloading exceeds it::
+
+    python -m benchmarks.bench_concurrency --lines 100000 --duration 5
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from iterm2_mcp import applescript, backends, metrics, offload, topology
+from iterm2_mcp._server import mcp
+from iterm2_mcp.tools import register_all
+
+from .fake_iterm import FakeITerm
+from .run_benchmarks import _percentile
+
+register_all(mcp)
+
+
+def _ms(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "p50_ms": round(1000 * _percentile(values, 0.50), 3),
+        "p95_ms": round(1000 * _percentile(values, 0.95), 3),
+        "p99_ms": round(1000 * _percentile(values, 0.99), 3),
+        "max_ms": round(1000 * (values[-1] if values else 0.0), 3),
+    }
+
+
+async def one_mode(
+    threshold: int,
+    lines: int,
+    readers: int,
+    duration: float,
+    probe_interval: float,
+    time_scale: float,
+) -> dict:
+    """Run the probe against concurrent huge reads at one offload threshold."""
+    # A screen as tall as the buffer, so AppleScript reads see all of it
+    fake = FakeITerm(sessions=2, buffer_lines=100, time_scale=time_scale, screen_lines=lines)
+    huge, small = fake.windows[0]["tabs"][0][:2]
+    huge["contents"] = [
+        f"\x1b[32m[{j:06d}]\x1b[0m step {j}: compiling \x1b[1mmodule_{j % 97}.c\x1b[0m ... ok"
+        for j in range(lines)
+    ]
+    backends.set_backend(backends.create("applescript"))
+    applescript.set_executor(fake.execute)
+    topology.reset()
+    offload.THRESHOLD = threshold
+    metrics.enable(True)
+    metrics.ensure_lag_monitor()
+
+    stop = asyncio.Event()
+    reads: list[float] = []
+    probes: list[float] = []
+
+    async def reader(i: int):
+        tool = "iterm_read_output" if i % 2 == 0 else "iterm_watch_session"
+        args = {"identifier": huge["id"]}
+        if tool == "iterm_read_output":
+            args["lines"] = lines
+        while not stop.is_set():
+            start = time.perf_counter()
+            await mcp.call_tool(tool, args)
+            reads.append(time.perf_counter() - start)
+
+    async def probe():
+        args = {"identifier": small["id"], "keys": "ctrl+c"}
+        while not stop.is_set():
+            start = time.perf_counter()
+            await mcp.call_tool("iterm_send_keys", args)
+            probes.append(time.perf_counter() - start)
+            await asyncio.sleep(probe_interval)
+
+    # Resolve both sessions once so the probe measures steady state, and
+    # let the lag sample spanning this setup finish before resetting
+    await mcp.call_tool("iterm_list_sessions", {})
+    await asyncio.sleep(2 * metrics.LAG_INTERVAL)
+    metrics.reset()
+    tasks = [asyncio.create_task(reader(i)) for i in range(readers)]
+    tasks.append(asyncio.create_task(probe()))
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    lag = metrics.snapshot()["operations"].get("loop.lag", {})
+    metrics.enable(False)
+    applescript.set_executor(None)
+    backends.set_backend(None)
+    return {
+        "offload_threshold": threshold,
+        "buffer_bytes": sum(len(line) + 1 for line in huge["contents"]),
+        "reads": len(reads),
+        "read": _ms(reads),
+        "probes": len(probes),
+        "probe": _ms(probes),
+        "loop_lag": {k: lag.get(k, 0.0) for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")},
+    }
+
+
+async def run(lines: int, readers: int, duration: float, probe_interval: float, time_scale: float) -> dict:
+    threshold = offload.THRESHOLD or 64 * 1024
+    return {
+        "config": {"lines": lines, "readers": readers, "duration_s": duration,
+                   "probe_interval_s": probe_interval, "time_scale": time_scale},
+        "inline": await one_mode(0, lines, readers, duration, probe_interval, time_scale),
+        "offloaded": await one_mode(threshold, lines, readers, duration, probe_interval, time_scale),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100000, help="lines in the huge buffer")
+    parser.add_argument("--readers", type=int, default=2, help="concurrent huge-read loops")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per mode")
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    parser.add_argument("--time-scale", type=float, default=0.1,
+                        help="multiplier for simulated iTerm2 delays (0 = none)")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="fail if the offloaded probe p95 exceeds this")
+    args = parser.parse_args(argv)
+    results = asyncio.run(run(args.lines, args.readers, args.duration, args.probe_interval, args.time_scale))
+    print(json.dumps(results, indent=2))
+    if args.max_p95_ms is not None and results["offloaded"]["probe"]["p95_ms"] > args.max_p95_ms:
+        print(f"Probe p95 {results['offloaded']['probe']['p95_ms']}ms > {args.max_p95_ms}ms",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Session-inventory benchmark: list_all_sessions from 10 to 1,000 sessions.
+
+Runs the enumeration script against ``FakeITerm`` at each size and
+reports the simulated end-to-end latency (spawn, Apple Events, transfer
+and parsing), the parse time alone, the result size and the Apple Events
+per call::
+
+    python -m benchmarks.bench_inventory --sessions 10,30,100,300,1000
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from iterm2_mcp import applescript
+
+from .fake_iterm import FakeITerm
+from .run_benchmarks import _int_list, _percentile
+
+
+async def bench_size(session_count: int, calls: int, time_scale: float) -> dict:
+    """Time ``calls`` inventory scans of a ``session_count``-session fake."""
+    fake = FakeITerm(sessions=session_count, buffer_lines=1, time_scale=time_scale)
+    results: list[str] = []
+
+    async def execute(script: str) -> str:
+        results.append(await fake.execute(script))
+        return results[-1]
+
+    applescript.set_executor(execute)
+    latencies = []
+    try:
+        for _ in range(calls):
+            start = time.perf_counter()
+            sessions = await applescript.list_all_sessions()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        applescript.set_executor(None)
+    if len(sessions) != session_count:
+        raise SystemExit(f"Inventory returned {len(sessions)} of {session_count} sessions.")
+
+    raw = results[-1]
+    parse = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        applescript._parse_sessions(applescript.parse_source(raw))
+        parse.append(time.perf_counter() - start)
+
+    latencies.sort()
+    parse.sort()
+    return {
+        "sessions": session_count,
+        "windows": len(fake.windows),
+        "calls": calls,
+        "p50_ms": round(1000 * _percentile(latencies, 0.50), 3),
+        "p95_ms": round(1000 * _percentile(latencies, 0.95), 3),
+        "parse_p50_ms": round(1000 * _percentile(parse, 0.50), 3),
+        "result_bytes": len(raw),
+        # Two window properties plus three bulk fetches per window
+        "apple_events_per_call": 5 * len(fake.windows),
+    }
+
+
+async def run(session_counts: list[int], calls: int, time_scale: float) -> dict:
+    results = [await bench_size(n, calls, time_scale) for n in session_counts]
+    return {
+        "config": {"sessions": session_counts, "calls": calls, "time_scale": time_scale},
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=_int_list, default=[10, 30, 100, 300, 1000])
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="multiplier for simulated iTerm2 delays (0 = none)")
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args.sessions, args.calls, args.time_scale)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Startup benchmark: spawn ``server.py`` and time it up to its first tool calls.
+
+Each run starts a fresh server process over stdio, using the API backend
+against ``FakeApiServer`` so it works anywhere. It measures the time to
+the ``initialize`` response and to ``tools/list``, then after ``--think``
+seconds (an agent's first turn) the first ``iterm_list_sessions`` call
+and the median of the following ones. Runs alternate with the warm-up
+off and on (``ITERM_MCP_WARMUP``) and report the server's own startup
+phase times from ``iterm_stats``::
+
+    python -m benchmarks.bench_startup --runs 5 --sessions 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from .fake_api_server import FakeApiServer
+from .fake_iterm import FakeITerm
+from .run_benchmarks import _percentile
+
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server.py")
+
+
+class _Client:
+    """Minimal newline-delimited JSON-RPC client over a process's stdio."""
+
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self.proc = proc
+        self._ids = iter(range(1, 1 << 30))
+
+    async def notify(self, method: str, params: dict | None = None) -> None:
+        message = {"jsonrpc": "2.0", "method": method, "params": params or {}}
+        self.proc.stdin.write(json.dumps(message).encode() + b"\n")
+        await self.proc.stdin.drain()
+
+    async def request(self, method: str, params: dict | None = None) -> dict:
+        request_id = next(self._ids)
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}
+        self.proc.stdin.write(json.dumps(message).encode() + b"\n")
+        await self.proc.stdin.drain()
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                raise RuntimeError("server.py exited; see its stderr.")
+            reply = json.loads(line)
+            if reply.get("id") == request_id:
+                if "error" in reply:
+                    raise RuntimeError(f"{method}: {reply['error']}")
+                return reply["result"]
+
+    async def call(self, tool: str, arguments: dict | None = None) -> dict:
+        return await self.request("tools/call", {"name": tool, "arguments": arguments or {}})
+
+
+async def one_run(socket_path: str, warmup: bool, think: float, calls: int) -> dict:
+    env = dict(
+        os.environ,
+        ITERM_MCP_BACKEND="api",
+        ITERM_MCP_API_ADDRESS=socket_path,
+        ITERM_MCP_WARMUP="1" if warmup else "0",
+    )
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, SERVER,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        env=env,
+    )
+    client = _Client(proc)
+    try:
+        await client.request("initialize", {
+            "protocolVersion": "2025-06-18",
+            "capabilities": {},
+            "clientInfo": {"name": "bench_startup", "version": "0"},
+        })
+        initialize = time.perf_counter() - start
+        await client.notify("notifications/initialized")
+        await client.request("tools/list")
+        tools_list = time.perf_counter() - start
+
+        await asyncio.sleep(think)
+        latencies = []
+        for _ in range(calls + 1):
+            t = time.perf_counter()
+            await client.call("iterm_list_sessions", {"fields": "session_id"})
+            latencies.append(time.perf_counter() - t)
+        stats = json.loads((await client.call("iterm_stats"))["content"][0]["text"])
+    finally:
+        proc.stdin.close()
+        try:
+            await asyncio.wait_for(proc.wait(), 5)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+
+    steady = sorted(latencies[1:])
+    return {
+        "warmup": warmup,
+        "initialize_ms": round(1000 * initialize, 3),
+        "tools_list_ms": round(1000 * tools_list, 3),
+        "first_call_ms": round(1000 * latencies[0], 3),
+        "steady_call_ms": round(1000 * _percentile(steady, 0.50), 3),
+        "server": stats.get("startup", {}),
+    }
+
+
+def _summary(runs: list[dict]) -> dict:
+    keys = ("initialize_ms", "tools_list_ms", "first_call_ms", "steady_call_ms")
+    summary = {k: round(_percentile(sorted(r[k] for r in runs), 0.50), 3) for k in keys}
+    phases = {k for r in runs for k, v in r["server"].items() if isinstance(v, (int, float))}
+    for k in sorted(phases):
+        summary[f"server.{k}"] = round(_percentile(sorted(r["server"][k] for r in runs if k in r["server"]), 0.50), 3)
+    return summary
+
+
+async def run(runs: int, session_count: int, think: float, calls: int, time_scale: float) -> dict:
+    fake = FakeITerm(sessions=session_count, buffer_lines=100, time_scale=time_scale)
+    with tempfile.TemporaryDirectory(prefix="iterm2-mcp-startup-") as workdir:
+        path = os.path.join(workdir, "api.sock")
+        server = await FakeApiServer(fake, time_scale=time_scale).start(path)
+        try:
+            results = []
+            for _ in range(runs):
+                for warmup in (False, True):
+                    results.append(await one_run(path, warmup, think, calls))
+        finally:
+            await server.close()
+    return {
+        "config": {"runs": runs, "sessions": session_count, "think_s": think,
+                   "calls": calls, "time_scale": time_scale},
+        "cold": _summary([r for r in results if not r["warmup"]]),
+        "warm": _summary([r for r in results if r["warmup"]]),
+        "runs": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--think", type=float, default=0.5,
+                        help="seconds between tools/list and the first call")
+    parser.add_argument("--calls", type=int, default=5, help="calls after the first one")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="multiplier for simulated iTerm2 delays (0 = none)")
+    args = parser.parse_args(argv)
+    results = asyncio.run(run(args.runs, args.sessions, args.think, args.calls, args.time_scale))
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
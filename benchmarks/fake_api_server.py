@@ -0,0 +1,283 @@
+"""Local stand-in for iTerm2's Python API server.
+
+``FakeApiServer`` speaks the iTerm2 API protocol (protobuf messages over a
+websocket on a Unix socket) and answers the requests the ``api`` backend
+makes from a ``FakeITerm`` model, including screen-update notifications
+when text is sent to a subscribed session. Each request counts towards
+``fake.scripts_run`` so round trips can be compared with osascript runs.
+
+Run it standalone to point a server at it::
+
+    python -m benchmarks.fake_api_server --sessions 10 --socket /tmp/fake-iterm2.sock
+    ITERM_MCP_BACKEND=api ITERM_MCP_API_ADDRESS=/tmp/fake-iterm2.sock python server.py
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+
+from iterm2 import api_pb2 as pb
+from websockets.asyncio.server import unix_serve
+from websockets.exceptions import ConnectionClosed
+
+from .fake_iterm import PROMPT, FakeITerm
+
+# Seconds; scaled by ``time_scale``
+DEFAULT_DELAYS = {
+    "request": 0.0003,   # websocket round trip + main-thread dispatch in iTerm2
+    "per_kb": 0.00001,   # result transfer
+}
+
+# Connection open/close chatter from websockets is not interesting here
+_log = logging.getLogger(__name__)
+_log.setLevel(logging.WARNING)
+
+_SET_NAME = re.compile(r'^iterm2\.set_name\(name: "((?:[^"\\]|\\.)*)"\)$')
+
+
+def _unescape(text: str) -> str:
+    return re.sub(r'\\(.)', r"\1", text)
+
+
+class FakeApiServer:
+    """Serve a ``FakeITerm`` over the iTerm2 API protocol."""
+
+    def __init__(self, fake: FakeITerm, delays: dict | None = None, time_scale: float = 1.0):
+        self.fake = fake
+        self.delays = dict(DEFAULT_DELAYS, **(delays or {}))
+        self.time_scale = time_scale
+        self._server = None
+        self._subscribers: dict[str, set] = {}
+
+    async def start(self, path: str) -> "FakeApiServer":
+        self._server = await unix_serve(
+            self._handle, path, subprotocols=["api.iterm2.com"], max_size=None, logger=_log,
+        )
+        return self
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # ── Model lookups ──
+
+    def _find(self, session_id: str):
+        for w, t_index, tab, s in self.fake.all_sessions():
+            if s["id"] == session_id:
+                return w, tab, s
+        return None, None, None
+
+    @staticmethod
+    def _tab_id(window: dict, index: int) -> str:
+        return f"{window['id']}.{index}"
+
+    # ── Connection handling ──
+
+    async def _handle(self, ws) -> None:
+        try:
+            async for data in ws:
+                request = pb.ClientOriginatedMessage.FromString(data)
+                self.fake.scripts_run += 1
+                response = self._dispatch(request, ws)
+                payload = response.SerializeToString()
+                if self.time_scale:
+                    d = self.delays
+                    await asyncio.sleep((d["request"] + d["per_kb"] * len(payload) / 1024) * self.time_scale)
+                await ws.send(payload)
+        except ConnectionClosed:
+            pass
+        finally:
+            for connections in self._subscribers.values():
+                connections.discard(ws)
+
+    def _notify_screen(self, session_id: str) -> None:
+        message = pb.ServerOriginatedMessage(notification=pb.Notification(
+            screen_update_notification=pb.ScreenUpdateNotification(session=session_id),
+        ))
+        payload = message.SerializeToString()
+        for ws in list(self._subscribers.get(session_id, ())):
+            asyncio.ensure_future(ws.send(payload))
+
+    def _dispatch(self, request, ws):
+        kind = request.WhichOneof("submessage")
+        handler = getattr(self, f"_{kind}", None)
+        response = pb.ServerOriginatedMessage(id=request.id)
+        if handler is None:
+            response.error = f"fake iTerm2 does not implement {kind}"
+            return response
+        handler(getattr(request, kind), response, ws)
+        return response
+
+    # ── Requests ──
+
+    def _list_sessions_request(self, request, response, ws) -> None:
+        out = response.list_sessions_response
+        for w in self.fake.windows:
+            window = out.windows.add(window_id=w["id"])
+            for index, tab_sessions in enumerate(w["tabs"], start=1):
+                tab = window.tabs.add(tab_id=self._tab_id(w, index))
+                tab.root.vertical = True
+                for s in tab_sessions:
+                    tab.root.links.add().session.CopyFrom(
+                        pb.SessionSummary(unique_identifier=s["id"], title=s["name"]),
+                    )
+                if tab_sessions:
+                    tab.active_session_id = tab_sessions[0]["id"]
+            if w["tabs"]:
+                window.selected_tab_id = self._tab_id(w, 1)
+
+    def _variable_request(self, request, response, ws) -> None:
+        out = response.variable_response
+        _, _, s = self._find(request.session_id)
+        if s is None:
+            out.status = pb.VariableResponse.Status.Value("SESSION_NOT_FOUND")
+            return
+        for name in request.get:
+            out.values.append(json.dumps(s.get(name)))
+
+    def _get_property_request(self, request, response, ws) -> None:
+        out = response.get_property_response
+        _, _, s = self._find(request.session_id)
+        if s is None or request.name != "number_of_lines":
+            out.status = pb.GetPropertyResponse.Status.Value("INVALID_TARGET")
+            return
+        n = len(s["contents"])
+        grid = min(n, self.fake.screen_lines)
+        out.json_value = json.dumps({
+            "overflow": 0, "history": n - grid, "grid": grid, "first_visible": n - grid,
+        })
+
+    def _get_buffer_request(self, request, response, ws) -> None:
+        out = response.get_buffer_response
+        _, _, s = self._find(request.session)
+        if s is None:
+            out.status = pb.GetBufferResponse.Status.Value("SESSION_NOT_FOUND")
+            return
+        coords = request.line_range.windowed_coord_range.coord_range
+        for text in s["contents"][coords.start.y:coords.end.y]:
+            out.contents.add(text=text)
+
+    def _send_text_request(self, request, response, ws) -> None:
+        _, _, s = self._find(request.session)
+        if s is None:
+            response.send_text_response.status = pb.SendTextResponse.Status.Value("SESSION_NOT_FOUND")
+            return
+        text = request.text
+        if "\x03" in text:
+            s["contents"][-1] += "^C"
+            s["contents"].append(PROMPT)
+        elif text.endswith("\r"):
+            self.fake.type_text(s, text[:-1])
+        else:
+            s["contents"][-1] += text
+        self._notify_screen(s["id"])
+
+    def _create_tab_request(self, request, response, ws) -> None:
+        out = response.create_tab_response
+        window = next((w for w in self.fake.windows if w["id"] == request.window_id), None)
+        if request.window_id and window is None:
+            out.status = pb.CreateTabResponse.Status.Value("INVALID_WINDOW_ID")
+            return
+        window = window or self.fake._new_window()
+        session = self.fake._new_session()
+        window["tabs"].append([session])
+        out.window_id = window["id"]
+        out.tab_id = len(window["tabs"])
+        out.session_id = session["id"]
+
+    def _split_pane_request(self, request, response, ws) -> None:
+        out = response.split_pane_response
+        _, tab, s = self._find(request.session)
+        if s is None:
+            out.status = pb.SplitPaneResponse.Status.Value("SESSION_NOT_FOUND")
+            return
+        session = self.fake._new_session()
+        tab.append(session)
+        out.session_id.append(session["id"])
+
+    def _reorder_tabs_request(self, request, response, ws) -> None:
+        out = response.reorder_tabs_response
+        tabs = {
+            self._tab_id(w, index): tab
+            for w in self.fake.windows for index, tab in enumerate(w["tabs"], start=1)
+        }
+        windows = {w["id"]: w for w in self.fake.windows}
+        for assignment in request.assignments:
+            if assignment.window_id not in windows:
+                out.status = pb.ReorderTabsResponse.Status.Value("INVALID_WINDOW_ID")
+                return
+            if any(tab_id not in tabs for tab_id in assignment.tab_ids):
+                out.status = pb.ReorderTabsResponse.Status.Value("INVALID_TAB_ID")
+                return
+        moved = {tab_id for a in request.assignments for tab_id in a.tab_ids}
+        for w in self.fake.windows:
+            w["tabs"] = [
+                tab for index, tab in enumerate(w["tabs"], start=1)
+                if self._tab_id(w, index) not in moved
+            ]
+        for assignment in request.assignments:
+            windows[assignment.window_id]["tabs"] = [tabs[tab_id] for tab_id in assignment.tab_ids]
+        # Windows left without tabs close, as in iTerm2
+        self.fake.windows = [w for w in self.fake.windows if w["tabs"]]
+
+    def _invoke_function_request(self, request, response, ws) -> None:
+        out = response.invoke_function_response
+        m = _SET_NAME.match(request.invocation)
+        _, _, s = self._find(request.method.receiver)
+        if m is None or s is None:
+            out.error.status = pb.InvokeFunctionResponse.Status.Value(
+                "INVALID_ID" if m else "REQUEST_MALFORMED",
+            )
+            out.error.error_reason = "fake iTerm2 cannot invoke " + request.invocation
+            return
+        s["name"] = _unescape(m.group(1))
+        out.success.json_result = "null"
+
+    def _activate_request(self, request, response, ws) -> None:
+        _, _, s = self._find(request.session_id)
+        status = "OK" if s is not None else "BAD_IDENTIFIER"
+        response.activate_response.status = pb.ActivateResponse.Status.Value(status)
+
+    def _notification_request(self, request, response, ws) -> None:
+        out = response.notification_response
+        if request.notification_type != pb.NotificationType.Value("NOTIFY_ON_SCREEN_UPDATE"):
+            out.status = pb.NotificationResponse.Status.Value("REQUEST_MALFORMED")
+            return
+        _, _, s = self._find(request.session)
+        if s is None:
+            out.status = pb.NotificationResponse.Status.Value("SESSION_NOT_FOUND")
+            return
+        connections = self._subscribers.setdefault(request.session, set())
+        if request.subscribe:
+            connections.add(ws)
+        else:
+            connections.discard(ws)
+
+
+async def _serve(args) -> None:
+    fake = FakeITerm(sessions=args.sessions, buffer_lines=args.buffer_lines, time_scale=0)
+    server = await FakeApiServer(fake, time_scale=args.time_scale).start(args.socket)
+    print(f"Serving {args.sessions} fake sessions on {args.socket}")
+    try:
+        await asyncio.Future()
+    finally:
+        await server.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default="/tmp/fake-iterm2.sock")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--buffer-lines", type=int, default=100)
+    parser.add_argument("--time-scale", type=float, default=0.0)
+    try:
+        asyncio.run(_serve(parser.parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Simulated iTerm2 scripting backend for offline benchmarks.
+
+``FakeITerm`` models windows, tabs and sessions (with name, TTY and
+buffer contents) and answers the AppleScript snippets this server
+generates, with per-call delays modelled on osascript: a fixed spawn
+cost, a cost per session the script scans, and a cost per KB returned.
+Install it with ``applescript.set_executor(fake.execute)``.
+
+As in iTerm2, a session's ``contents`` property is only the screen: the
+last ``screen_lines`` lines of its buffer. The rest is history, which
+only the API backend can read. ``SyntheticHistory`` serves a history of
+millions of lines without holding them in memory.
+"""
+
+import asyncio
+import re
+import tempfile
+from pathlib import Path
+
+# Seconds; scaled by ``time_scale``
+DEFAULT_DELAYS = {
+    "spawn": 0.025,          # osascript process start + script compile
+    "per_session": 0.00002,  # one Apple Event per session visited
+    "per_kb": 0.00001,       # result transfer
+}
+
+PROMPT = "user@bench:~/proj$ "
+CONTINUATION = "> "
+
+# Rows on screen; the rest of a session's contents is history
+SCREEN_LINES = 24
+
+_FIND = re.compile(r'if id of s is "((?:[^"\\]|\\.)*)" then')
+_WRITE_TEXT = re.compile(r'write text "((?:[^"\\]|\\.)*)"')
+_SET_NAME = re.compile(r'set name to "((?:[^"\\]|\\.)*)"')
+_ASCII_KEY = re.compile(r"write text \(ASCII character (\d+)\)(?: & \"([^\"]*)\")?")
+_WINDOW_ID = re.compile(r"tell window id (\S+)")
+_RANGE = re.compile(r"set a to (\d+)\s+set b to (\d+)")
+_PRINTF_SENTINEL = re.compile(r"printf '\\n%s %s exit=%d\\n' (\S+) (\S+) \$\?$")
+_FALLBACK = re.compile(r'\n    return "([^"]*)"\nend tell\s*$')
+
+
+def _source(value) -> str:
+    """Render a value the way ``osascript -ss`` prints results."""
+    if isinstance(value, list):
+        return "{" + ", ".join(_source(v) for v in value) + "}"
+    if isinstance(value, str):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return str(value)
+
+
+def _unescape(text: str) -> str:
+    return re.sub(r'\\(.)', r"\1", text)
+
+
+class FakeITerm:
+    """An in-memory iTerm2 with realistic per-script latency."""
+
+    # Distinguishes session IDs across instances so per-session caches in
+    # the server never see a recycled ID
+    _instances = 0
+
+    def __init__(
+        self,
+        sessions: int = 1,
+        buffer_lines: int = 100,
+        panes_per_tab: int = 4,
+        tabs_per_window: int = 10,
+        delays: dict | None = None,
+        time_scale: float = 1.0,
+        tty_dir: str | None = None,
+        screen_lines: int = SCREEN_LINES,
+    ):
+        self.delays = dict(DEFAULT_DELAYS, **(delays or {}))
+        self.time_scale = time_scale
+        self.buffer_lines = buffer_lines
+        self.screen_lines = screen_lines
+        self._initial_contents = [
+            f"[{j:06d}] step {j}: compiling module_{j % 97}.c ... ok"
+            for j in range(buffer_lines - 1)
+        ] + [PROMPT]
+        self.tty_dir = Path(tty_dir or tempfile.mkdtemp(prefix="fake-iterm-"))
+        self.windows: list[dict] = []
+        self.scripts_run = 0
+        FakeITerm._instances += 1
+        self._instance = FakeITerm._instances
+        self._next_session = 0
+        self._next_window = 1000
+        for i in range(sessions):
+            if i % (panes_per_tab * tabs_per_window) == 0:
+                self._new_window()
+            window = self.windows[-1]
+            if i % panes_per_tab == 0:
+                window["tabs"].append([])
+            window["tabs"][-1].append(self._new_session())
+
+    # ── Model ──
+
+    def _new_window(self) -> dict:
+        self._next_window += 1
+        window = {"id": str(self._next_window), "name": f"bench {self._next_window}", "tabs": []}
+        self.windows.append(window)
+        return window
+
+    def _new_session(self) -> dict:
+        i = self._next_session
+        self._next_session += 1
+        tty = self.tty_dir / f"ttys{i:03d}"
+        tty.touch()
+        return {
+            "id": f"{self._instance:08X}-0000-4000-8000-{i:012d}",
+            "name": f"session-{i}",
+            "tty": str(tty),
+            "contents": list(self._initial_contents),
+        }
+
+    def all_sessions(self):
+        """Yield ``(window, tab_index, tab, session)`` in iTerm2 order."""
+        for w in self.windows:
+            for t_index, tab in enumerate(w["tabs"], start=1):
+                for s in tab:
+                    yield w, t_index, tab, s
+
+    def screen(self, session: dict) -> list[str]:
+        """The lines of *session* on screen (what ``contents`` returns)."""
+        return session["contents"][-self.screen_lines:]
+
+    def find(self, session_id: str):
+        """Return ``(window, tab, session, scanned)`` for *session_id*."""
+        scanned = 0
+        for w, _, tab, s in self.all_sessions():
+            scanned += 1
+            if s["id"] == session_id:
+                return w, tab, s, scanned
+        return None, None, None, scanned
+
+    def type_text(self, session: dict, text: str) -> None:
+        """Simulate typing *text* + Enter at the session's prompt.
+
+        Understands ``;``-separated ``echo``, ``true``, ``false`` and the
+        job runner's ``{ ... }`` group and ``printf`` sentinel over several
+        lines; ``sleep`` never returns, so nothing after it runs. Anything
+        else prints nothing and succeeds.
+        """
+        contents = session["contents"]
+        lines = text.split("\n")
+        contents[-1] = PROMPT + lines[0]
+        contents.extend(CONTINUATION + line for line in lines[1:])
+        status = 0
+        for command in "; ".join(lines).split("; "):
+            command = command.removeprefix("{ ").strip()
+            if command == "}":
+                continue
+            if command.startswith("sleep"):
+                return
+            if command.startswith("echo "):
+                contents.append(command[5:].strip().strip("'\""))
+                status = 0
+            elif command == "false":
+                status = 1
+            elif command.startswith("printf "):
+                m = _PRINTF_SENTINEL.match(command)
+                if m:
+                    contents.extend(["", f"{m.group(1)} {m.group(2)} exit={status}"])
+            else:
+                status = 0
+        contents.append(PROMPT)
+
+    # ── Script execution ──
+
+    async def _delay(self, scanned: int, output: str) -> None:
+        d = self.delays
+        seconds = d["spawn"] + d["per_session"] * scanned + d["per_kb"] * len(output) / 1024
+        if self.time_scale:
+            await asyncio.sleep(seconds * self.time_scale)
+
+    async def execute(self, script: str) -> str:
+        """Run one generated AppleScript snippet against the model."""
+        self.scripts_run += 1
+        output, scanned = self._dispatch(script)
+        await self._delay(scanned, output)
+        return output
+
+    def _dispatch(self, script: str) -> tuple[str, int]:
+        if "id of every session of every tab of w" in script:
+            # Five Apple Events per window: two properties, three bulk fetches
+            return self._list(), 5 * len(self.windows)
+        if "create window with default profile" in script:
+            return self._create_window(), 1
+        if "create tab with default profile" in script:
+            return self._create_tab(script)
+        m = _FIND.search(script)
+        if m:
+            return self._on_session(script, _unescape(m.group(1)))
+        if "split vertically" in script or "split horizontally" in script:
+            w = self.windows[0]
+            return self._split(w["tabs"][0]), 1
+        raise RuntimeError(f"AppleScript error: fake iTerm2 cannot run script:\n{script}")
+
+    def _list(self) -> str:
+        """Per window ``{id, name, ids, names, ttys}``, as ``osascript -ss`` prints it."""
+        return _source([
+            [
+                int(w["id"]),
+                w["name"],
+                [[s["id"] for s in tab] for tab in w["tabs"]],
+                [[s["name"] for s in tab] for tab in w["tabs"]],
+                [[s["tty"] for s in tab] for tab in w["tabs"]],
+            ]
+            for w in self.windows
+        ])
+
+    def _create_tab(self, script: str) -> tuple[str, int]:
+        m = _WINDOW_ID.search(script)
+        window = next((w for w in self.windows if w["id"] == m.group(1)), None) if m else None
+        window = window or (self.windows[0] if self.windows else self._new_window())
+        session = self._new_session()
+        window["tabs"].append([session])
+        return f'{session["id"]}||{session["tty"]}', 1
+
+    def _create_window(self) -> str:
+        window = self._new_window()
+        session = self._new_session()
+        window["tabs"].append([session])
+        return f'{window["id"]}||{session["id"]}||{session["tty"]}'
+
+    def _split(self, tab: list) -> str:
+        session = self._new_session()
+        tab.append(session)
+        return f'{session["id"]}||{session["tty"]}'
+
+    def _on_session(self, script: str, session_id: str) -> tuple[str, int]:
+        window, tab, s, scanned = self.find(session_id)
+        if s is None:
+            fallback = _FALLBACK.search(script)
+            return (fallback.group(1) if fallback else ""), scanned
+
+        if "return contents" in script:
+            return "\n".join(self.screen(s)), scanned
+        if "set c to contents of s" in script:
+            a, b = (int(x) for x in _RANGE.search(script).groups())
+            screen = self.screen(s)
+            n = len(screen)
+            b = min(b, n)
+            if a > b:
+                return str(n), scanned
+            return str(n) + "\n" + "\n".join(screen[a - 1:b]) + "\n.", scanned
+        if "return tty of s" in script:
+            return s["tty"], scanned
+        if "split vertically" in script or "split horizontally" in script:
+            return self._split(tab), scanned
+        if "tell t to select" in script:
+            return "focused", scanned
+        m = _SET_NAME.search(script)
+        if m:
+            s["name"] = _unescape(m.group(1))
+            return "renamed", scanned
+        m = _WRITE_TEXT.search(script)
+        if m and "ASCII character" not in script:
+            self.type_text(s, _unescape(m.group(1)))
+            return "sent", scanned
+        keys = _ASCII_KEY.findall(script)
+        if keys or "write text" in script:
+            if any(code == "3" for code, _ in keys):
+                s["contents"][-1] += "^C"
+                s["contents"].append(PROMPT)
+            return "sent", scanned
+        raise RuntimeError(f"AppleScript error: fake iTerm2 cannot run script:\n{script}")
+
+
+class SyntheticHistory:
+    """A ``scrollback.HistorySource`` serving generated lines on demand.
+
+    Every session has *lines* lines of history, of which only the newest
+    *retained* are kept (all of them if None), like iTerm2's scrollback
+    limit. The last *unserved* lines are counted in ``end_line`` but never
+    returned, as when a source reports more lines than it can read.
+    ``fetches`` counts calls to ``fetch``.
+    """
+
+    def __init__(self, lines: int = 5_000_000, retained: int | None = None, unserved: int = 0):
+        self.end = lines
+        self.retained = retained
+        self.unserved = unserved
+        self.fetches = 0
+
+    @staticmethod
+    def line(n: int) -> str:
+        """The text of absolute line *n*."""
+        return f"\x1b[32m[{n:09d}]\x1b[0m step {n}: compiling module_{n % 97}.c ... ok"
+
+    def append(self, count: int) -> None:
+        """Add *count* lines of output, evicting the oldest past ``retained``."""
+        self.end += count
+
+    async def fetch(self, session_id: str, start: int, count: int) -> tuple[int, int, list[str]]:
+        self.fetches += 1
+        first = max(0, self.end - self.retained) if self.retained is not None else 0
+        a = max(start, first)
+        b = min(start + count, self.end - self.unserved)
+        return first, self.end, [self.line(n) for n in range(a, b)]
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Replay a recorded tool-call trace against a simulated iTerm2.
+
+Reads a trace written by ``ITERM_MCP_RECORD`` or ``iterm_record`` and
+re-issues its calls through the MCP dispatch layer against a fresh
+``FakeITerm``, at the recorded pace scaled by ``--speed`` (0 issues them
+back to back), with at most ``--concurrency`` calls in flight. Session
+identifiers in the trace (IDs, TTYs, names, "self") are mapped to the
+fake's sessions in order of first use, except in calls that failed when
+recorded; run and trigger IDs are replayed as recorded. Reports latency percentiles per tool next to the recorded
+ones, and how far calls started behind schedule::
+
+    python -m benchmarks.replay_trace trace.jsonl [--backend applescript|api]
+        [--speed 1] [--concurrency 8] [--sessions 50] [--buffer-lines 100]
+        [--time-scale 1.0] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from iterm2_mcp import applescript, backends, sessions, topology
+from iterm2_mcp._server import mcp
+from iterm2_mcp.tools import register_all, triggers
+
+from .fake_iterm import FakeITerm
+from .run_benchmarks import _percentile, _response_bytes
+
+register_all(mcp)
+
+# Tools that would change the replaying server's own diagnostics
+SKIP_TOOLS = {"iterm_record", "iterm_profile"}
+
+# Arguments naming an existing session, and the fake session field to substitute
+SESSION_ARGS = {
+    "identifier": "id",
+    "window_identifier": "id",
+    "tty_path": "tty",
+}
+
+
+def load(path: str) -> list[dict]:
+    """Read the calls of a trace, with ``t`` made relative to its first segment.
+
+    A file recorded in several sessions has several headers; each later
+    segment is placed after the end of the previous one.
+    """
+    calls: list[dict] = []
+    offset = end = 0.0
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                raise SystemExit(f"{path}:{number}: not JSON") from None
+            if "trace" in entry:
+                offset = end
+                continue
+            entry["t"] = offset + entry.get("t", 0.0)
+            end = max(end, entry["t"] + entry.get("ms", 0.0) / 1000)
+            calls.append(entry)
+    calls.sort(key=lambda c: c["t"])
+    return calls
+
+
+class _Remap:
+    """Maps recorded session identifiers to the fake's sessions."""
+
+    def __init__(self, fake: FakeITerm, workdir: str):
+        self.sessions = [s for w in fake.windows for tab in w["tabs"] for s in tab]
+        self.workdir = workdir
+        self.assigned: dict[str, dict] = {}
+
+    def session(self, identifier: str) -> dict:
+        s = self.assigned.get(identifier)
+        if s is None:
+            s = self.sessions[len(self.assigned) % len(self.sessions)]
+            self.assigned[identifier] = s
+        return s
+
+    def args(self, tool: str, args: dict) -> dict:
+        args = dict(args)
+        for key, field in SESSION_ARGS.items():
+            if args.get(key) and args[key] != sessions.SELF:
+                args[key] = self.session(args[key])[field]
+        if tool == "iterm_get_session_by_name" and args.get("name"):
+            args["name"] = self.session(args["name"])["name"]
+        if tool == "iterm_set_colors" and isinstance(args.get("sessions"), dict):
+            args["sessions"] = {self.session(k)["id"]: v for k, v in args["sessions"].items()}
+        if tool == "iterm_run_jobs" and args.get("sessions"):
+            args["sessions"] = ",".join(
+                self.session(i.strip())["id"] for i in args["sessions"].split(",") if i.strip()
+            )
+        if tool == "iterm_export_output" and args.get("path"):
+            args["path"] = os.path.join(self.workdir, os.path.basename(args["path"]))
+        return args
+
+
+def _distribution(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "p50_ms": round(1000 * _percentile(values, 0.50), 3),
+        "p95_ms": round(1000 * _percentile(values, 0.95), 3),
+        "p99_ms": round(1000 * _percentile(values, 0.99), 3),
+        "max_ms": round(1000 * (values[-1] if values else 0.0), 3),
+    }
+
+
+async def replay(
+    calls: list[dict],
+    backend: str,
+    speed: float,
+    concurrency: int,
+    session_count: int,
+    buffer_lines: int,
+    time_scale: float,
+    workdir: str,
+) -> dict:
+    """Replay *calls* against a fresh simulated iTerm2 and return the report."""
+    registered = {t.name for t in await mcp.list_tools()}
+    fake = FakeITerm(
+        sessions=session_count,
+        buffer_lines=buffer_lines,
+        time_scale=time_scale,
+        tty_dir=tempfile.mkdtemp(dir=workdir),
+    )
+    server = None
+    if backend == "api":
+        from iterm2_mcp.backends.api import ApiBackend
+
+        from .fake_api_server import FakeApiServer
+
+        path = os.path.join(tempfile.mkdtemp(dir=workdir), "api.sock")
+        server = await FakeApiServer(fake, time_scale=time_scale).start(path)
+        backends.set_backend(ApiBackend(path))
+    else:
+        backends.set_backend(backends.create("applescript"))
+        applescript.set_executor(fake.execute)
+    topology.reset()
+    remap = _Remap(fake, workdir)
+    # "self" resolves from the environment; point it at the first session
+    os.environ["ITERM_SESSION_ID"] = "w0t0p0:" + remap.sessions[0]["id"]
+
+    per_tool: dict[str, dict] = {}
+    lags: list[float] = []
+    skipped = 0
+    in_flight = max_in_flight = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one_call(call: dict, due: float):
+        nonlocal in_flight, max_in_flight
+        stats = per_tool[call["tool"]]
+        # A call that failed as recorded keeps its arguments, so it fails again
+        args = call.get("args", {}) if "error" in call else remap.args(call["tool"], call.get("args", {}))
+        async with gate:
+            start = time.perf_counter()
+            lags.append(max(0.0, start - due))
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            try:
+                result = await mcp.call_tool(call["tool"], args)
+                size = _response_bytes(result)
+                stats["bytes"] += size
+                if isinstance(result, tuple):
+                    result = result[0]
+                text = getattr(result[0], "text", "") if isinstance(result, list) and result else ""
+                if text.startswith('{"error"'):
+                    stats["error_responses"] += 1
+            except Exception:
+                stats["errors"] += 1
+            finally:
+                in_flight -= 1
+            stats["latencies"].append(time.perf_counter() - start)
+
+    scripts_before = fake.scripts_run
+    tasks = []
+    wall_start = time.perf_counter()
+    for call in calls:
+        if call["tool"] in SKIP_TOOLS or call["tool"] not in registered:
+            skipped += 1
+            continue
+        due = wall_start + (call["t"] / speed if speed > 0 else 0.0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        per_tool.setdefault(call["tool"], {
+            "latencies": [], "recorded": [], "bytes": 0, "recorded_bytes": 0,
+            "errors": 0, "error_responses": 0, "recorded_errors": 0,
+        })
+        stats = per_tool[call["tool"]]
+        stats["recorded"].append(call.get("ms", 0.0) / 1000)
+        stats["recorded_bytes"] += call.get("bytes", 0)
+        stats["recorded_errors"] += "error" in call
+        tasks.append(asyncio.create_task(one_call(call, due)))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - wall_start
+
+    triggers.clear()
+    if server is not None:
+        await backends.get().close()
+        await server.close()
+    applescript.set_executor(None)
+    backends.set_backend(None)
+
+    replayed = len(tasks)
+    tools = {}
+    for tool, stats in sorted(per_tool.items()):
+        n = len(stats["latencies"])
+        tools[tool] = {
+            "calls": n,
+            "errors": stats["errors"],
+            "error_responses": stats["error_responses"],
+            "recorded_errors": stats["recorded_errors"],
+            **_distribution(stats["latencies"]),
+            "recorded": _distribution(stats["recorded"]),
+            "bytes_per_call": stats["bytes"] // n,
+            "recorded_bytes_per_call": stats["recorded_bytes"] // n,
+        }
+    return {
+        "config": {
+            "backend": backend,
+            "speed": speed,
+            "concurrency": concurrency,
+            "sessions": session_count,
+            "buffer_lines": buffer_lines,
+            "time_scale": time_scale,
+        },
+        "summary": {
+            "calls": replayed,
+            "skipped": skipped,
+            "errors": sum(t["errors"] for t in tools.values()),
+            "recorded_span_s": round(calls[-1]["t"] - calls[0]["t"], 3) if calls else 0.0,
+            "wall_s": round(wall, 3),
+            "throughput_per_s": round(replayed / wall, 2) if wall else 0.0,
+            "max_in_flight": max_in_flight,
+            "scripts_per_call": round((fake.scripts_run - scripts_before) / replayed, 3) if replayed else 0.0,
+            "start_lag": _distribution(lags),
+            **_distribution([x for t in per_tool.values() for x in t["latencies"]]),
+        },
+        "tools": tools,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace", help="trace file written by ITERM_MCP_RECORD or iterm_record")
+    parser.add_argument("--backend", choices=backends.BACKENDS, default="applescript")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay pace vs the recording (2 = twice as fast, 0 = back to back)")
+    parser.add_argument("--concurrency", type=int, default=8, help="most calls in flight")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--buffer-lines", type=int, default=100)
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="multiplier for simulated iTerm2 delays (0 = none)")
+    parser.add_argument("--output", help="write the report JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    calls = load(args.trace)
+    with tempfile.TemporaryDirectory(prefix="iterm2-mcp-replay-") as workdir:
+        # Keep the registration state file out of /tmp's real one
+        sessions.SESSION_FILE = sessions.Path(workdir) / "sessions.json"
+        report = asyncio.run(replay(
+            calls, args.backend, args.speed, args.concurrency,
+            args.sessions, args.buffer_lines, args.time_scale, workdir,
+        ))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""Offline benchmark suite: drive every MCP tool against a simulated iTerm2.
+
+Each tool is called through the MCP dispatch layer for every combination
+of session count and buffer size, against a fresh ``FakeITerm`` driven
+through the chosen backend (osascript scripts, or the iTerm2 API protocol
+via ``FakeApiServer``). Results
+(throughput, latency percentiles, scripts and response bytes per call)
+are written as JSON. With ``--baseline``, the run fails if any result
+regresses past the stored baseline.
+
+Usage:
+    python -m benchmarks.run_benchmarks [--backend applescript|api] [--sessions 1,50,500]
+        [--buffer-lines 100,5000] [--calls 20] [--concurrency 1]
+        [--time-scale 0.1] [--output results.json]
+        [--baseline benchmarks/baseline.json] [--tolerance 1.5]
+        [--update-baseline]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from iterm2_mcp import applescript, backends, sessions, topology
+from iterm2_mcp._server import mcp
+from iterm2_mcp.tools import register_all, triggers
+
+from .fake_iterm import FakeITerm
+
+register_all(mcp)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Absolute latency slack (ms) on top of the relative tolerance, so tiny
+# timings do not fail on scheduler noise
+ABS_SLACK_MS = 5.0
+
+
+def _target(fake: FakeITerm) -> dict:
+    """The last session: the worst case for scripts that scan for an ID."""
+    return fake.windows[-1]["tabs"][-1][-1]
+
+
+# Arguments for each tool, given the fake and its target session
+TOOL_ARGS = {
+    "iterm_list_sessions":       lambda f, s, d: {},
+    "iterm_register_session":    lambda f, s, d: {"tty_path": s["tty"]},
+    "iterm_focus_session":       lambda f, s, d: {"identifier": s["id"]},
+    "iterm_topology_changes":    lambda f, s, d: {"since_version": 1},
+    "iterm_get_session_by_name": lambda f, s, d: {"name": s["name"]},
+    "iterm_set_session_name":    lambda f, s, d: {"identifier": s["id"], "new_name": s["name"]},
+    "iterm_set_colors":          lambda f, s, d: {"sessions": {s["id"]: "success", s["name"]: "#22c55e"}},
+    "iterm_session_processes":   lambda f, s, d: {},
+    "iterm_new_tab":             lambda f, s, d: {"name": "bench-tab"},
+    "iterm_split_pane":          lambda f, s, d: {"identifier": s["id"]},
+    "iterm_acquire_session":     lambda f, s, d: {"name": "bench-acquired"},
+    "iterm_send_command":        lambda f, s, d: {"identifier": s["id"], "command": "echo hi"},
+    "iterm_send_keys":           lambda f, s, d: {"identifier": s["id"], "keys": "ctrl+c"},
+    "iterm_run_jobs":            lambda f, s, d: {"commands": ["echo a", "echo b"], "parallelism": 2, "wait": 30},
+    "iterm_job_status":          lambda f, s, d: {},
+    "iterm_add_trigger":         lambda f, s, d: {"identifier": s["id"], "pattern": "ERROR|Traceback"},
+    "iterm_remove_trigger":      lambda f, s, d: {"trigger_id": "bench"},
+    "iterm_read_output":         lambda f, s, d: {"identifier": s["id"], "lines": 50},
+    "iterm_watch_session":       lambda f, s, d: {"identifier": s["id"]},
+    "iterm_last_command_output": lambda f, s, d: {"identifier": s["id"]},
+    "iterm_read_scrollback":     lambda f, s, d: {"identifier": s["id"], "cursor": 0, "lines": 500},
+    "iterm_export_output":       lambda f, s, d: {"identifier": s["id"], "path": os.path.join(d, "export.log")},
+    "iterm_stats":               lambda f, s, d: {},
+    "iterm_profile":             lambda f, s, d: {},
+    "iterm_record":              lambda f, s, d: {},
+}
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def _response_bytes(result) -> int:
+    """Total text size of a call_tool result."""
+    if isinstance(result, tuple):
+        result = result[0]
+    if isinstance(result, dict):
+        return len(json.dumps(result))
+    return sum(len(getattr(block, "text", "") or "") for block in result)
+
+
+async def bench_tool(
+    backend: str,
+    tool: str,
+    session_count: int,
+    buffer_lines: int,
+    calls: int,
+    concurrency: int,
+    time_scale: float,
+    workdir: str,
+) -> dict:
+    """Benchmark one tool at one size against a fresh simulated iTerm2."""
+    fake = FakeITerm(
+        sessions=session_count,
+        buffer_lines=buffer_lines,
+        time_scale=time_scale,
+        tty_dir=tempfile.mkdtemp(dir=workdir),
+    )
+    server = None
+    if backend == "api":
+        from iterm2_mcp.backends.api import ApiBackend
+
+        from .fake_api_server import FakeApiServer
+
+        path = os.path.join(tempfile.mkdtemp(dir=workdir), "api.sock")
+        server = await FakeApiServer(fake, time_scale=time_scale).start(path)
+        backends.set_backend(ApiBackend(path))
+    else:
+        backends.set_backend(backends.create("applescript"))
+        applescript.set_executor(fake.execute)
+    # Each fake has its own session IDs; start a new topology baseline
+    topology.reset()
+    args = TOOL_ARGS[tool](fake, _target(fake), workdir)
+
+    latencies: list[float] = []
+    errors = 0
+    response_bytes = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one_call():
+        nonlocal errors, response_bytes
+        async with gate:
+            start = time.perf_counter()
+            try:
+                result = await mcp.call_tool(tool, args)
+                response_bytes += _response_bytes(result)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    scripts_before = fake.scripts_run
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one_call() for _ in range(calls)))
+    wall = time.perf_counter() - wall_start
+    triggers.clear()
+    if server is not None:
+        await backends.get().close()
+        await server.close()
+    applescript.set_executor(None)
+    backends.set_backend(None)
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "tool": tool,
+        "sessions": session_count,
+        "buffer_lines": buffer_lines,
+        "calls": calls,
+        "errors": errors,
+        "throughput_per_s": round(calls / wall, 2) if wall else 0.0,
+        "p50_ms": round(1000 * _percentile(latencies, 0.50), 3),
+        "p95_ms": round(1000 * _percentile(latencies, 0.95), 3),
+        "p99_ms": round(1000 * _percentile(latencies, 0.99), 3),
+        "scripts_per_call": round((fake.scripts_run - scripts_before) / calls, 3),
+        "bytes_per_call": response_bytes // calls,
+    }
+
+
+async def run_suite(
+    session_counts: list[int],
+    buffer_sizes: list[int],
+    calls: int,
+    concurrency: int,
+    time_scale: float,
+    tools: list[str] | None = None,
+    backend: str = "applescript",
+) -> dict:
+    """Run every tool at every size and return the results document."""
+    registered = [t.name for t in await mcp.list_tools()]
+    missing = [t for t in registered if t not in TOOL_ARGS]
+    if missing:
+        raise SystemExit(f"No benchmark arguments defined for tool(s): {missing}")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="iterm2-mcp-bench-") as workdir:
+        # Keep the registration state file out of /tmp's real one
+        sessions.SESSION_FILE = sessions.Path(workdir) / "sessions.json"
+        for session_count in session_counts:
+            for buffer_lines in buffer_sizes:
+                for tool in tools or registered:
+                    results.append(await bench_tool(
+                        backend, tool, session_count, buffer_lines, calls,
+                        concurrency, time_scale, workdir,
+                    ))
+    return {
+        "config": {
+            "backend": backend,
+            "sessions": session_counts,
+            "buffer_lines": buffer_sizes,
+            "calls": calls,
+            "concurrency": concurrency,
+            "time_scale": time_scale,
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+
+
+def _key(result: dict) -> tuple:
+    return (result.get("backend", "applescript"), result["tool"],
+            result["sessions"], result["buffer_lines"])
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return a description of every result that regressed past *baseline*."""
+    base = {_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results["results"]:
+        b = base.get(_key(r))
+        if b is None:
+            continue
+        label = "{1} [{0}] (sessions={2}, buffer_lines={3})".format(*_key(r))
+        limit = b["p95_ms"] * tolerance + ABS_SLACK_MS
+        if r["p95_ms"] > limit:
+            regressions.append(f"{label}: p95 {r['p95_ms']}ms > {limit:.3f}ms")
+        if r["scripts_per_call"] > b["scripts_per_call"] + 0.01:
+            regressions.append(
+                f"{label}: {r['scripts_per_call']} scripts/call > {b['scripts_per_call']}"
+            )
+        if r["errors"] > b["errors"]:
+            regressions.append(f"{label}: {r['errors']} errors > {b['errors']}")
+    return regressions
+
+
+def _int_list(text: str) -> list[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=backends.BACKENDS, default="applescript")
+    parser.add_argument("--sessions", type=_int_list, default=[1, 50, 500])
+    parser.add_argument("--buffer-lines", type=_int_list, default=[100, 5000])
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--time-scale", type=float, default=0.1,
+                        help="multiplier for simulated iTerm2 delays (0 = none)")
+    parser.add_argument("--tools", type=lambda t: t.split(","), default=None)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="fail if results regress past this file")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="allowed p95 latency ratio vs the baseline")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help=f"write the results to {BASELINE_PATH}")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_suite(
+        args.sessions, args.buffer_lines, args.calls,
+        args.concurrency, args.time_scale, args.tools, args.backend,
+    ))
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s):", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("No regressions against baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""SessionStart hook: register the agent's iTerm2 session.
+
+Records this terminal's TTY and ``ITERM_SESSION_ID`` in the server's
+registered-sessions state file, so the agent does not have to call
+``iterm_register_session`` (and scan every session) at startup, and the
+``"self"`` identifier knows its TTY.
+"""
+
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from iterm2_mcp.sessions import load_state, save_state  # noqa: E402
+
+
+def _terminal() -> str:
+    """Return the TTY of this process or its nearest ancestor with one.
+
+    The hook's stdin is the hook payload, not the terminal, so the TTY is
+    read from the process table.
+    """
+    for fd in (0, 1, 2):
+        try:
+            return os.ttyname(fd)
+        except OSError:
+            continue
+    pid = os.getpid()
+    for _ in range(8):
+        try:
+            out = subprocess.run(
+                ["ps", "-o", "tty=,ppid=", "-p", str(pid)],
+                capture_output=True, text=True, timeout=2,
+            ).stdout.split()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+        if len(out) != 2:
+            return ""
+        tty, ppid = out
+        if tty not in ("?", "??", "-"):
+            return tty if tty.startswith("/dev/") else f"/dev/{tty}"
+        pid = int(ppid)
+        if pid <= 1:
+            break
+    return ""
+
+
+def main() -> int:
+    env_id = os.environ.get("ITERM_SESSION_ID", "")
+    session_id = env_id.partition(":")[2] or env_id
+    tty = _terminal()
+    if not session_id or not tty:
+        print(f"iTerm2 session TTY: {tty or 'unknown'} — not running inside iTerm2, "
+              "so sessions must be targeted by ID, TTY or name.")
+        return 0
+
+    state = load_state()
+    registered = state.setdefault("sessions", {})
+    previous = registered.get(tty, {})
+    for other in [t for t, e in registered.items() if e.get("iterm_session_id") == session_id]:
+        del registered[other]
+    registered[tty] = {
+        "iterm_session_id": session_id,
+        "session_name": previous.get("session_name", "") if previous.get("iterm_session_id") == session_id else "",
+        "registered_at": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        save_state(state)
+    except OSError as e:
+        print(f"iTerm2 session TTY: {tty} — could not record it ({e}); call iterm_register_session.")
+        return 0
+    print(f"iTerm2 session registered: {tty} ({session_id}). Use identifier \"self\" for this terminal.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
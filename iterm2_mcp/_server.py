@@ -2,4 +2,24 @@
 
 from mcp.server.fastmcp import FastMCP
 
-mcp = FastMCP("iterm2-mcp")
+from . import metrics, profiling, recording, scheduler, startup
+
+
+class _Server(FastMCP):
+    """FastMCP whose tool handlers are scheduled, instrumented and recorded as they are registered."""
+
+    def tool(self, *args, **kwargs):
+        register = super().tool(*args, **kwargs)
+
+        def decorator(fn):
+            wrapped = scheduler.wrap(fn)
+            wrapped = metrics.instrument(f"tool.{fn.__name__}")(wrapped)
+            wrapped = profiling.wrap(fn.__name__)(wrapped)
+            wrapped = recording.wrap(fn.__name__)(wrapped)
+            register(wrapped)
+            return wrapped
+
+        return decorator
+
+
+mcp = _Server("iterm2-mcp", lifespan=startup.lifespan)
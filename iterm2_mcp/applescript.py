@@ -1,65 +1,349 @@
 """AppleScript execution and iTerm2 session enumeration."""
 
 import asyncio
+import json
+import math
+import os
+import re
+import sys
+import time
+from typing import Awaitable, Callable
 
+from . import metrics, profiling, scheduler
 
-async def run(script: str) -> str:
-    """Execute an AppleScript snippet and return its stdout."""
-    proc = await asyncio.create_subprocess_exec(
-        "osascript", "-e", script,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await proc.communicate()
+
+def _env_seconds(name: str, default: float) -> float:
+    """Read a positive number of seconds from *name*, warning about and
+    ignoring anything else rather than failing the import."""
+    raw = os.environ.get(name, "")
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        value = math.nan
+    if math.isfinite(value) and value > 0:
+        return value
+    print(f"iterm2-mcp: ignoring {name}={raw!r}; expected a positive number of seconds", file=sys.stderr)
+    return default
+
+
+# Seconds a script may run before it is killed
+DEFAULT_TIMEOUT = _env_seconds("ITERM_MCP_SCRIPT_TIMEOUT", 10.0)
+
+# Extra attempts for idempotent scripts (reads) that time out
+READ_RETRIES = 1
+
+# Consecutive timeouts that open the circuit breaker, and how often (and
+# how patiently) it probes iTerm2 while open
+BREAKER_THRESHOLD = 3
+BREAKER_PROBE_INTERVAL = 5.0
+BREAKER_PROBE_TIMEOUT = 2.0
+PROBE_SCRIPT = 'tell application "iTerm2" to return version'
+
+# Optional stand-in for osascript (e.g. the offline benchmark's simulated
+# iTerm2): a coroutine taking the script and returning its stdout, raising
+# RuntimeError on script errors. Scripts run with ``source_form=True``
+# must get their result printed as ``osascript -ss`` would.
+_executor: Callable[[str], Awaitable[str]] | None = None
+
+
+def set_executor(executor: Callable[[str], Awaitable[str]] | None) -> None:
+    """Route scripts to *executor* instead of osascript (None restores it)."""
+    global _executor
+    _executor = executor
+
+
+class ScriptTimeout(RuntimeError):
+    """A script did not finish within its timeout and was killed."""
+
+
+class CircuitOpen(RuntimeError):
+    """Scripts are failing fast after repeated timeouts."""
+
+
+class _CircuitBreaker:
+    """Fail fast once iTerm2 stops answering, until a probe gets through.
+
+    After ``BREAKER_THRESHOLD`` consecutive timeouts the breaker opens and
+    every script fails immediately with CircuitOpen. While open, a cheap
+    probe script runs every ``BREAKER_PROBE_INTERVAL`` seconds; the first
+    one that completes (successfully or with a script error, either way
+    iTerm2 answered) closes the breaker.
+    """
+
+    def __init__(self):
+        self.timeouts = 0
+        self.opened_at: float | None = None
+        self._probe: asyncio.Task | None = None
+
+    def check(self) -> None:
+        if self.opened_at is not None:
+            raise CircuitOpen(
+                f"iTerm2 is not responding ({self.timeouts} consecutive script timeouts); "
+                f"failing fast until it recovers. Check for a modal dialog or a pending "
+                f"Automation permission prompt."
+            )
+
+    def success(self) -> None:
+        self.timeouts = 0
+
+    def timeout(self) -> None:
+        self.timeouts += 1
+        if self.timeouts >= BREAKER_THRESHOLD and self.opened_at is None:
+            self.opened_at = time.monotonic()
+            metrics.set_gauge("applescript.circuit_open", 1)
+            self._probe = asyncio.get_running_loop().create_task(self._probe_loop())
+
+    def close(self) -> None:
+        self.timeouts = 0
+        self.opened_at = None
+        metrics.set_gauge("applescript.circuit_open", 0)
+
+    async def _probe_loop(self) -> None:
+        while self.opened_at is not None:
+            await asyncio.sleep(BREAKER_PROBE_INTERVAL)
+            try:
+                await _run_once(PROBE_SCRIPT, BREAKER_PROBE_TIMEOUT)
+            except ScriptTimeout:
+                continue
+            except RuntimeError:
+                pass
+            self.close()
+
+
+breaker = _CircuitBreaker()
+
+
+async def _run_once(script: str, timeout: float, flags: tuple[str, ...] = ()) -> str:
+    """Run one script, killing it after *timeout* seconds or on cancellation."""
+    if _executor is not None:
+        try:
+            return (await asyncio.wait_for(_executor(script), timeout)).strip()
+        except asyncio.TimeoutError:
+            raise ScriptTimeout(f"AppleScript timed out after {timeout:g}s.") from None
+    start = time.perf_counter()
+    with profiling.span("spawn", script_bytes=len(script)):
+        proc = await asyncio.create_subprocess_exec(
+            "osascript", *flags, "-e", script,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    spawned = time.perf_counter()
+    try:
+        with profiling.span("wait"):
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        if metrics.enabled():
+            metrics.record("applescript.timeout", time.perf_counter() - spawned, True, len(script))
+        raise ScriptTimeout(
+            f"AppleScript timed out after {timeout:g}s (is iTerm2 showing a dialog "
+            f"or waiting for Automation permission?)"
+        ) from None
+    finally:
+        # Timed out or cancelled: don't leak the osascript process
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+    if metrics.enabled():
+        # Split spawn cost from compile + execute time inside osascript
+        metrics.record("applescript.spawn", spawned - start)
+        metrics.record("applescript.execute", time.perf_counter() - spawned,
+                       proc.returncode != 0, len(script), len(stdout))
     if proc.returncode != 0:
         raise RuntimeError(f"AppleScript error: {stderr.decode().strip()}")
     return stdout.decode().strip()
 
 
+@metrics.instrument("applescript.run")
+async def run(
+    script: str,
+    timeout: float | None = None,
+    idempotent: bool = False,
+    session_id: str = "",
+    source_form: bool = False,
+) -> str:
+    """Execute an AppleScript snippet and return its stdout.
+
+    Scripts wait for a slot in ``scheduler.scripts``: by default writes run
+    as interactive and idempotent scripts as reads, unless the caller set a
+    class with ``scheduler.priority``. *session_id* is the key scripts are
+    queued fairly by. Background scripts may raise scheduler.Shed instead
+    of running once stale. With *source_form* the result is printed as
+    AppleScript source (``osascript -ss``), for :func:`parse_source`.
+
+    The script is killed if it runs longer than *timeout* seconds (default
+    ``DEFAULT_TIMEOUT``) or the calling task is cancelled. Idempotent
+    scripts (reads) are retried up to ``READ_RETRIES`` times after a
+    timeout. Raises ScriptTimeout, CircuitOpen while iTerm2 is not
+    responding, or RuntimeError for a script error.
+    """
+    priority = scheduler.current_priority()
+    if priority is None:
+        priority = scheduler.READ if idempotent else scheduler.INTERACTIVE
+    max_age = scheduler.BACKGROUND_MAX_AGE if priority == scheduler.BACKGROUND else None
+    attempts = 1 + (READ_RETRIES if idempotent else 0)
+    for attempt in range(attempts):
+        breaker.check()
+        try:
+            async with scheduler.scripts.slot(session_id, priority, max_age):
+                # The breaker may have opened while this script was queued
+                breaker.check()
+                result = await _run_once(script, timeout or DEFAULT_TIMEOUT, ("-ss",) if source_form else ())
+        except ScriptTimeout:
+            breaker.timeout()
+            if attempt + 1 == attempts:
+                raise
+            continue
+        except (CircuitOpen, scheduler.Shed):
+            raise
+        except RuntimeError:
+            breaker.success()
+            raise
+        breaker.success()
+        return result
+
+
 def escape(text: str) -> str:
     """Escape a string for embedding inside AppleScript double-quotes."""
     return text.replace("\\", "\\\\").replace('"', '\\"')
 
 
+# One token of ``osascript -ss`` output: a string, a list/record
+# delimiter, a record key, a number, a constant, or anything else (an error)
+_SS_TOKEN = re.compile(
+    r'\s*(?:"([^"\\]*(?:\\.[^"\\]*)*)"|([{},])|(\w+|\|[^|]*\|):'
+    r'|(-?\d+(?:\.\d+)?(?:E[+-]?\d+)?)|(true|false|missing value)|(\S))',
+    re.S,
+)
+_SS_ESCAPE = re.compile(r"\\(.)", re.S)
+
+# Strings, and what may appear between them in a result that is only
+# nested lists of strings, numbers and booleans, which is also valid JSON
+# once braces become brackets
+_SS_STRING = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)"', re.S)
+_SS_PLAIN = re.compile(r"(?:[{},\s\x00\d.E+-]|true|false)*")
+_SS_BRACKETS = str.maketrans("{}", "[]")
+_SS_UNESCAPE = {"n": "\n", "r": "\r", "t": "\t"}
+_SS_CONSTANTS = {"true": True, "false": False, "missing value": None}
+
+
+def parse_source(text: str):
+    """Parse a result printed by ``osascript -ss`` into Python values.
+
+    Handles lists, records (as dicts), strings, numbers, booleans and
+    ``missing value`` (None). Strings may contain any character, quotes
+    and delimiters included, since osascript escapes them. Raises
+    ValueError for anything else.
+    """
+    # Fast path: results without records or ``missing value`` are decoded
+    # by the json module (strings keep osascript's JSON-compatible escapes)
+    parts = _SS_STRING.split(text)
+    code = "\x00".join(parts[0::2])
+    if _SS_PLAIN.fullmatch(code):
+        parts[0::2] = code.translate(_SS_BRACKETS).split("\x00")
+        try:
+            return json.loads('"'.join(parts), strict=False)
+        except ValueError:
+            pass
+
+    # General case: tokenize in one regex pass, assemble with a stack
+    # Each open container: [items, record, pending record key]
+    stack: list[list] = []
+    result = missing = object()
+    expect_value = True
+    for string, delim, key, number, constant, other in _SS_TOKEN.findall(text):
+        if other:
+            raise ValueError(f"unexpected {other!r} in AppleScript result")
+        if delim == "{":
+            if not expect_value:
+                raise ValueError("missing ',' in AppleScript result")
+            stack.append([[], {}, None])
+            continue
+        if delim == ",":
+            if expect_value or not stack:
+                raise ValueError("misplaced ',' in AppleScript result")
+            expect_value = True
+            continue
+        if key:
+            if not expect_value or not stack:
+                raise ValueError("misplaced record key in AppleScript result")
+            stack[-1][2] = key.strip("|")
+            continue
+        if delim == "}":
+            if not stack or (expect_value and (stack[-1][0] or stack[-1][1])):
+                raise ValueError("misplaced '}' in AppleScript result")
+            items, record, _ = stack.pop()
+            value = record if record else items
+        else:
+            if not expect_value:
+                raise ValueError("missing ',' in AppleScript result")
+            if number:
+                value = float(number) if "." in number or "E" in number else int(number)
+            elif constant:
+                value = _SS_CONSTANTS[constant]
+            elif "\\" in string:
+                value = _SS_ESCAPE.sub(lambda e: _SS_UNESCAPE.get(e.group(1), e.group(1)), string)
+            else:
+                value = string
+        if not stack:
+            if result is not missing:
+                raise ValueError("trailing text in AppleScript result")
+            result = value
+        elif stack[-1][2] is not None:
+            stack[-1][1][stack[-1][2]] = value
+            stack[-1][2] = None
+        else:
+            stack[-1][0].append(value)
+        expect_value = False
+    if stack or result is missing:
+        raise ValueError("truncated AppleScript result")
+    return result
+
+
+@metrics.instrument("list_all_sessions")
+@profiling.traced("list_all_sessions")
 async def list_all_sessions() -> list[dict]:
-    """Return a list of dicts describing every iTerm2 session."""
+    """Return a list of dicts describing every iTerm2 session.
+
+    Properties are fetched in bulk, one Apple Event per property per
+    window (``id of every session of every tab``) rather than per
+    session, and returned as one nested list printed in source form, so
+    names containing quotes, delimiters or newlines round-trip intact.
+    """
     script = '''
 tell application "iTerm2"
-    set output to ""
+    set output to {}
     repeat with w in windows
-        set wid to id of w
-        set wname to name of w
-        set tlist to tabs of w
-        set tcount to 0
-        repeat with t in tlist
-            set tcount to tcount + 1
-            set slist to sessions of t
-            repeat with s in slist
-                set sid to id of s
-                set sname to name of s
-                set stty to tty of s
-                set output to output & sid & "||" & sname & "||" & stty & "||" & wid & "||" & wname & "||" & tcount & linefeed
-            end repeat
-        end repeat
+        set end of output to {id of w, name of w, id of every session of every tab of w, name of every session of every tab of w, tty of every session of every tab of w}
     end repeat
     return output
 end tell
 '''
-    raw = await run(script)
+    raw = await run(script, idempotent=True, source_form=True)
+    with profiling.span("parse", bytes=len(raw)):
+        try:
+            return _parse_sessions(parse_source(raw))
+        except (ValueError, TypeError) as e:
+            raise RuntimeError(f"Unexpected session inventory from iTerm2: {e}") from None
+
+
+def _parse_sessions(windows: list) -> list[dict]:
+    """Flatten ``{window id, window name, ids, names, ttys}`` per window,
+    where the last three hold one list per tab, into session dicts."""
     sessions = []
-    for line in raw.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.split("||")
-        if len(parts) < 6:
-            continue
-        sessions.append({
-            "session_id": parts[0],
-            "name": parts[1],
-            "tty": parts[2],
-            "window_id": parts[3],
-            "window_name": parts[4],
-            "tab_index": int(parts[5]),
-        })
+    for window_id, window_name, ids, names, ttys in windows:
+        for tab_index, tab in enumerate(zip(ids, names, ttys), start=1):
+            for session_id, name, tty in zip(*tab):
+                sessions.append({
+                    "session_id": session_id,
+                    "name": name,
+                    "tty": tty,
+                    "window_id": str(window_id),
+                    "window_name": window_name,
+                    "tab_index": tab_index,
+                })
     return sessions
@@ -0,0 +1,159 @@
+"""Pluggable control channels to iTerm2.
+
+Tools talk to iTerm2 through a ``Backend``. Two are provided:
+
+``applescript`` (default)
+    One ``osascript`` process per operation. Works with any iTerm2 setup.
+``api``
+    The iTerm2 Python API protocol (protobuf over a websocket) on one
+    persistent connection, with push-based screen-update notifications.
+    Requires the Python API to be enabled in iTerm2 and the ``iterm2``
+    package to be installed.
+
+The backend is chosen with ``ITERM_MCP_BACKEND`` and can be replaced at
+runtime with :func:`set_backend` (e.g. by the offline benchmarks).
+"""
+
+import os
+from typing import AsyncIterator, Protocol
+
+BACKEND_ENV = "ITERM_MCP_BACKEND"
+BACKENDS = ("applescript", "api")
+
+# Characters sent for each named key. Enter is a bare carriage return.
+KEY_CODES: dict[str, str] = {
+    "enter":     "\r",
+    "return":    "\r",
+    "tab":       "\t",
+    "escape":    "\x1b",
+    "esc":       "\x1b",
+    "ctrl+c":    "\x03",
+    "ctrl+d":    "\x04",
+    "ctrl+z":    "\x1a",
+    "ctrl+l":    "\x0c",
+    "ctrl+a":    "\x01",
+    "ctrl+e":    "\x05",
+    "ctrl+k":    "\x0b",
+    "ctrl+u":    "\x15",
+    "ctrl+w":    "\x17",
+    "ctrl+r":    "\x12",
+    "ctrl+p":    "\x10",
+    "ctrl+n":    "\x0e",
+    "up":        "\x1b[A",
+    "down":      "\x1b[B",
+    "right":     "\x1b[C",
+    "left":      "\x1b[D",
+    "backspace": "\x7f",
+    "delete":    "\x7f",
+    "space":     " ",
+}
+
+
+class Backend(Protocol):
+    """The operations tools need from iTerm2.
+
+    Session-targeted methods return False / None / "" rather than raising
+    when the session no longer exists; transport failures raise
+    RuntimeError.
+    """
+
+    name: str
+
+    # Whether move_to_window can move sessions between windows
+    can_move_sessions: bool
+
+    # Whether a fetch line number keeps referring to the same line as output
+    # scrolls; if not, fetch serves only the screen and numbers are its rows
+    stable_lines: bool
+
+    async def list_sessions(self) -> list[dict]:
+        """Return every session as ``{session_id, name, tty, window_id,
+        window_name, tab_index}``, in window/tab/pane order."""
+        ...
+
+    async def read_contents(self, session_id: str) -> str:
+        """Return the session's screen text, escape sequences included."""
+        ...
+
+    async def fetch(self, session_id: str, start: int, count: int) -> tuple[int, int, list[str]]:
+        """Serve a range of history (see ``scrollback.HistorySource``)."""
+        ...
+
+    async def send_text(self, session_id: str, text: str) -> bool:
+        """Type *text* followed by Enter."""
+        ...
+
+    async def send_keys(self, session_id: str, keys: list[str]) -> bool:
+        """Send key sequences (values of :data:`KEY_CODES`) in order."""
+        ...
+
+    async def create_tab(self, window_id: str | None = None) -> dict:
+        """Open a tab in *window_id* (default: the front window) and return
+        ``{session_id, tty}`` for its session."""
+        ...
+
+    async def create_window(self) -> dict:
+        """Open a window and return ``{window_id, session_id, tty}`` for its
+        session."""
+        ...
+
+    async def move_to_window(self, session_id: str, window_id: str) -> bool:
+        """Move the session's tab to the end of *window_id*; False if either
+        does not exist or the backend cannot move sessions."""
+        ...
+
+    async def split_pane(self, session_id: str | None, vertical: bool) -> dict | None:
+        """Split *session_id* (default: the front window's current session)
+        and return ``{session_id, tty}``, or None if it does not exist."""
+        ...
+
+    async def set_name(self, session_id: str, name: str) -> bool:
+        """Set the session's display name."""
+        ...
+
+    async def focus(self, session_id: str) -> bool:
+        """Select the session's tab."""
+        ...
+
+    async def session_tty(self, session_id: str) -> str:
+        """Return the session's TTY path, or "" if it does not exist."""
+        ...
+
+    def screen_updates(self, session_id: str, baseline: str | None = None) -> AsyncIterator[None]:
+        """Yield each time the session's screen changes, until closed.
+
+        *baseline* is the caller's last ``read_contents`` text; a screen that
+        already differs from it counts as the first change.
+        """
+        ...
+
+
+_backend: Backend | None = None
+
+
+def create(name: str) -> Backend:
+    """Instantiate the backend called *name*.
+
+    Raises ValueError for an unknown name.
+    """
+    if name == "applescript":
+        from .applescript import AppleScriptBackend
+        return AppleScriptBackend()
+    if name == "api":
+        from .api import ApiBackend
+        return ApiBackend()
+    raise ValueError(f"Unknown backend '{name}'. Valid backends: {list(BACKENDS)}")
+
+
+def get() -> Backend:
+    """Return the active backend, creating it from the environment on first use."""
+    global _backend
+    if _backend is None:
+        _backend = create(os.environ.get(BACKEND_ENV, "") or "applescript")
+    return _backend
+
+
+def set_backend(backend: Backend | None) -> None:
+    """Replace the active backend (None re-reads the environment on next use)."""
+    global _backend
+    _backend = backend
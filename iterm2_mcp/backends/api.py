@@ -0,0 +1,457 @@
+"""Backend speaking the iTerm2 Python API protocol.
+
+Requests are protobuf ``ClientOriginatedMessage``s sent over a single
+persistent websocket, so an operation costs one round trip instead of an
+osascript process. Responses are matched to requests by id, which lets
+any number of requests be in flight at once. Screen updates are pushed by
+iTerm2 as notifications rather than polled.
+
+The connection goes to ``ITERM_MCP_API_ADDRESS`` if set (a Unix socket
+path or a ``ws://`` URL, e.g. a local stand-in server), otherwise to
+iTerm2's own socket. ``ITERM2_COOKIE``/``ITERM2_KEY`` are sent when set;
+otherwise, for iTerm2's own socket, a cookie is requested via AppleScript.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import sys
+from typing import AsyncIterator
+
+from .. import applescript, metrics, profiling
+
+ADDRESS_ENV = "ITERM_MCP_API_ADDRESS"
+
+# Seconds to wait for iTerm2 to answer a request
+REQUEST_TIMEOUT = 10.0
+APP_NAME = "iterm2-mcp"
+SUBPROTOCOL = "api.iterm2.com"
+
+
+def _default_address() -> str:
+    suite = os.environ.get("IT2_SUITE", "iTerm2")
+    path = os.path.expanduser(f"~/Library/Application Support/{suite}/private/socket")
+    return path if os.path.exists(path) else "ws://localhost:1912"
+
+
+def _load():
+    """Import the optional protocol dependencies on first use."""
+    try:
+        from iterm2 import api_pb2
+        from websockets.asyncio.client import connect, unix_connect
+    except ImportError as e:
+        raise RuntimeError(
+            "The 'api' backend requires the iterm2 package (pip install iterm2)."
+        ) from e
+    return api_pb2, connect, unix_connect
+
+
+def _walk(node):
+    """Yield the session summaries of a split tree in layout order."""
+    for link in node.links:
+        if link.HasField("session"):
+            yield link.session
+        else:
+            yield from _walk(link.node)
+
+
+def _quote(text: str) -> str:
+    """Encode a string as an iTerm2 function-call argument."""
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class ApiBackend:
+    """One websocket to iTerm2, shared by all operations."""
+
+    name = "api"
+    can_move_sessions = True
+    stable_lines = True
+
+    def __init__(self, address: str | None = None):
+        address = address or os.environ.get(ADDRESS_ENV)
+        # Only iTerm2 itself needs a cookie; a stand-in server does not
+        self._needs_cookie = not address
+        self.address = address or _default_address()
+        self._pb = None
+        self._ws = None
+        self._reader: asyncio.Task | None = None
+        self._connect_lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        # Screen-update subscribers per session, and a counter bumped when
+        # the connection drops (which ends every subscription)
+        self._subscribers: dict[str, set[asyncio.Event]] = {}
+        self._generation = 0
+        self._ttys: dict[str, str] = {}
+
+    # ── Connection ──
+
+    async def _headers(self) -> dict:
+        headers = {
+            "x-iterm2-library-version": "python 2.0",
+            "x-iterm2-disable-auth-ui": "true",
+            "x-iterm2-advisory-name": APP_NAME,
+        }
+        cookie = os.environ.get("ITERM2_COOKIE")
+        key = os.environ.get("ITERM2_KEY")
+        if cookie is None and self._needs_cookie:
+            raw = await applescript.run(
+                f'tell application "iTerm2" to request cookie and key for app named "{APP_NAME}"'
+            )
+            cookie, _, key = raw.partition(" ")
+        if cookie:
+            headers["x-iterm2-cookie"] = cookie
+        if key:
+            headers["x-iterm2-key"] = key
+        return headers
+
+    async def _connection(self):
+        if self._ws is not None:
+            return self._ws
+        async with self._connect_lock:
+            if self._ws is not None:
+                return self._ws
+            self._pb, connect, unix_connect = _load()
+            options = {
+                "origin": "ws://localhost/",
+                "additional_headers": await self._headers(),
+                "subprotocols": [SUBPROTOCOL],
+                "max_size": None,
+                "ping_interval": None,
+                "close_timeout": 0,
+            }
+            try:
+                if self.address.startswith(("ws://", "wss://")):
+                    ws = await connect(self.address, **options)
+                else:
+                    ws = await unix_connect(self.address, "ws://localhost/", **options)
+            except OSError as e:
+                raise RuntimeError(
+                    f"Cannot connect to the iTerm2 API at {self.address}: {e}. "
+                    "Enable it under Settings > General > Magic > Enable Python API."
+                ) from e
+            self._ws = ws
+            self._reader = asyncio.get_running_loop().create_task(self._read_loop(ws))
+            return ws
+
+    async def _read_loop(self, ws) -> None:
+        from google.protobuf.message import DecodeError
+
+        pb = self._pb
+        try:
+            async for data in ws:
+                try:
+                    message = pb.ServerOriginatedMessage.FromString(data)
+                except DecodeError as e:
+                    print(f"iterm2-mcp api: dropping undecodable message: {e}", file=sys.stderr)
+                    continue
+                if message.HasField("notification"):
+                    self._dispatch(message.notification)
+                    continue
+                future = self._pending.pop(message.id, None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except Exception as e:
+            print(f"iterm2-mcp api: connection lost: {e!r}", file=sys.stderr)
+        finally:
+            self._ws = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(RuntimeError("iTerm2 API connection closed."))
+            self._pending.clear()
+            self._generation += 1
+            for events in self._subscribers.values():
+                for event in events:
+                    event.set()
+
+    def _dispatch(self, notification) -> None:
+        if notification.HasField("screen_update_notification"):
+            session_id = notification.screen_update_notification.session
+            for event in self._subscribers.get(session_id, ()):
+                event.set()
+
+    @metrics.instrument("api.request")
+    async def _request(self, **submessage):
+        """Send one request and return the ``ServerOriginatedMessage`` reply."""
+        ws = await self._connection()
+        message = self._pb.ClientOriginatedMessage(id=next(self._ids), **submessage)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message.id] = future
+        with profiling.span("api.request", kind=next(iter(submessage))):
+            try:
+                await ws.send(message.SerializeToString())
+                response = await asyncio.wait_for(future, REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"iTerm2 API request timed out after {REQUEST_TIMEOUT:g}s.") from None
+            finally:
+                self._pending.pop(message.id, None)
+        if response.error:
+            raise RuntimeError(f"iTerm2 API error: {response.error}")
+        return response
+
+    async def close(self) -> None:
+        """Close the connection (it is reopened on the next request)."""
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await self._reader
+
+    # ── Helpers ──
+
+    async def _windows(self):
+        response = await self._request(list_sessions_request=self._pb_module().ListSessionsRequest())
+        return response.list_sessions_response.windows
+
+    def _pb_module(self):
+        if self._pb is None:
+            self._pb = _load()[0]
+        return self._pb
+
+    async def _variable(self, session_id: str, name: str):
+        pb = self._pb_module()
+        response = await self._request(
+            variable_request=pb.VariableRequest(session_id=session_id, get=[name]),
+        )
+        result = response.variable_response
+        if result.status != pb.VariableResponse.Status.Value("OK") or not result.values:
+            return None
+        return json.loads(result.values[0])
+
+    async def _line_info(self, session_id: str) -> dict | None:
+        pb = self._pb_module()
+        response = await self._request(
+            get_property_request=pb.GetPropertyRequest(session_id=session_id, name="number_of_lines"),
+        )
+        result = response.get_property_response
+        if result.status != pb.GetPropertyResponse.Status.Value("OK"):
+            return None
+        return json.loads(result.json_value)
+
+    async def _lines(self, session_id: str, start: int, end: int) -> list[str] | None:
+        """Return rows ``[start, end)`` of the session, or None if it is gone."""
+        pb = self._pb_module()
+        coords = pb.CoordRange(start=pb.Coord(x=0, y=start), end=pb.Coord(x=0, y=end))
+        response = await self._request(get_buffer_request=pb.GetBufferRequest(
+            session=session_id,
+            line_range=pb.LineRange(windowed_coord_range=pb.WindowedCoordRange(coord_range=coords)),
+        ))
+        result = response.get_buffer_response
+        if result.status != pb.GetBufferResponse.Status.Value("OK"):
+            return None
+        return [line.text for line in result.contents]
+
+    @staticmethod
+    def _extent(info: dict) -> tuple[int, int]:
+        first = info["overflow"]
+        return first, first + info["history"] + info["grid"]
+
+    # ── Backend interface ──
+
+    async def list_sessions(self) -> list[dict]:
+        windows = await self._windows()
+        sessions = []
+        for w in windows:
+            window_name = ""
+            rows = []
+            for tab_index, tab in enumerate(w.tabs, start=1):
+                for summary in _walk(tab.root):
+                    if tab.tab_id == w.selected_tab_id and summary.unique_identifier == tab.active_session_id:
+                        window_name = summary.title
+                    rows.append((summary, tab_index))
+            for summary, tab_index in rows:
+                sessions.append({
+                    "session_id": summary.unique_identifier,
+                    "name": summary.title,
+                    "tty": "",
+                    "window_id": w.window_id,
+                    "window_name": window_name,
+                    "tab_index": tab_index,
+                })
+
+        # A session's TTY never changes: fetch it once, all unknown ones in flight together
+        live = {s["session_id"] for s in sessions}
+        for sid in [sid for sid in self._ttys if sid not in live]:
+            del self._ttys[sid]
+        unknown = [sid for sid in live if sid not in self._ttys]
+        for sid, tty in zip(unknown, await asyncio.gather(*(self._variable(sid, "tty") for sid in unknown))):
+            if tty:
+                self._ttys[sid] = tty
+        for s in sessions:
+            s["tty"] = self._ttys.get(s["session_id"], "")
+        return sessions
+
+    async def read_contents(self, session_id: str) -> str:
+        info = await self._line_info(session_id)
+        if info is None:
+            return ""
+        # Only the screen rows, as AppleScript's contents; history is fetch's job
+        start = info["overflow"] + info["history"]
+        lines = await self._lines(session_id, start, start + info["grid"])
+        return "\n".join(lines or [])
+
+    async def fetch(self, session_id: str, start: int, count: int) -> tuple[int, int, list[str]]:
+        info = await self._line_info(session_id)
+        if info is None:
+            raise RuntimeError(f"Session '{session_id}' no longer exists.")
+        first, end = self._extent(info)
+        a, b = max(start, first), min(start + count, end)
+        if a >= b:
+            return first, end, []
+        lines = await self._lines(session_id, a, b)
+        if lines is None:
+            raise RuntimeError(f"Session '{session_id}' no longer exists.")
+        return first, end, lines
+
+    async def _send(self, session_id: str, text: str) -> bool:
+        pb = self._pb_module()
+        response = await self._request(send_text_request=pb.SendTextRequest(session=session_id, text=text))
+        return response.send_text_response.status == pb.SendTextResponse.Status.Value("OK")
+
+    async def send_text(self, session_id: str, text: str) -> bool:
+        return await self._send(session_id, text + "\r")
+
+    async def send_keys(self, session_id: str, keys: list[str]) -> bool:
+        return await self._send(session_id, "".join(keys))
+
+    async def create_tab(self, window_id: str | None = None) -> dict:
+        pb = self._pb_module()
+        if not window_id:
+            windows = await self._windows()
+            window_id = windows[0].window_id if windows else ""
+        response = await self._request(create_tab_request=pb.CreateTabRequest(window_id=window_id))
+        result = response.create_tab_response
+        if result.status != pb.CreateTabResponse.Status.Value("OK"):
+            status = pb.CreateTabResponse.Status.Name(result.status)
+            raise RuntimeError(f"iTerm2 API error: cannot create tab ({status})")
+        return {"session_id": result.session_id, "tty": await self.session_tty(result.session_id)}
+
+    async def create_window(self) -> dict:
+        pb = self._pb_module()
+        response = await self._request(create_tab_request=pb.CreateTabRequest())
+        result = response.create_tab_response
+        if result.status != pb.CreateTabResponse.Status.Value("OK"):
+            status = pb.CreateTabResponse.Status.Name(result.status)
+            raise RuntimeError(f"iTerm2 API error: cannot create window ({status})")
+        return {
+            "window_id": result.window_id,
+            "session_id": result.session_id,
+            "tty": await self.session_tty(result.session_id),
+        }
+
+    async def move_to_window(self, session_id: str, window_id: str) -> bool:
+        """Reassign the session's tab with a ReorderTabsRequest, which
+        takes the complete tab order of every window it touches."""
+        pb = self._pb_module()
+        windows = await self._windows()
+        target = next((w for w in windows if w.window_id == window_id), None)
+        source = tab = None
+        for w in windows:
+            for t in w.tabs:
+                if any(s.unique_identifier == session_id for s in _walk(t.root)):
+                    source, tab = w, t
+        if target is None or tab is None:
+            return False
+        if source is target:
+            return True
+        assignments = [pb.ReorderTabsRequest.Assignment(
+            window_id=target.window_id,
+            tab_ids=[t.tab_id for t in target.tabs] + [tab.tab_id],
+        )]
+        remaining = [t.tab_id for t in source.tabs if t is not tab]
+        if remaining:
+            assignments.append(pb.ReorderTabsRequest.Assignment(window_id=source.window_id, tab_ids=remaining))
+        response = await self._request(reorder_tabs_request=pb.ReorderTabsRequest(assignments=assignments))
+        return response.reorder_tabs_response.status == pb.ReorderTabsResponse.Status.Value("OK")
+
+    async def split_pane(self, session_id: str | None, vertical: bool) -> dict | None:
+        pb = self._pb_module()
+        if not session_id:
+            windows = await self._windows()
+            if not windows:
+                return None
+            tab = next((t for t in windows[0].tabs if t.tab_id == windows[0].selected_tab_id), None)
+            session_id = tab.active_session_id if tab else ""
+        direction = pb.SplitPaneRequest.SplitDirection.Value("VERTICAL" if vertical else "HORIZONTAL")
+        response = await self._request(
+            split_pane_request=pb.SplitPaneRequest(session=session_id, split_direction=direction),
+        )
+        result = response.split_pane_response
+        if result.status == pb.SplitPaneResponse.Status.Value("SESSION_NOT_FOUND"):
+            return None
+        if result.status != pb.SplitPaneResponse.Status.Value("OK") or not result.session_id:
+            status = pb.SplitPaneResponse.Status.Name(result.status)
+            raise RuntimeError(f"iTerm2 API error: cannot split pane ({status})")
+        new_id = result.session_id[0]
+        return {"session_id": new_id, "tty": await self.session_tty(new_id)}
+
+    async def set_name(self, session_id: str, name: str) -> bool:
+        pb = self._pb_module()
+        response = await self._request(invoke_function_request=pb.InvokeFunctionRequest(
+            method=pb.InvokeFunctionRequest.Method(receiver=session_id),
+            invocation=f"iterm2.set_name(name: {_quote(name)})",
+            timeout=-1,
+        ))
+        result = response.invoke_function_response
+        if result.HasField("error"):
+            if result.error.status == pb.InvokeFunctionResponse.Status.Value("INVALID_ID"):
+                return False
+            raise RuntimeError(f"iTerm2 API error: {result.error.error_reason}")
+        return True
+
+    async def focus(self, session_id: str) -> bool:
+        pb = self._pb_module()
+        response = await self._request(activate_request=pb.ActivateRequest(
+            session_id=session_id, order_window_front=True, select_tab=True, select_session=True,
+        ))
+        return response.activate_response.status == pb.ActivateResponse.Status.Value("OK")
+
+    async def session_tty(self, session_id: str) -> str:
+        tty = self._ttys.get(session_id)
+        if tty is None:
+            tty = await self._variable(session_id, "tty") or ""
+            if tty:
+                self._ttys[session_id] = tty
+        return tty
+
+    async def _notify(self, session_id: str, subscribe: bool) -> None:
+        pb = self._pb_module()
+        response = await self._request(notification_request=pb.NotificationRequest(
+            session=session_id,
+            subscribe=subscribe,
+            notification_type=pb.NotificationType.Value("NOTIFY_ON_SCREEN_UPDATE"),
+        ))
+        status = response.notification_response.status
+        if subscribe and status == pb.NotificationResponse.Status.Value("SESSION_NOT_FOUND"):
+            raise RuntimeError(f"Session '{session_id}' no longer exists.")
+
+    async def screen_updates(self, session_id: str, baseline: str | None = None) -> AsyncIterator[None]:
+        """Subscribe once per session, however many callers are waiting.
+
+        With a *baseline*, the screen is re-read once subscribed so a change
+        that landed before the subscription is not missed.
+        """
+        event = asyncio.Event()
+        subscribers = self._subscribers.setdefault(session_id, set())
+        subscribers.add(event)
+        try:
+            if len(subscribers) == 1:
+                await self._notify(session_id, True)
+            generation = self._generation
+            if baseline is not None and await self.read_contents(session_id) != baseline:
+                yield
+            while True:
+                await event.wait()
+                event.clear()
+                if self._generation != generation:
+                    raise RuntimeError("iTerm2 API connection closed.")
+                yield
+        finally:
+            subscribers.discard(event)
+            if not subscribers:
+                self._subscribers.pop(session_id, None)
+                if self._ws is not None:
+                    try:
+                        await self._notify(session_id, False)
+                    except RuntimeError:
+                        pass
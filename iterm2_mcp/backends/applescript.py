@@ -0,0 +1,204 @@
+"""Backend that drives iTerm2 through ``osascript``."""
+
+import asyncio
+from typing import AsyncIterator
+
+from .. import applescript, scheduler
+
+# Seconds between reads when polling for screen updates
+POLL_INTERVAL = 0.5
+
+# Seconds allowed for creating a tab or pane, which waits on a new shell
+CREATE_TIMEOUT = 20.0
+
+
+def _find_session(session_id: str, body: str, fallback: str = "not_found") -> str:
+    """Wrap *body* in a scan over every session that runs it on a match."""
+    sid = applescript.escape(session_id)
+    return f'''
+tell application "iTerm2"
+    repeat with w in windows
+        repeat with t in tabs of w
+            repeat with s in sessions of t
+                if id of s is "{sid}" then
+                    {body}
+                end if
+            end repeat
+        end repeat
+    end repeat
+    return "{fallback}"
+end tell
+'''
+
+
+def _key_command(keys: str) -> str:
+    """Render one key sequence as a ``write text`` command."""
+    if keys == "\r":
+        return 'write text ""'
+    if ord(keys[0]) < 32 or keys[0] == "\x7f":
+        command = f"write text (ASCII character {ord(keys[0])})"
+        if keys[1:]:
+            command += f' & "{applescript.escape(keys[1:])}"'
+        return command
+    return f'write text "{applescript.escape(keys)}"'
+
+
+def _parse_new_session(raw: str) -> dict:
+    p = raw.split("||")
+    return {
+        "session_id": p[0] if len(p) > 0 else "",
+        "tty": p[1] if len(p) > 1 else "",
+    }
+
+
+class AppleScriptBackend:
+    """One osascript process per operation; sessions are found by scanning."""
+
+    name = "applescript"
+
+    # iTerm2's scripting dictionary cannot move a session between windows
+    can_move_sessions = False
+
+    # contents is only the screen, so fetch line numbers are screen rows
+    stable_lines = False
+
+    async def list_sessions(self) -> list[dict]:
+        return await applescript.list_all_sessions()
+
+    async def read_contents(self, session_id: str) -> str:
+        script = _find_session(session_id, "tell s to return contents", fallback="")
+        return await applescript.run(script, idempotent=True, session_id=session_id)
+
+    async def fetch(self, session_id: str, start: int, count: int) -> tuple[int, int, list[str]]:
+        """Slice ``contents`` inside AppleScript so only the requested lines
+        are transferred. AppleScript cannot see lines that have scrolled off
+        the retained buffer, so ``first_line`` is always 0."""
+        body = f'''set c to contents of s
+                    set n to count paragraphs of c
+                    set a to {start + 1}
+                    set b to {start + count}
+                    if b > n then set b to n
+                    if a > b then return (n as text)
+                    set AppleScript's text item delimiters to linefeed
+                    return (n as text) & linefeed & ((paragraphs a thru b of c) as text) & linefeed & "."'''
+        script = _find_session(session_id, body, fallback="-1")
+        raw = await applescript.run(script, idempotent=True, session_id=session_id)
+        head, _, body = raw.partition("\n")
+        total = int(head)
+        if total < 0:
+            raise RuntimeError(f"Session '{session_id}' no longer exists.")
+        # The lines are framed by a trailing "." so that blank lines at the
+        # end survive run()'s strip()
+        lines = body[:-2].split("\n") if body.endswith("\n.") else []
+        return 0, total, lines
+
+    async def send_text(self, session_id: str, text: str) -> bool:
+        body = f'''tell s to write text "{applescript.escape(text)}"
+                    return "sent"'''
+        return await applescript.run(_find_session(session_id, body), session_id=session_id) == "sent"
+
+    async def send_keys(self, session_id: str, keys: list[str]) -> bool:
+        tell_lines = "\n                    ".join(_key_command(k) for k in keys)
+        body = f'''tell s
+                    {tell_lines}
+                    end tell
+                    return "sent"'''
+        return await applescript.run(_find_session(session_id, body), session_id=session_id) == "sent"
+
+    async def create_tab(self, window_id: str | None = None) -> dict:
+        window_ref = f"window id {window_id}" if window_id else "first window"
+        script = f'''
+tell application "iTerm2"
+    tell {window_ref}
+        set newTab to (create tab with default profile)
+        tell current session of newTab
+            set sid to id of it
+            set stty to tty of it
+        end tell
+    end tell
+    return sid & "||" & stty
+end tell
+'''
+        return _parse_new_session(await applescript.run(script, timeout=CREATE_TIMEOUT))
+
+    async def create_window(self) -> dict:
+        script = '''
+tell application "iTerm2"
+    set newWindow to (create window with default profile)
+    tell current session of newWindow
+        set sid to id of it
+        set stty to tty of it
+    end tell
+    return (id of newWindow as text) & "||" & sid & "||" & stty
+end tell
+'''
+        window_id, _, rest = (await applescript.run(script, timeout=CREATE_TIMEOUT)).partition("||")
+        return {"window_id": window_id, **_parse_new_session(rest)}
+
+    async def move_to_window(self, session_id: str, window_id: str) -> bool:
+        return False
+
+    async def split_pane(self, session_id: str | None, vertical: bool) -> dict | None:
+        split_cmd = "split vertically" if vertical else "split horizontally"
+        if session_id:
+            body = f'''tell s
+                        set newSession to ({split_cmd} with default profile)
+                    end tell
+                    tell newSession
+                        set rsid to id of it
+                        set rtty to tty of it
+                    end tell
+                    return rsid & "||" & rtty'''
+            script = _find_session(session_id, body)
+        else:
+            script = f'''
+tell application "iTerm2"
+    tell first window
+        tell current session of current tab
+            set newSession to ({split_cmd} with default profile)
+        end tell
+        tell newSession
+            set rsid to id of it
+            set rtty to tty of it
+        end tell
+    end tell
+    return rsid & "||" & rtty
+end tell
+'''
+        raw = await applescript.run(script, timeout=CREATE_TIMEOUT, session_id=session_id or "")
+        if raw == "not_found":
+            return None
+        return _parse_new_session(raw)
+
+    async def set_name(self, session_id: str, name: str) -> bool:
+        body = f'''tell s to set name to "{applescript.escape(name)}"
+                    return "renamed"'''
+        return await applescript.run(_find_session(session_id, body), session_id=session_id) == "renamed"
+
+    async def focus(self, session_id: str) -> bool:
+        body = '''tell t to select
+                    return "focused"'''
+        return await applescript.run(_find_session(session_id, body), session_id=session_id) == "focused"
+
+    async def session_tty(self, session_id: str) -> str:
+        script = _find_session(session_id, "return tty of s", fallback="")
+        return await applescript.run(script, idempotent=True, session_id=session_id)
+
+    async def screen_updates(self, session_id: str, baseline: str | None = None) -> AsyncIterator[None]:
+        """AppleScript has no notifications, so poll the contents, starting
+        from the caller's *baseline* when given.
+
+        Polls run as background scripts, behind keystrokes and reads; a poll
+        shed as stale is simply skipped.
+        """
+        previous = baseline if baseline is not None else await self.read_contents(session_id)
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                with scheduler.priority(scheduler.BACKGROUND):
+                    current = await self.read_contents(session_id)
+            except scheduler.Shed:
+                continue
+            if current != previous:
+                previous = current
+                yield
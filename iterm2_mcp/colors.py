@@ -1,53 +1,150 @@
 """Color schemes for Claude-created iTerm2 sessions."""
 
-from . import applescript
+import json
+import os
+import re
+import sys
+from collections import OrderedDict
+
+from . import backends, metrics, topology
 
 # Tab colors: {r, g, b} in 8-bit (0-255) for iTerm2 escape sequences.
 
 SCHEMES = {
     "background_task": {"tab": (124, 58, 237)},   # Purple
     "split_pane":      {"tab": (59, 130, 246)},    # Blue
+    "alert":           {"tab": (220, 38, 38)},     # Red
+    "success":         {"tab": (22, 163, 74)},     # Green
+    "failure":         {"tab": (220, 38, 38)},     # Red
+    "running":         {"tab": (217, 119, 6)},     # Amber
 }
 
+# Resets the tab to the profile's color
+DEFAULT = "default"
 
-async def apply(session_id: str, scheme_name: str) -> None:
-    """Apply a tab color to a session by ID.
+# Most TTYs kept open between recolors
+MAX_HANDLES = 32
+
+_HEX = re.compile(r"#?([0-9a-fA-F]{6})")
+
+# Open TTY files by path, least recently used first
+_handles: OrderedDict[str, object] = OrderedDict()
+
+
+def parse(color: str) -> tuple[int, int, int] | None:
+    """Return the RGB of a scheme name or ``#rrggbb`` color, else None."""
+    scheme = SCHEMES.get(color)
+    if scheme:
+        return scheme["tab"]
+    m = _HEX.fullmatch(color.strip())
+    if m:
+        value = int(m.group(1), 16)
+        return value >> 16, (value >> 8) & 0xFF, value & 0xFF
+    return None
+
+
+def _load_user_schemes() -> None:
+    """Add schemes from ``ITERM_MCP_COLOR_SCHEMES``, a JSON object such
+    as ``{"deploy": "#f97316"}``."""
+    text = os.environ.get("ITERM_MCP_COLOR_SCHEMES", "")
+    if not text:
+        return
+    try:
+        schemes = dict(json.loads(text))
+    except (ValueError, TypeError) as e:
+        print(f"iterm2-mcp: ignoring ITERM_MCP_COLOR_SCHEMES: {e}", file=sys.stderr)
+        return
+    for name, color in schemes.items():
+        rgb = parse(color) if isinstance(color, str) else None
+        if rgb is None:
+            print(f"iterm2-mcp: ignoring color scheme {name!r}: bad color {color!r}", file=sys.stderr)
+            continue
+        SCHEMES[name] = {"tab": rgb}
+
+
+_load_user_schemes()
+
+
+def _payload(rgb: tuple[int, int, int] | None) -> str:
+    if rgb is None:
+        return "\x1b]6;1;bg;*;default\x07"
+    return (
+        f"\x1b]6;1;bg;red;brightness;{rgb[0]}\x07"
+        f"\x1b]6;1;bg;green;brightness;{rgb[1]}\x07"
+        f"\x1b]6;1;bg;blue;brightness;{rgb[2]}\x07"
+    )
+
+
+def close(tty: str) -> None:
+    """Close the cached handle for *tty*, if any."""
+    f = _handles.pop(tty, None)
+    if f is not None:
+        try:
+            f.close()
+        except OSError:
+            pass
+
+
+def _forget_closed(changes: list[dict]) -> None:
+    for c in changes:
+        if c["type"] == "removed" and c.get("tty"):
+            close(c["tty"])
+
+
+topology.subscribe(_forget_closed)
+
+
+@metrics.instrument("tty_write")
+def write(tty: str, rgb: tuple[int, int, int] | None) -> None:
+    """Set the tab color of the session on *tty* (None resets it).
 
     Writes iTerm2 proprietary OSC sequences directly to the session's
-    TTY to avoid them appearing as visible text in the terminal.
+    TTY to avoid them appearing as visible text in the terminal. Handles
+    stay open for later recolors, up to ``MAX_HANDLES``.
+    """
+    payload = _payload(rgb)
+    for attempt in range(2):
+        f = _handles.get(tty)
+        if f is None:
+            # O_NOCTTY: the daemon is a session leader without a terminal
+            f = os.fdopen(os.open(tty, os.O_WRONLY | os.O_NOCTTY), "w")
+            _handles[tty] = f
+            while len(_handles) > MAX_HANDLES:
+                close(next(iter(_handles)))
+        else:
+            _handles.move_to_end(tty)
+        try:
+            f.write(payload)
+            f.flush()
+            return
+        except OSError:
+            # A stale handle (the TTY was closed and reopened); retry once
+            close(tty)
+            if attempt:
+                raise
+
+
+async def _tty_of(session_id: str) -> str:
+    """Return a session's TTY, from the last inventory when it is known."""
+    for s in topology.current():
+        if s["session_id"] == session_id and s["tty"]:
+            return s["tty"]
+    return await backends.get().session_tty(session_id)
+
+
+async def apply(session_id: str, scheme_name: str, tty: str = "") -> None:
+    """Apply a tab color to a session by ID.
+
+    Args:
+        session_id:  The session to recolor.
+        scheme_name: A ``SCHEMES`` name or ``#rrggbb``; unknown names are ignored.
+        tty:         The session's TTY, if known, to skip looking it up.
     """
-    scheme = SCHEMES.get(scheme_name)
-    if not scheme:
+    rgb = parse(scheme_name)
+    if rgb is None:
         return
 
-    # Resolve the TTY path for this session
-    sid = applescript.escape(session_id)
-    script = f'''
-tell application "iTerm2"
-    repeat with w in windows
-        repeat with t in tabs of w
-            repeat with s in sessions of t
-                if id of s is "{sid}" then
-                    return tty of s
-                end if
-            end repeat
-        end repeat
-    end repeat
-    return ""
-end tell
-'''
-    tty = await applescript.run(script)
+    tty = tty or await _tty_of(session_id)
     if not tty:
         return
-
-    tab = scheme["tab"]
-    payload = (
-        f"\x1b]6;1;bg;red;brightness;{tab[0]}\x07"
-        f"\x1b]6;1;bg;green;brightness;{tab[1]}\x07"
-        f"\x1b]6;1;bg;blue;brightness;{tab[2]}\x07"
-    )
-
-    # Write directly to TTY — bypasses the shell so nothing is echoed
-    with open(tty, "w") as f:
-        f.write(payload)
-        f.flush()
+    write(tty, rgb)
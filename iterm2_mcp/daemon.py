@@ -0,0 +1,261 @@
+"""Shared per-user daemon and the stdio proxy that connects to it.
+
+In shared mode (``server.py --shared`` or ``ITERM_MCP_SHARED=1``) each
+Claude session's ``server.py`` is a thin proxy that copies MCP messages
+between its stdio and a single daemon listening on a Unix socket. The
+daemon serves every client from one process, so they share the session
+inventory, caches, backend connection and state file, and their tool
+calls are scheduled fairly (see ``scheduler``).
+
+Before the MCP stream, the proxy sends one handshake line,
+``{"client": {...}}``, identifying the client (pid, TTY and
+``ITERM_SESSION_ID`` when known). The first proxy to find no daemon
+starts one; it exits after ``ITERM_MCP_DAEMON_IDLE`` seconds (default
+600, 0 = never) without clients. The socket, lock and log live in
+``ITERM_MCP_DAEMON_DIR`` (default ``/tmp/iterm2-mcp-<uid>``).
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+SERVER_SCRIPT = Path(__file__).resolve().parent.parent / "server.py"
+
+# Largest single MCP message line accepted from a client
+MAX_LINE_BYTES = 64 * 1024 * 1024
+
+# How long a proxy waits for a daemon it started to begin listening
+START_TIMEOUT = 10.0
+
+
+def runtime_dir() -> Path:
+    """Return the private directory holding the socket, lock and log.
+
+    Raises RuntimeError if it exists but belongs to another user.
+    """
+    default = f"/tmp/iterm2-mcp-{os.getuid()}"
+    path = Path(os.environ.get("ITERM_MCP_DAEMON_DIR", default))
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if path.stat().st_uid != os.getuid():
+        raise RuntimeError(f"{path} is owned by another user; refusing to use it.")
+    return path
+
+
+def socket_path() -> Path:
+    return runtime_dir() / "daemon.sock"
+
+
+def shared_mode() -> bool:
+    """Return whether ``server.py`` should run as a proxy to the daemon."""
+    return "--shared" in sys.argv or os.environ.get("ITERM_MCP_SHARED", "") not in ("", "0")
+
+
+# ── Proxy ──
+
+
+def _client_identity() -> dict:
+    tty = ""
+    for fd in (0, 1, 2):
+        try:
+            tty = os.ttyname(fd)
+            break
+        except OSError:
+            continue
+    return {
+        "pid": os.getppid(),
+        "tty": tty,
+        "iterm_session_id": os.environ.get("ITERM_SESSION_ID", ""),
+        "cwd": os.getcwd(),
+    }
+
+
+def _start_daemon() -> None:
+    log = open(runtime_dir() / "daemon.log", "ab")
+    subprocess.Popen(
+        [sys.executable, str(SERVER_SCRIPT), "--daemon"],
+        stdin=subprocess.DEVNULL,
+        stdout=log,
+        stderr=log,
+        start_new_session=True,
+    )
+    log.close()
+
+
+def _connect() -> socket.socket:
+    """Connect to the daemon, starting it if nothing is listening."""
+    path = str(socket_path())
+    deadline = None
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            return sock
+        except (FileNotFoundError, ConnectionRefusedError):
+            sock.close()
+        if deadline is None:
+            _start_daemon()
+            deadline = time.monotonic() + START_TIMEOUT
+        elif time.monotonic() > deadline:
+            raise RuntimeError(f"The iterm2-mcp daemon did not start; see {runtime_dir() / 'daemon.log'}.")
+        time.sleep(0.05)
+
+
+def proxy() -> None:
+    """Relay stdio to the shared daemon until either side closes."""
+    sock = _connect()
+    sock.sendall((json.dumps({"client": _client_identity()}) + "\n").encode())
+
+    def pump_stdin():
+        try:
+            while chunk := os.read(0, 65536):
+                sock.sendall(chunk)
+        except OSError:
+            pass
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    threading.Thread(target=pump_stdin, daemon=True).start()
+    out = sys.stdout.buffer
+    try:
+        while chunk := sock.recv(65536):
+            out.write(chunk)
+            out.flush()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+# ── Daemon ──
+
+
+class _LineReader:
+    """Async line iterator over a socket, in the shape stdio_server expects."""
+
+    def __init__(self, reader: asyncio.StreamReader, first: bytes = b""):
+        self._reader = reader
+        self._first = first
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self._first:
+            line, self._first = self._first, b""
+        else:
+            line = await self._reader.readline()
+        if not line:
+            raise StopAsyncIteration
+        return line.decode("utf-8", errors="replace")
+
+
+class _Writer:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self._writer = writer
+
+    async def write(self, text: str) -> None:
+        self._writer.write(text.encode())
+
+    async def flush(self) -> None:
+        await self._writer.drain()
+
+
+class Daemon:
+    """Serve MCP to any number of proxy connections from one process."""
+
+    def __init__(self, mcp, idle_timeout: float | None = None):
+        self.mcp = mcp
+        if idle_timeout is None:
+            idle_timeout = float(os.environ.get("ITERM_MCP_DAEMON_IDLE", "600"))
+        self.idle_timeout = idle_timeout
+        self.clients: dict[str, dict] = {}
+        self._ids = itertools.count(1)
+        self._stop = asyncio.Event()
+        self._idle_timer: asyncio.TimerHandle | None = None
+
+    def _client_changed(self) -> None:
+        from . import metrics
+
+        metrics.set_gauge("daemon.clients", len(self.clients))
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        if not self.clients and self.idle_timeout > 0:
+            self._idle_timer = asyncio.get_running_loop().call_later(self.idle_timeout, self._stop.set)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        from mcp.server.stdio import stdio_server
+
+        from .scheduler import client_disconnected, current_client
+
+        first = await reader.readline()
+        client = {}
+        try:
+            hello = json.loads(first)
+            if isinstance(hello, dict) and "client" in hello:
+                client, first = dict(hello["client"]), b""
+        except ValueError:
+            pass
+        client["id"] = f"c{next(self._ids)}"
+        client["connected_at"] = time.time()
+        self.clients[client["id"]] = client
+        self._client_changed()
+
+        token = current_client.set(client)
+        server = self.mcp._mcp_server
+        try:
+            async with stdio_server(_LineReader(reader, first), _Writer(writer)) as (read, write):
+                await server.run(read, write, server.create_initialization_options())
+        except Exception as e:
+            print(f"client {client['id']}: {e!r}", file=sys.stderr)
+        finally:
+            current_client.reset(token)
+            del self.clients[client["id"]]
+            client_disconnected(client["id"])
+            self._client_changed()
+            writer.close()
+
+    async def serve(self, path: Path) -> None:
+        """Listen on *path* until idle for ``idle_timeout`` seconds."""
+        path.unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self.handle, path=str(path), limit=MAX_LINE_BYTES)
+        os.chmod(path, 0o600)
+        self._client_changed()
+        async with server:
+            await self._stop.wait()
+        path.unlink(missing_ok=True)
+
+
+def serve(started: float | None = None) -> None:
+    """Run the daemon in the foreground unless one is already running.
+
+    Args:
+        started: ``time.perf_counter()`` at process start, for ``startup``.
+    """
+    import fcntl
+
+    lock = open(runtime_dir() / "daemon.lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print("iterm2-mcp daemon already running.", file=sys.stderr)
+        return
+
+    from . import startup
+
+    if started is not None:
+        startup.started_at(started)
+    from ._server import mcp
+    from .tools import register_all
+
+    startup.mark("imports")
+    register_all(mcp)
+    startup.mark("tools")
+    asyncio.run(Daemon(mcp).serve(socket_path()))
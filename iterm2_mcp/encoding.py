@@ -0,0 +1,90 @@
+"""Compact JSON encoding, field projection and pagination for tool responses."""
+
+import json
+
+from . import metrics, offload, profiling
+
+_WINDOW_FIELDS = ("window_id", "window_name")
+
+
+@metrics.instrument("encode")
+def encode(obj) -> str:
+    """Serialize a tool response as compact JSON.
+
+    Large string values (an output buffer) are escaped a chunk at a time,
+    so an offloaded encode does not hold the GIL for the whole buffer.
+    """
+    with profiling.span("encode"):
+        if isinstance(obj, dict) and any(
+            isinstance(v, str) and len(v) > offload.CHUNK_BYTES for v in obj.values()
+        ):
+            return "{" + ",".join(
+                f"{_dumps(k)}:{_dumps_chunked(v) if isinstance(v, str) else _dumps(v)}"
+                for k, v in obj.items()
+            ) + "}"
+        return _dumps(obj)
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def _dumps_chunked(text: str) -> str:
+    # String escaping is per character, so escaped pieces concatenate
+    return '"' + "".join(_dumps(piece)[1:-1] for piece in offload.chunks(text)) + '"'
+
+
+def parse_fields(fields: str) -> list[str]:
+    """Parse a comma-separated ``fields`` argument into a list of names."""
+    return [f.strip() for f in fields.split(",") if f.strip()]
+
+
+def project(records: list[dict], fields: list[str]) -> list[dict]:
+    """Keep only *fields* of each record (all fields if *fields* is empty)."""
+    if not fields:
+        return records
+    return [{k: r[k] for k in fields if k in r} for r in records]
+
+
+def paginate(items: list, limit: int, cursor: str = "") -> tuple[list, str | None]:
+    """Return ``(page, next_cursor)`` for an offset-based cursor.
+
+    A *limit* of 0 returns everything from the cursor onwards.
+
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        start = int(cursor) if cursor else 0
+    except ValueError:
+        raise ValueError(f"Invalid cursor '{cursor}'.") from None
+    if start < 0:
+        raise ValueError(f"Invalid cursor '{cursor}'.")
+    if limit <= 0:
+        return items[start:], None
+    end = start + limit
+    return items[start:end], (str(end) if end < len(items) else None)
+
+
+def group_by_window(sessions: list[dict], fields: list[str] | None = None) -> list[dict]:
+    """Group sessions under their window so window metadata appears once.
+
+    Each group is ``{window_id, window_name, sessions}``; the window fields
+    are removed from the nested session objects, and *fields* (if given)
+    projects the remaining session fields.
+    """
+    groups: dict = {}
+    for s in sessions:
+        wid = s.get("window_id")
+        group = groups.get(wid)
+        if group is None:
+            group = groups[wid] = {
+                "window_id": wid,
+                "window_name": s.get("window_name", ""),
+                "sessions": [],
+            }
+        entry = {k: v for k, v in s.items() if k not in _WINDOW_FIELDS}
+        group["sessions"].append(entry)
+    if fields:
+        for group in groups.values():
+            group["sessions"] = project(group["sessions"], fields)
+    return list(groups.values())
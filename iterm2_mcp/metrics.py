@@ -0,0 +1,271 @@
+"""Lightweight call metrics: counts, errors, bytes and latency histograms.
+
+Disabled unless ``ITERM_MCP_METRICS`` is set (or enabled through the
+``iterm_stats`` tool); when disabled, an instrumented call costs a single
+flag check. When ``ITERM_MCP_METRICS_TEXTFILE`` is set, a Prometheus
+textfile-collector snapshot is rewritten every
+``ITERM_MCP_METRICS_INTERVAL`` seconds (default 15). While the server
+runs, event-loop lag is sampled every ``LAG_INTERVAL`` seconds.
+Offloaded stages (see ``offload``) record from worker threads, so the
+recorded values are only touched under ``_lock``.
+"""
+
+import asyncio
+import bisect
+import functools
+import inspect
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds: 100µs doubling up to ~52s
+BUCKETS = [0.0001 * 2 ** k for k in range(20)]
+
+TEXTFILE_ENV = "ITERM_MCP_METRICS_TEXTFILE"
+INTERVAL_ENV = "ITERM_MCP_METRICS_INTERVAL"
+
+# Seconds between event-loop lag samples
+LAG_INTERVAL = 0.1
+
+_enabled = os.environ.get("ITERM_MCP_METRICS", "") not in ("", "0")
+_lock = threading.Lock()
+_stats: dict[str, dict] = {}
+_gauges: dict[str, float] = {}
+_started = time.time()
+_dump_task: asyncio.Task | None = None
+_dump_checked = False
+_lag_task: asyncio.Task | None = None
+
+
+def enabled() -> bool:
+    """Return whether metrics are being recorded."""
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    """Turn metric recording on or off."""
+    global _enabled
+    _enabled = on
+
+
+def reset() -> None:
+    """Discard all recorded metrics."""
+    global _started
+    with _lock:
+        _stats.clear()
+        _gauges.clear()
+        _started = time.time()
+
+
+def record(
+    name: str,
+    seconds: float,
+    error: bool = False,
+    bytes_in: int = 0,
+    bytes_out: int = 0,
+) -> None:
+    """Record one call of operation *name*; safe to call from any thread."""
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = {
+                "calls": 0, "errors": 0, "bytes_in": 0, "bytes_out": 0,
+                "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1),
+            }
+        stat["calls"] += 1
+        stat["errors"] += error
+        stat["bytes_in"] += bytes_in
+        stat["bytes_out"] += bytes_out
+        stat["sum"] += seconds
+        stat["max"] = max(stat["max"], seconds)
+        stat["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+    _ensure_textfile_dump()
+
+
+def set_gauge(name: str, value: float) -> None:
+    """Set a point-in-time gauge (e.g. a queue depth)."""
+    if _enabled:
+        with _lock:
+            _gauges[name] = value
+
+
+def _size(value) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 0
+
+
+def _args_size(args, kwargs) -> int:
+    return sum(_size(a) for a in args) + sum(_size(v) for v in kwargs.values())
+
+
+def instrument(name: str):
+    """Decorate a sync or async function to record metrics under *name*.
+
+    Bytes in/out are the lengths of string arguments and of a string
+    return value.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    result = await fn(*args, **kwargs)
+                except BaseException:
+                    record(name, time.perf_counter() - start, True, _args_size(args, kwargs))
+                    raise
+                record(name, time.perf_counter() - start, False,
+                       _args_size(args, kwargs), _size(result))
+                return result
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not _enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException:
+                    record(name, time.perf_counter() - start, True, _args_size(args, kwargs))
+                    raise
+                record(name, time.perf_counter() - start, False,
+                       _args_size(args, kwargs), _size(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def _percentile(stat: dict, q: float) -> float:
+    """Estimate the *q* quantile (seconds) by interpolating within a bucket."""
+    target = q * stat["calls"]
+    seen = 0
+    for i, n in enumerate(stat["buckets"]):
+        if n and seen + n >= target:
+            lower = BUCKETS[i - 1] if i > 0 else 0.0
+            upper = BUCKETS[i] if i < len(BUCKETS) else stat["max"]
+            return min(lower + (upper - lower) * (target - seen) / n, stat["max"])
+        seen += n
+    return 0.0
+
+
+def _copy() -> tuple[dict[str, dict], dict[str, float]]:
+    """Return a consistent copy of the recorded stats and gauges."""
+    with _lock:
+        stats = {name: dict(stat, buckets=list(stat["buckets"])) for name, stat in _stats.items()}
+        return stats, dict(_gauges)
+
+
+def snapshot() -> dict:
+    """Return per-operation summaries with p50/p95/p99 latencies in ms."""
+    stats, gauges = _copy()
+    ops = {}
+    for name, stat in sorted(stats.items()):
+        count = stat["calls"]
+        ops[name] = {
+            "calls": count,
+            "errors": stat["errors"],
+            "bytes_in": stat["bytes_in"],
+            "bytes_out": stat["bytes_out"],
+            "mean_ms": round(1000 * stat["sum"] / count, 3) if count else 0.0,
+            "p50_ms": round(1000 * _percentile(stat, 0.50), 3),
+            "p95_ms": round(1000 * _percentile(stat, 0.95), 3),
+            "p99_ms": round(1000 * _percentile(stat, 0.99), 3),
+            "max_ms": round(1000 * stat["max"], 3),
+        }
+    return {
+        "enabled": _enabled,
+        "since": _started,
+        "operations": ops,
+        "gauges": dict(sorted(gauges.items())),
+    }
+
+
+def prometheus_text() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    out = []
+    stats, gauges = _copy()
+    stats = sorted(stats.items())
+    for family, key in (("calls", "calls"), ("errors", "errors"),
+                        ("bytes_in", "bytes_in"), ("bytes_out", "bytes_out")):
+        out.append(f"# TYPE iterm2_mcp_{family}_total counter")
+        for name, stat in stats:
+            out.append(f'iterm2_mcp_{family}_total{{op="{name}"}} {stat[key]}')
+
+    out.append("# TYPE iterm2_mcp_latency_seconds histogram")
+    for name, stat in stats:
+        op = f'op="{name}"'
+        cumulative = 0
+        for bound, n in zip(BUCKETS, stat["buckets"]):
+            cumulative += n
+            out.append(f'iterm2_mcp_latency_seconds_bucket{{{op},le="{bound:g}"}} {cumulative}')
+        out.append(f'iterm2_mcp_latency_seconds_bucket{{{op},le="+Inf"}} {stat["calls"]}')
+        out.append(f"iterm2_mcp_latency_seconds_sum{{{op}}} {stat['sum']:.6f}")
+        out.append(f"iterm2_mcp_latency_seconds_count{{{op}}} {stat['calls']}")
+
+    if gauges:
+        out.append("# TYPE iterm2_mcp_gauge gauge")
+        for name, value in sorted(gauges.items()):
+            out.append(f'iterm2_mcp_gauge{{name="{name}"}} {value:g}')
+    return "\n".join(out) + "\n"
+
+
+def write_textfile(path: str) -> None:
+    """Atomically write :func:`prometheus_text` to *path*."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+async def _dump_loop(path: str, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            write_textfile(path)
+        except OSError:
+            pass
+
+
+def _ensure_textfile_dump() -> None:
+    """Start the periodic textfile dump on first use, if configured."""
+    global _dump_task, _dump_checked
+    if _dump_checked:
+        return
+    path = os.environ.get(TEXTFILE_ENV)
+    if not path:
+        _dump_checked = True
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _dump_checked = True
+    interval = float(os.environ.get(INTERVAL_ENV, "15"))
+    _dump_task = loop.create_task(_dump_loop(path, interval))
+
+
+async def _lag_loop(interval: float) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        if _enabled:
+            lag = max(0.0, loop.time() - start - interval)
+            record("loop.lag", lag)
+            set_gauge("loop.lag_ms", round(1000 * lag, 3))
+
+
+def ensure_lag_monitor() -> None:
+    """Start sampling event-loop lag, if not already running on this loop.
+
+    Every ``LAG_INTERVAL`` seconds, the time a sleep overshot its deadline
+    (how long the loop was busy with something else) is recorded as the
+    ``loop.lag`` operation and the ``loop.lag_ms`` gauge.
+    """
+    global _lag_task
+    loop = asyncio.get_running_loop()
+    if _lag_task is None or _lag_task.done() or _lag_task.get_loop() is not loop:
+        _lag_task = loop.create_task(_lag_loop(LAG_INTERVAL))
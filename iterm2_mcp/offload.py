@@ -0,0 +1,65 @@
+"""Run CPU-heavy stages on worker threads once their input is large.
+
+Escape stripping, line splitting and diffing, output reduction, fuzzy
+matching and JSON encoding run on the event loop, where one multi-MB buffer would stall
+every other call, keystrokes included. From ``ITERM_MCP_OFFLOAD_BYTES``
+of input (default 64 KiB; 0 disables offloading) they run on a pool of
+``ITERM_MCP_OFFLOAD_WORKERS`` threads (default 2) instead. The work
+still holds the GIL, and a C call such as ``re.sub`` keeps it until it
+returns, so offloaded stages work through their input in newline-aligned
+pieces of ``CHUNK_BYTES`` (see :func:`chunks`); the loop gets the GIL
+back between pieces rather than after the whole stage.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+
+THRESHOLD = int(os.environ.get("ITERM_MCP_OFFLOAD_BYTES", str(64 * 1024)))
+MAX_WORKERS = int(os.environ.get("ITERM_MCP_OFFLOAD_WORKERS", "2"))
+
+# Largest piece a stage hands to a single C call (a few ms of work)
+CHUNK_BYTES = 64 * 1024
+
+_executor: ThreadPoolExecutor | None = None
+_running = 0
+
+
+def chunks(text: str, size: int = CHUNK_BYTES):
+    """Yield consecutive pieces of *text* of about *size* characters, each
+    ending just after a newline except the last."""
+    start, n = 0, len(text)
+    while start < n:
+        end = text.find("\n", start + size)
+        if end < 0:
+            yield text[start:]
+            return
+        yield text[start:end + 1]
+        start = end + 1
+
+
+async def run(size: int, fn, *args):
+    """Return ``fn(*args)``, computed on a worker thread if *size* is large.
+
+    Args:
+        size: The input size in bytes, or an estimate of equivalent work.
+        fn:   A synchronous function; it sees the caller's context
+              variables (so profiling spans still attach to the call).
+    """
+    global _executor, _running
+    if THRESHOLD <= 0 or size < THRESHOLD:
+        return fn(*args)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="iterm2-mcp-offload")
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    _running += 1
+    metrics.set_gauge("offload.running", _running)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, call)
+    finally:
+        _running -= 1
+        metrics.set_gauge("offload.running", _running)
@@ -0,0 +1,142 @@
+"""Pre-created sessions that ``iterm_acquire_session`` hands out instantly.
+
+Creating a session costs a couple of script round trips plus shell
+startup (rc files, prompt init) before a command can run. With
+``ITERM_MCP_POOL_SIZE`` set above 0, a background task keeps that many
+idle sessions open as tabs in a dedicated window, named ``POOL_NAME``,
+each one waited on until its shell has drawn a prompt. Acquiring one
+takes it out of the pool and wakes the task to create a replacement.
+
+The task starts on first use of the pool, or with the startup warm-up.
+It creates sessions at background priority (see ``scheduler``), behind
+any tool call; once a session exists, naming it and waiting for its
+prompt run at read priority, so shedding cannot leave it behind.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+
+from . import applescript, backends, metrics, scheduler, topology
+
+POOL_SIZE = int(os.environ.get("ITERM_MCP_POOL_SIZE", "0"))
+
+# Name pooled sessions carry until they are acquired
+POOL_NAME = "iterm-mcp pool"
+
+# How long to wait for a new session's prompt, and how often to look
+READY_TIMEOUT = 10.0
+READY_POLL = 0.2
+
+# Seconds to wait before retrying after failing to create a session
+RETRY_INTERVAL = 5.0
+
+_idle: deque[dict] = deque()
+_window_id: str | None = None
+_task: asyncio.Task | None = None
+_wake: asyncio.Event | None = None
+
+
+def _forget_closed(changes: list[dict]) -> None:
+    """Drop idle sessions closed by hand and wake the task to replace them."""
+    closed = {c["session_id"] for c in changes if c["type"] == "removed"}
+    kept = [s for s in _idle if s["session_id"] not in closed]
+    if len(kept) < len(_idle):
+        _idle.clear()
+        _idle.extend(kept)
+        metrics.set_gauge("pool.idle", len(_idle))
+        if _wake is not None:
+            _wake.set()
+
+
+topology.subscribe(_forget_closed)
+
+
+def enabled() -> bool:
+    return POOL_SIZE > 0
+
+
+def window_id() -> str | None:
+    """Return the ID of the pool's window, once it has been created."""
+    return _window_id
+
+
+def ensure_started() -> None:
+    """Start the task that keeps the pool filled, if enabled and not running."""
+    global _task, _wake
+    if not enabled() or (_task is not None and not _task.done()):
+        return
+    _wake = asyncio.Event()
+    _task = asyncio.get_running_loop().create_task(_maintain())
+
+
+def acquire() -> dict | None:
+    """Take an idle ``{session_id, tty}`` from the pool, or None if it is empty."""
+    ensure_started()
+    if not _idle:
+        return None
+    session = _idle.popleft()
+    metrics.set_gauge("pool.idle", len(_idle))
+    if _wake is not None:
+        _wake.set()
+    return session
+
+
+def release(session: dict) -> None:
+    """Put back an acquired session that was not used, still named ``POOL_NAME``."""
+    _idle.appendleft(session)
+    metrics.set_gauge("pool.idle", len(_idle))
+
+
+async def _wait_ready(session_id: str) -> None:
+    """Wait until the session shows any output, i.e. its prompt."""
+    backend = backends.get()
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if (await backend.read_contents(session_id)).strip():
+            return
+        await asyncio.sleep(READY_POLL)
+
+
+async def _create() -> dict:
+    global _window_id
+    backend = backends.get()
+    if _window_id is not None:
+        try:
+            created = await backend.create_tab(_window_id)
+        except (scheduler.Shed, applescript.ScriptTimeout, applescript.CircuitOpen):
+            raise
+        except RuntimeError:
+            # The pool window was closed; open a new one
+            _window_id = None
+    if _window_id is None:
+        created = await backend.create_window()
+        _window_id = created.pop("window_id")
+    try:
+        with scheduler.priority(scheduler.READ):
+            await backend.set_name(created["session_id"], POOL_NAME)
+            await _wait_ready(created["session_id"])
+    except RuntimeError as e:
+        # The session exists either way; pool it rather than lose track of it
+        print(f"iterm2-mcp pool: {e}", file=sys.stderr)
+    return created
+
+
+async def _maintain() -> None:
+    while True:
+        while len(_idle) < POOL_SIZE:
+            try:
+                with scheduler.priority(scheduler.BACKGROUND):
+                    session = await _create()
+            except scheduler.Shed:
+                continue
+            except RuntimeError as e:
+                print(f"iterm2-mcp pool: {e}", file=sys.stderr)
+                await asyncio.sleep(RETRY_INTERVAL)
+                continue
+            _idle.append(session)
+            metrics.set_gauge("pool.idle", len(_idle))
+        _wake.clear()
+        await _wake.wait()
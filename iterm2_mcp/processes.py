@@ -0,0 +1,151 @@
+"""Process-table snapshots grouped by controlling TTY.
+
+One ``ps -A`` call lists every process with its TTY, process group and
+the TTY's foreground process group, so all sessions are inspected at
+once instead of running ``ps -t`` per session. Snapshots are cached for
+``SNAPSHOT_TTL`` seconds and concurrent callers share one ``ps`` run.
+The ``ps`` keywords used are common to macOS and Linux (procps).
+"""
+
+import asyncio
+import time
+
+from . import metrics, profiling
+
+# Seconds a snapshot is reused before ``ps`` runs again
+SNAPSHOT_TTL = 1.0
+
+PS_COMMAND = (
+    "ps", "-A", "-ww",
+    "-o", "pid=,ppid=,pgid=,tpgid=,stat=,tty=,%cpu=,rss=,etime=,args=",
+)
+
+_snapshot: tuple[float, dict[str, list[dict]]] | None = None
+_pending: asyncio.Future | None = None
+
+
+def _elapsed_seconds(etime: str) -> int:
+    """Parse ``ps`` etime, ``[[dd-]hh:]mm:ss``, into seconds."""
+    days, _, clock = etime.rpartition("-")
+    seconds = 0
+    for part in clock.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds + int(days or 0) * 86400
+
+
+def tty_key(tty: str) -> str:
+    """Normalize a TTY path or ``ps`` TTY column ("ttys004", "pts/3")."""
+    return tty.removeprefix("/dev/")
+
+
+def parse_ps(output: str) -> dict[str, list[dict]]:
+    """Group ``PS_COMMAND`` output rows by TTY, skipping processes without one."""
+    by_tty: dict[str, list[dict]] = {}
+    for line in output.splitlines():
+        fields = line.split(None, 9)
+        if len(fields) < 10:
+            continue
+        pid, ppid, pgid, tpgid, stat, tty, cpu, rss, etime, args = fields
+        if tty in ("?", "??", "-"):
+            continue
+        try:
+            process = {
+                "pid": int(pid),
+                "ppid": int(ppid),
+                "pgid": int(pgid),
+                "tpgid": int(tpgid),
+                "stat": stat,
+                "cpu_percent": float(cpu),
+                "rss_kb": int(rss),
+                "elapsed_s": _elapsed_seconds(etime),
+                "command": args,
+            }
+        except ValueError:
+            continue
+        by_tty.setdefault(tty_key(tty), []).append(process)
+    return by_tty
+
+
+@metrics.instrument("ps_snapshot")
+@profiling.traced("ps_snapshot")
+async def _run_ps() -> dict[str, list[dict]]:
+    proc = await asyncio.create_subprocess_exec(
+        *PS_COMMAND,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0 and not stdout:
+        raise RuntimeError(f"ps failed: {stderr.decode().strip()}")
+    with profiling.span("parse", bytes=len(stdout)):
+        return parse_ps(stdout.decode(errors="replace"))
+
+
+async def _refresh() -> dict[str, list[dict]]:
+    global _snapshot, _pending
+    try:
+        by_tty = await _run_ps()
+        _snapshot = (time.monotonic(), by_tty)
+        return by_tty
+    finally:
+        _pending = None
+
+
+async def snapshot() -> dict[str, list[dict]]:
+    """Return processes by TTY, from cache if younger than ``SNAPSHOT_TTL``."""
+    global _pending
+    if _snapshot is not None and time.monotonic() - _snapshot[0] < SNAPSHOT_TTL:
+        return _snapshot[1]
+    if _pending is None:
+        _pending = asyncio.ensure_future(_refresh())
+    return await asyncio.shield(_pending)
+
+
+def summarize(processes: list[dict], tree: bool = False) -> dict:
+    """Describe one TTY's processes: its shell, foreground job and totals.
+
+    The shell is the session leader (``s`` in ``stat``), or its child if
+    that is ``login``; the foreground job is the TTY's foreground process
+    group, reported by its leader. The TTY is ``idle`` when that group is
+    the shell's own, and ``none`` when no process has it as controlling
+    terminal.
+    """
+    shell = next((p for p in processes if "s" in p["stat"]), None)
+    if shell is None and processes:
+        shell = min(processes, key=lambda p: p["pid"])
+    if shell is not None and shell["command"].split()[0].rsplit("/", 1)[-1] == "login":
+        # macOS: iTerm2 starts the shell through login(1)
+        shell = next((p for p in processes if p["ppid"] == shell["pid"]), shell)
+    tpgid = processes[0]["tpgid"] if processes else -1
+    group = [p for p in processes if p["pgid"] == tpgid] or [p for p in processes if "+" in p["stat"]]
+    foreground = next((p for p in group if p["pid"] == p["pgid"]), None)
+    if foreground is None and group:
+        foreground = min(group, key=lambda p: p["elapsed_s"])
+
+    def brief(p: dict | None) -> dict | None:
+        if p is None:
+            return None
+        return {k: p[k] for k in ("pid", "command", "cpu_percent", "rss_kb", "elapsed_s")}
+
+    if not processes:
+        state = "none"
+    elif foreground is None or (shell is not None and foreground["pgid"] == shell["pgid"]):
+        state = "idle"
+    else:
+        state = "busy"
+
+    result = {
+        "state": state,
+        "shell": brief(shell),
+        "foreground": brief(foreground),
+        "process_count": len(processes),
+        "cpu_percent": round(sum(p["cpu_percent"] for p in processes), 1),
+        "rss_kb": sum(p["rss_kb"] for p in processes),
+    }
+    if tree:
+        result["processes"] = [
+            {k: p[k] for k in ("pid", "ppid", "command", "stat", "cpu_percent", "rss_kb", "elapsed_s")}
+            for p in sorted(processes, key=lambda p: p["pid"])
+        ]
+    return result
+
@@ -0,0 +1,225 @@
+"""Opt-in, sampled per-call profiling of tool handlers.
+
+Two modes, selected with ``ITERM_MCP_PROFILE`` or the ``iterm_profile``
+tool:
+
+``spans``
+    A lightweight trace of the stages of each call (resolve, spawn, wait,
+    parse, strip, encode), written as Chrome trace-event JSON that loads in
+    Perfetto or ``chrome://tracing``.
+``cprofile``
+    A full cProfile of the call, written as a pstats file that loads in
+    snakeviz, gprof2dot or ``python -m pstats``. Only one call is profiled
+    at a time. The profiler sees everything the event loop runs while the
+    call is in flight, so the file also includes any calls running
+    concurrently with it; profile with one call at a time for clean data.
+
+``ITERM_MCP_PROFILE_SAMPLE`` (0-1, default 1) sets the fraction of calls
+traced. Traces go to ``ITERM_MCP_PROFILE_DIR``, which keeps the newest
+``ITERM_MCP_PROFILE_KEEP`` files (default 100). They are written on a
+worker thread after the call returns, so the write adds nothing to the
+call's latency.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+MODES = ("off", "spans", "cprofile")
+
+CPROFILE_NOTE = (
+    "cProfile covers the whole event loop: each .prof file also includes "
+    "whatever other calls ran while the profiled call was in flight."
+)
+
+_mode = os.environ.get("ITERM_MCP_PROFILE", "") or "off"
+if _mode not in MODES:
+    print(f"iterm2-mcp: ignoring ITERM_MCP_PROFILE={_mode!r}; valid modes: {list(MODES)}", file=sys.stderr)
+    _mode = "off"
+_sample_rate = float(os.environ.get("ITERM_MCP_PROFILE_SAMPLE", "1"))
+TRACE_DIR = Path(os.environ.get("ITERM_MCP_PROFILE_DIR", "/tmp/iterm2-mcp-profiles"))
+KEEP_FILES = int(os.environ.get("ITERM_MCP_PROFILE_KEEP", "100"))
+
+# Span events of the call being traced in the current task, if any
+_trace: contextvars.ContextVar[list | None] = contextvars.ContextVar("iterm_mcp_trace", default=None)
+_NO_SPAN = contextlib.nullcontext()
+_cprofile_active = False
+
+# Trace writes still in flight (kept referenced until they finish)
+_writes: set[asyncio.Task] = set()
+
+
+def configure(mode: str | None = None, sample_rate: float | None = None) -> None:
+    """Change the profiling mode and/or sample rate.
+
+    Raises ValueError for an unknown mode or a rate outside 0-1.
+    """
+    global _mode, _sample_rate
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}'. Valid modes: {list(MODES)}")
+        _mode = mode
+    if sample_rate is not None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1.")
+        _sample_rate = sample_rate
+
+
+def status() -> dict:
+    """Return the current configuration and the newest trace files."""
+    files = _trace_files()
+    result = {
+        "mode": _mode,
+        "sample_rate": _sample_rate,
+        "directory": str(TRACE_DIR),
+        "recent": [str(p) for p in files[-5:]],
+    }
+    if _mode == "cprofile":
+        result["note"] = CPROFILE_NOTE
+    return result
+
+
+class _Span:
+    __slots__ = ("events", "name", "args", "start")
+
+    def __init__(self, events: list, name: str, args: dict):
+        self.events = events
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.events.append({
+            "name": self.name,
+            "ph": "X",
+            "ts": round(self.start * 1e6, 1),
+            "dur": round((end - self.start) * 1e6, 1),
+            "pid": os.getpid(),
+            # Each call has its own file; lanes are the threads spans ran on
+            "tid": threading.get_ident(),
+            "args": self.args,
+        })
+        return False
+
+
+def span(name: str, **args):
+    """Context manager timing one stage of the call being traced.
+
+    A no-op (a shared null context) unless the current call is sampled in
+    ``spans`` mode.
+    """
+    events = _trace.get()
+    if events is None:
+        return _NO_SPAN
+    return _Span(events, name, args)
+
+
+def traced(name: str):
+    """Decorate an async function so it is recorded as a span named *name*."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if _trace.get() is None:
+                return await fn(*args, **kwargs)
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _trace_files() -> list[Path]:
+    try:
+        files = [p for p in TRACE_DIR.iterdir() if p.suffix in (".json", ".prof")]
+    except OSError:
+        return []
+    return sorted(files, key=lambda p: p.name)
+
+
+def _output_path(tool: str, suffix: str) -> Path:
+    TRACE_DIR.mkdir(parents=True, exist_ok=True)
+    return TRACE_DIR / f"{time.time_ns()}-{tool}{suffix}"
+
+
+def _rotate() -> None:
+    """Delete the oldest trace files beyond ``KEEP_FILES``."""
+    files = _trace_files()
+    for old in files[:max(0, len(files) - KEEP_FILES)]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+def _write_spans(tool: str, events: list) -> None:
+    path = _output_path(tool, ".trace.json")
+    path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+    _rotate()
+
+
+def _write_profile(tool: str, profile) -> None:
+    profile.dump_stats(_output_path(tool, ".prof"))
+    _rotate()
+
+
+async def _write(fn, *args) -> None:
+    try:
+        await asyncio.to_thread(fn, *args)
+    except OSError:
+        pass
+
+
+def _write_later(fn, *args) -> None:
+    """Run the trace writer *fn* on a worker thread without waiting for it."""
+    task = asyncio.get_running_loop().create_task(_write(fn, *args))
+    _writes.add(task)
+    task.add_done_callback(_writes.discard)
+
+
+def wrap(name: str):
+    """Decorate an async tool handler so sampled calls are profiled."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            global _cprofile_active
+            if _mode == "off" or random.random() >= _sample_rate:
+                return await fn(*args, **kwargs)
+
+            if _mode == "spans":
+                events: list = []
+                token = _trace.set(events)
+                call_args = {f"arg{i}": repr(v)[:200] for i, v in enumerate(args)}
+                call_args.update((k, repr(v)[:200]) for k, v in kwargs.items())
+                try:
+                    with _Span(events, name, call_args):
+                        return await fn(*args, **kwargs)
+                finally:
+                    _trace.reset(token)
+                    _write_later(_write_spans, name, events)
+
+            if _cprofile_active:
+                return await fn(*args, **kwargs)
+            import cProfile
+
+            profile = cProfile.Profile()
+            _cprofile_active = True
+            profile.enable()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                _cprofile_active = False
+                _write_later(_write_profile, name, profile)
+        return wrapper
+    return decorator
@@ -0,0 +1,120 @@
+"""Opt-in recording of tool calls to a trace file, for replay as load.
+
+Start with ``ITERM_MCP_RECORD=<path>`` or the ``iterm_record`` tool.
+The trace is JSON lines, appended to the file: a header
+``{"trace": 1, "started": <unix time>}`` and then one line per call::
+
+    {"t": 12.345, "tool": "iterm_send_keys", "args": {"identifier": "w0t0p0", "keys": "ctrl+c"}, "ms": 31.2, "bytes": 48}
+
+``t`` is seconds since the header, ``ms`` the call's latency including
+its wait for a tool slot, and ``bytes`` the response size. Arguments
+left at their defaults are omitted. A call that raised has ``"error"``
+set to the exception type, and one that returned an error response has
+``"error": "response"``. Arguments are recorded verbatim, including
+command text. ``python -m benchmarks.replay_trace`` re-issues a trace
+against the simulated iTerm2.
+"""
+
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+
+TRACE_VERSION = 1
+
+# Argument types written to the trace (the MCP Context is not one)
+_JSON_TYPES = (str, int, float, bool, list, dict, type(None))
+
+_file = None
+_path = ""
+_started = 0.0
+_calls = 0
+
+
+def start(path: str) -> None:
+    """Append calls to the trace at *path*, closing any current trace.
+
+    Raises OSError if the file cannot be opened.
+    """
+    global _file, _path, _started, _calls
+    f = open(os.path.expanduser(path), "a", buffering=1, encoding="utf-8")
+    stop()
+    _file, _path, _started, _calls = f, path, time.perf_counter(), 0
+    _file.write(json.dumps({"trace": TRACE_VERSION, "started": round(time.time(), 3)}, separators=(",", ":")) + "\n")
+
+
+def stop() -> None:
+    """Stop recording and close the trace file."""
+    global _file
+    f, _file = _file, None
+    if f is not None:
+        try:
+            f.close()
+        except OSError:
+            pass
+
+
+def status() -> dict:
+    """Return whether a trace is being recorded, where, and its call count."""
+    return {"recording": _file is not None, "path": _path, "calls": _calls}
+
+
+def _record(entry: dict) -> None:
+    global _calls
+    try:
+        _file.write(json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n")
+        _calls += 1
+    except (OSError, ValueError) as e:
+        # ValueError: the file was closed by a concurrent stop()
+        if _file is not None:
+            print(f"iterm2-mcp record: {e}", file=sys.stderr)
+            stop()
+
+
+def wrap(name: str):
+    """Decorate an async tool handler so its calls are recorded while a trace is open."""
+    def decorator(fn):
+        defaults = {
+            p.name: p.default
+            for p in inspect.signature(fn).parameters.values()
+            if p.default is not inspect.Parameter.empty
+        }
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if _file is None:
+                return await fn(*args, **kwargs)
+            start = time.perf_counter()
+            entry = {
+                "t": round(start - _started, 4),
+                "tool": name,
+                "args": {
+                    k: v for k, v in kwargs.items()
+                    if isinstance(v, _JSON_TYPES) and (k not in defaults or v != defaults[k])
+                },
+            }
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                entry["error"] = type(e).__name__
+                raise
+            else:
+                entry["bytes"] = len(result) if isinstance(result, str) else 0
+                if isinstance(result, str) and result.startswith('{"error"'):
+                    entry["error"] = "response"
+                return result
+            finally:
+                entry["ms"] = round(1000 * (time.perf_counter() - start), 3)
+                if _file is not None:
+                    _record(entry)
+        return wrapper
+    return decorator
+
+
+if os.environ.get("ITERM_MCP_RECORD"):
+    try:
+        start(os.environ["ITERM_MCP_RECORD"])
+    except OSError as e:
+        print(f"iterm2-mcp record: {e}", file=sys.stderr)
@@ -0,0 +1,125 @@
+"""Output payload reduction: collapse repeated lines and progress-bar frames."""
+
+import re
+
+# Total UTF-8 budget for the reduced output of a single response
+DEFAULT_MAX_BYTES = 16 * 1024
+
+# Lines longer than this (in UTF-8 bytes) are truncated
+MAX_LINE_BYTES = 1024
+
+_TRUNCATED_MARKER = " …[+{} bytes]"
+
+# A drawn progress bar ("[=====>   ]", "██▌  "); a bare percentage is not
+# enough, or rows of a table of percentages would merge
+_BAR = re.compile(r"\[[=#>\-. ]{3,}\]|[█▉▊▋▌▍▎▏░▒▓]")
+_PERCENT = re.compile(r"\d+(?:\.\d+)?%")
+_DIGITS = re.compile(r"\d+")
+_BAR_FILL = re.compile(r"[=#>\-. █▉▊▋▌▍▎▏░▒▓]+")
+
+
+def _byte_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def _final_frame(line: str) -> str:
+    """Return what remains visible after carriage-return rewrites."""
+    line = line.rstrip("\r")
+    if "\r" in line:
+        line = line.rsplit("\r", 1)[-1]
+    return line
+
+
+def _frame_key(line: str) -> str | None:
+    """Return a shape key shared by frames of the same progress bar.
+
+    Lines without a bar return ``None`` so they are never merged. The
+    label before the bar keeps its digits (bar "1" and bar "2" stay
+    apart) except for a percentage; from the bar on, all counts vary.
+    """
+    bar = _BAR.search(line)
+    if bar is None:
+        return None
+    label, rest = line[:bar.start()], line[bar.start():]
+    return _PERCENT.sub("0%", label) + _BAR_FILL.sub("~", _DIGITS.sub("0", rest))
+
+
+def _truncate(line: str, limit: int) -> str:
+    """Truncate *line* to at most *limit* UTF-8 bytes, noting what was cut."""
+    raw = line.encode("utf-8")
+    if len(raw) <= limit:
+        return line
+    kept = raw[:limit].decode("utf-8", errors="ignore")
+    return kept + _TRUNCATED_MARKER.format(len(raw) - _byte_len(kept))
+
+
+def reduce_lines(
+    lines: list[str],
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_line_bytes: int = MAX_LINE_BYTES,
+) -> tuple[list[str], dict]:
+    """Reduce *lines* for transport and return ``(lines, stats)``.
+
+    Carriage-return rewrites keep only their final frame, consecutive
+    frames of the same progress bar keep only the last one, and runs of
+    identical lines collapse to a single line with a ``×N`` marker.
+    Long lines are truncated, and when the result still exceeds
+    *max_bytes* the oldest lines are dropped so the most recent output
+    survives.
+    """
+    original_bytes = _byte_len("\n".join(lines))
+
+    frames: list[str] = []
+    last_key = None
+    for line in lines:
+        line = _final_frame(line)
+        key = _frame_key(line)
+        if key is not None and key == last_key:
+            frames[-1] = line
+        else:
+            frames.append(line)
+        last_key = key
+
+    collapsed: list[str] = []
+    i = 0
+    while i < len(frames):
+        j = i + 1
+        while j < len(frames) and frames[j] == frames[i]:
+            j += 1
+        line = _truncate(frames[i], max_line_bytes)
+        count = j - i
+        collapsed.append(f"{line} ×{count}" if count > 1 else line)
+        i = j
+
+    # Keep the newest lines that fit the budget (+1 byte per joining newline)
+    kept: list[str] = []
+    used = 0
+    for line in reversed(collapsed):
+        size = _byte_len(line) + (1 if kept else 0)
+        if used + size > max_bytes:
+            break
+        kept.append(line)
+        used += size
+    kept.reverse()
+
+    # The omission marker counts against the budget too; leave it out only
+    # if it cannot fit at all
+    dropped = len(collapsed) - len(kept)
+    while dropped:
+        marker = f"…[{dropped} earlier lines omitted]"
+        size = _byte_len(marker) + (1 if kept else 0)
+        if used + size <= max_bytes:
+            kept.insert(0, marker)
+            break
+        if not kept:
+            break
+        used -= _byte_len(kept.pop(0)) + (1 if kept else 0)
+        dropped += 1
+
+    stats = {
+        "original_lines": len(lines),
+        "reduced_lines": len(kept),
+        "original_bytes": original_bytes,
+        "reduced_bytes": _byte_len("\n".join(kept)),
+    }
+    return kept, stats
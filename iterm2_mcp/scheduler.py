@@ -0,0 +1,257 @@
+"""Concurrency limits with priority classes and fair queueing.
+
+Two schedulers are used:
+
+``tools``
+    At most ``ITERM_MCP_MAX_CONCURRENT`` tool calls (default 8) run at
+    once; waiting calls are served round-robin by client, so one client
+    issuing a burst of calls cannot starve the others sharing the daemon.
+``scripts``
+    At most ``ITERM_MCP_SCRIPT_CONCURRENCY`` AppleScripts (default 2) run
+    at once against iTerm2's single-threaded Apple Events handler. Waiting
+    scripts are served by priority class — interactive (keystrokes and
+    other writes), then reads, then background polling — and round-robin
+    by session within a class. Background scripts are shed rather than run
+    once they are stale: when a newer one for the same session is queued,
+    or after waiting ``BACKGROUND_MAX_AGE`` seconds.
+
+Queue depths are exported as ``<name>.running`` and
+``<name>.queued.<class>`` gauges.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Callable
+
+from . import metrics
+
+MAX_CONCURRENT = int(os.environ.get("ITERM_MCP_MAX_CONCURRENT", "8"))
+SCRIPT_CONCURRENCY = int(os.environ.get("ITERM_MCP_SCRIPT_CONCURRENCY", "2"))
+
+# Script priority classes, most urgent first
+INTERACTIVE, READ, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = ("interactive", "read", "background")
+
+# Seconds a background script may wait before it is shed
+BACKGROUND_MAX_AGE = 2.0
+
+# Identity of the client a call came from (see ``daemon``); "local" when
+# serving a single client over stdio
+LOCAL_CLIENT = {"id": "local"}
+current_client: contextvars.ContextVar[dict] = contextvars.ContextVar(
+    "iterm_mcp_client", default=LOCAL_CLIENT,
+)
+
+# Called with a client's ID when it disconnects from the daemon
+_disconnect_listeners: list[Callable[[str], None]] = []
+
+# The tool slot of the current call, ``{key, held}``, while in ``wrap``
+_tool_slot: contextvars.ContextVar[dict | None] = contextvars.ContextVar(
+    "iterm_mcp_tool_slot", default=None,
+)
+
+# Priority class for scripts run by the current task, if set explicitly
+_priority: contextvars.ContextVar[int | None] = contextvars.ContextVar(
+    "iterm_mcp_priority", default=None,
+)
+
+
+class Shed(RuntimeError):
+    """A queued background request was dropped as stale."""
+
+
+class _Waiter:
+    __slots__ = ("future", "key", "enqueued", "max_age")
+
+    def __init__(self, key: str, max_age: float | None):
+        self.future = asyncio.get_running_loop().create_future()
+        self.key = key
+        self.enqueued = time.monotonic()
+        self.max_age = max_age
+
+
+class PriorityScheduler:
+    """A concurrency limit whose waiters are served by class, then round-robin by key."""
+
+    def __init__(self, name: str, limit: int, classes: tuple[str, ...] = ("default",)):
+        self.name = name
+        self.limit = limit
+        self.classes = classes
+        self.shed = 0
+        self._running = 0
+        self._queues: list[OrderedDict[str, deque[_Waiter]]] = [OrderedDict() for _ in classes]
+
+    def queued(self, priority: int | None = None) -> int:
+        """Return the number of waiters in one class, or in all of them."""
+        queues = self._queues if priority is None else [self._queues[priority]]
+        return sum(len(q) for by_key in queues for q in by_key.values())
+
+    def _gauges(self) -> None:
+        if not metrics.enabled():
+            return
+        metrics.set_gauge(f"{self.name}.running", self._running)
+        for priority, label in enumerate(self.classes):
+            metrics.set_gauge(f"{self.name}.queued.{label}", self.queued(priority))
+        if self.shed:
+            metrics.set_gauge(f"{self.name}.shed", self.shed)
+
+    def _drop(self, waiter: _Waiter, reason: str) -> None:
+        self.shed += 1
+        waiter.future.set_exception(Shed(f"Dropped {reason} {self.name} request for '{waiter.key}'."))
+        # The waiter may be cancelled before it sees the exception
+        waiter.future.exception()
+
+    def _release(self) -> None:
+        """Hand the freed slot to the next waiter, or return it."""
+        now = time.monotonic()
+        for by_key in self._queues:
+            while by_key:
+                key, queue = next(iter(by_key.items()))
+                waiter = queue.popleft()
+                if queue:
+                    # Back of the line until every other key has had a turn
+                    by_key.move_to_end(key)
+                else:
+                    del by_key[key]
+                if waiter.future.done():
+                    continue
+                if waiter.max_age is not None and now - waiter.enqueued > waiter.max_age:
+                    self._drop(waiter, "stale")
+                    continue
+                waiter.future.set_result(None)
+                self._gauges()
+                return
+        self._running -= 1
+        self._gauges()
+
+    def _enqueue(self, key: str, priority: int, max_age: float | None) -> _Waiter:
+        by_key = self._queues[priority]
+        queue = by_key.setdefault(key, deque())
+        if max_age is not None:
+            # A newer sheddable request for the same key supersedes older ones
+            while queue:
+                self._drop(queue.popleft(), "superseded")
+        waiter = _Waiter(key, max_age)
+        queue.append(waiter)
+        return waiter
+
+    def _remove(self, waiter: _Waiter, priority: int) -> None:
+        by_key = self._queues[priority]
+        queue = by_key.get(waiter.key)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del by_key[waiter.key]
+
+    @contextlib.asynccontextmanager
+    async def slot(self, key: str = "", priority: int = 0, max_age: float | None = None):
+        """Hold one of the ``limit`` slots for the duration of the block.
+
+        *max_age* makes the request sheddable: it raises Shed instead of
+        running if it waits longer than that or a newer sheddable request
+        for the same key arrives.
+        """
+        await self.acquire(key, priority, max_age)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def acquire(self, key: str = "", priority: int = 0, max_age: float | None = None) -> None:
+        """Wait for a slot, as on entry to :meth:`slot`; the caller must
+        hand it back with ``_release``."""
+        if self._running < self.limit and not self.queued():
+            self._running += 1
+        else:
+            waiter = self._enqueue(key, priority, max_age)
+            self._gauges()
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled() \
+                        and waiter.future.exception() is None:
+                    # The slot was handed over just as we were cancelled
+                    self._release()
+                else:
+                    self._remove(waiter, priority)
+                    self._gauges()
+                raise
+        self._gauges()
+
+
+tools = PriorityScheduler("tools", MAX_CONCURRENT)
+scripts = PriorityScheduler("scripts", SCRIPT_CONCURRENCY, PRIORITY_NAMES)
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    """Run the scripts issued inside the block at priority *level*."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def on_disconnect(listener: Callable[[str], None]) -> None:
+    """Call *listener* with a client's ID when it disconnects; modules
+    holding per-client state use it to drop that state."""
+    _disconnect_listeners.append(listener)
+
+
+def client_disconnected(client_id: str) -> None:
+    """Notify the ``on_disconnect`` listeners that *client_id* has gone."""
+    for listener in _disconnect_listeners:
+        try:
+            listener(client_id)
+        except Exception as e:
+            print(f"iterm2-mcp disconnect listener: {e}", file=sys.stderr)
+
+
+def current_priority() -> int | None:
+    """Return the priority set with :func:`priority`, if any."""
+    return _priority.get()
+
+
+def wrap(fn):
+    """Decorate an async tool handler so it runs in a ``tools`` slot."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        held = {"key": current_client.get()["id"], "held": False}
+        token = _tool_slot.set(held)
+        try:
+            await tools.acquire(held["key"])
+            held["held"] = True
+            return await fn(*args, **kwargs)
+        finally:
+            if held["held"]:
+                tools._release()
+            _tool_slot.reset(token)
+    return wrapper
+
+
+@contextlib.asynccontextmanager
+async def released():
+    """Give up the current tool call's slot while the block waits.
+
+    Handlers that wait on purpose (for output, or for a job to finish)
+    wrap the wait in this, so idle waiters do not keep other calls out.
+    The slot is waited for again, in turn, when the block ends.
+    """
+    held = _tool_slot.get()
+    if held is None or not held["held"]:
+        yield
+        return
+    tools._release()
+    held["held"] = False
+    try:
+        yield
+    finally:
+        await tools.acquire(held["key"])
+        held["held"] = True
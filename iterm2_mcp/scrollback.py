@@ -0,0 +1,129 @@
+"""Chunked, cursor-based paging through session scrollback history."""
+
+from collections import OrderedDict
+from typing import Callable, Protocol
+
+from . import backends
+
+# Lines per fetched (and cached) chunk
+CHUNK_LINES = 500
+
+# Maximum number of complete chunks kept across all sessions
+CACHE_CHUNKS = 256
+
+
+class HistorySource(Protocol):
+    """Anything that can serve a range of a session's history."""
+
+    async def fetch(self, session_id: str, start: int, count: int) -> tuple[int, int, list[str]]:
+        """Return ``(first_line, end_line, lines)`` for ``[start, start + count)``.
+
+        Line numbers are absolute: ``first_line`` is the number of the oldest
+        line still retained and ``end_line`` is one past the newest line, so
+        a given number keeps referring to the same line as output grows.
+        """
+        ...
+
+
+class BackendHistory:
+    """History source served by the active backend (see ``backends``)."""
+
+    async def fetch(self, session_id: str, start: int, count: int) -> tuple[int, int, list[str]]:
+        return await backends.get().fetch(session_id, start, count)
+
+
+class ScrollbackReader:
+    """Page through history in fixed-size chunks, caching complete chunks.
+
+    A chunk is only cached once the history extends past its end, so
+    cached chunks never change. The cache for a session is dropped if its
+    history shrinks (e.g. the buffer was cleared).
+    """
+
+    def __init__(
+        self,
+        source: HistorySource,
+        strip: Callable[[str], str],
+        chunk_lines: int = CHUNK_LINES,
+        cache_chunks: int = CACHE_CHUNKS,
+    ):
+        self.source = source
+        self._strip = strip
+        self.chunk_lines = chunk_lines
+        self._cache_chunks = cache_chunks
+        self._cache: OrderedDict[tuple[str, int], list[str]] = OrderedDict()
+        self._extents: dict[str, tuple[int, int]] = {}
+
+    def forget(self, session_id: str) -> None:
+        """Drop cached chunks and the known extent for a session."""
+        for key in [k for k in self._cache if k[0] == session_id]:
+            del self._cache[key]
+        self._extents.pop(session_id, None)
+
+    async def _chunk(self, session_id: str, index: int, use_cache: bool) -> list[str]:
+        key = (session_id, index)
+        chunk = self._cache.get(key)
+        if chunk is not None:
+            self._cache.move_to_end(key)
+            return chunk
+
+        start = index * self.chunk_lines
+        first, end, raw = await self.source.fetch(session_id, start, self.chunk_lines)
+        known = self._extents.get(session_id)
+        if known and end < known[1]:
+            self.forget(session_id)
+        self._extents[session_id] = (first, end)
+
+        chunk = [self._strip(line) for line in raw]
+        if use_cache and len(chunk) == self.chunk_lines and start >= first:
+            self._cache[key] = chunk
+            while len(self._cache) > self._cache_chunks:
+                self._cache.popitem(last=False)
+        return chunk
+
+    async def read(self, session_id: str, offset: int, count: int, use_cache: bool = True) -> dict:
+        """Return up to *count* lines starting at absolute line *offset*.
+
+        The result is ``{offset, lines, first_line, end_line, next_cursor}``;
+        ``offset`` is moved forward if the requested lines are no longer
+        retained, and ``next_cursor`` is None once the end is reached, or
+        once the source serves no further lines even though ``end_line``
+        says there are more.
+        """
+        pos = max(offset, 0)
+        stop = pos + count
+        lines: list[str] = []
+        start = None
+        exhausted = False
+        while pos < stop:
+            index = pos // self.chunk_lines
+            chunk = await self._chunk(session_id, index, use_cache)
+            first, _ = self._extents.get(session_id, (0, 0))
+            if pos < first:
+                stop += first - pos
+                pos = first
+                continue
+            base = index * self.chunk_lines
+            if len(chunk) < self.chunk_lines:
+                # A partial chunk straddling first_line starts at first_line
+                base = max(base, first)
+            taken = chunk[pos - base:stop - base]
+            if start is None:
+                start = pos
+            lines.extend(taken)
+            pos += len(taken)
+            if base + len(chunk) < (index + 1) * self.chunk_lines:
+                # The source has nothing past this chunk, whatever end_line says
+                exhausted = pos >= base + len(chunk)
+                break
+            if not taken:
+                break
+
+        first, end = self._extents.get(session_id, (0, pos))
+        return {
+            "offset": pos if start is None else start,
+            "lines": lines,
+            "first_line": first,
+            "end_line": end,
+            "next_cursor": pos if pos < end and not exhausted else None,
+        }
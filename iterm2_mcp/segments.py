@@ -0,0 +1,196 @@
+"""Prompt-aware segmentation of terminal output into command blocks."""
+
+import os
+import re
+from typing import Callable
+
+# Prompts recognised when no shell-integration marks are present.  Each
+# pattern matches a whole prompt line; a ``command`` group (if any)
+# captures the command typed after the prompt. A bare "$" or "#" prompt
+# is not among them, as output lines (comments, shell snippets) start
+# with those too; pass it as a prompt_regex or in the environment.
+DEFAULT_PROMPT_PATTERNS = [
+    r"^(?:\([^)]*\) )?[\w.-]+@[\w.-]+(?:[:\s]\s*[~/][^$#%]*?)?\s?[$#%](?: (?P<command>.*))?$",  # user@host:~/dir$
+    r"^(?:\([^)]*\) )?[\w.-]+-[\d.]+[$#](?: (?P<command>.*))?$",                # bash-5.2$
+    r"^(?:\([^)]*\) )?➜ +\S+(?: git:\([^)]*\))?(?: ✗)?(?: (?P<command>.*))?$",  # oh-my-zsh
+    r"^(?:\([^)]*\) )?❯(?: (?P<command>.*))?$",                                # bare ❯
+]
+
+# Extra patterns, one regex per line, e.g. for a custom PS1
+PROMPT_PATTERNS_ENV = "ITERM_MCP_PROMPT_PATTERNS"
+
+# iTerm2 shell-integration marks (FinalTerm OSC 133):
+# A = prompt start, B = command start, C = output start, D[;status] = done
+_MARK = re.compile(r"\x1b\]133;([ABCD])(?:;([^\x07\x1b]*))?(?:\x07|\x1b\\)")
+
+MAX_BLOCKS = 200
+MAX_BLOCK_LINES = 5000
+
+
+def prompt_patterns() -> list[str]:
+    """Return the configured prompt patterns (environment, then defaults)."""
+    extra = os.environ.get(PROMPT_PATTERNS_ENV, "")
+    return [p for p in extra.splitlines() if p.strip()] + DEFAULT_PROMPT_PATTERNS
+
+
+def _new_block(command: str | None) -> dict:
+    return {"command": command, "output": [], "dropped": 0, "exit_status": None, "done": False}
+
+
+def _overlap_start(previous: list[str], current: list[str]) -> int | None:
+    """Return how many leading lines of *current* were already in *previous*.
+
+    Handles both appended output (*previous* is a prefix of *current*) and
+    scrolled screens (a suffix of *previous* is a prefix of *current*).
+    Returns None if the two buffers share nothing.
+    """
+    if not previous:
+        return 0
+    if current[:len(previous)] == previous:
+        return len(previous)
+    first = current[0] if current else None
+    for i, line in enumerate(previous):
+        if line == first and previous[i:] == current[:len(previous) - i]:
+            return len(previous) - i
+    return None
+
+
+class CommandSegmenter:
+    """Incrementally split a session's output into command blocks.
+
+    Feed it the session's full (raw, unstripped) buffer on every read via
+    :meth:`update`; only lines not seen on the previous update are parsed.
+    The final line is held back as pending until a later update confirms
+    it, since it is usually the prompt line the user is still typing on.
+    """
+
+    def __init__(self, strip: Callable[[str], str], patterns: list[str] | None = None):
+        self._strip = strip
+        self.patterns = patterns if patterns is not None else prompt_patterns()
+        # Group names must be unique across the combined alternation
+        self._prompt = re.compile("|".join(
+            f"(?:{p.replace('(?P<command>', f'(?P<command_{i}>')})"
+            for i, p in enumerate(self.patterns)
+        ))
+        self.uses_marks = False
+        self._blocks: list[dict] = []
+        self._mode = "output"
+        self._seen: list[str] = []
+
+    def update(self, raw_lines: list[str]) -> None:
+        """Parse whatever is new in *raw_lines* since the previous update."""
+        committed = self._seen[:-1]
+        start = _overlap_start(committed, raw_lines)
+        if start is None:
+            self._blocks = []
+            self._mode = "output"
+            start = 0
+        for line in raw_lines[start:-1]:
+            self._feed(line, self._blocks)
+        self._seen = raw_lines
+
+    def _feed(self, raw: str, blocks: list[dict]) -> None:
+        """Apply one raw line to *blocks*."""
+        if "\x1b]133;" in raw:
+            self.uses_marks = True
+            self._feed_marked(raw, blocks)
+            return
+        line = self._strip(raw)
+        if self.uses_marks:
+            if self._mode == "prompt":
+                return
+            if self._mode == "command" and blocks:
+                blocks[-1]["command"] += "\n" + line
+                return
+        else:
+            m = self._prompt.match(line)
+            if m:
+                groups = [g for k, g in m.groupdict().items() if k.startswith("command_")]
+                command = next((g for g in groups if g is not None), line[m.end():])
+                self._append_block(blocks, _new_block(command.strip()))
+                return
+        if not blocks:
+            blocks.append(_new_block(None))
+        self._append_output(blocks[-1], line)
+
+    def _feed_marked(self, raw: str, blocks: list[dict]) -> None:
+        """Apply a line carrying OSC 133 marks to *blocks*."""
+        pos = 0
+        output = []
+        for m in _MARK.finditer(raw):
+            self._take_text(self._strip(raw[pos:m.start()]), blocks, output)
+            pos = m.end()
+            kind, arg = m.group(1), m.group(2)
+            if kind == "A":
+                self._append_block(blocks, _new_block(""))
+                self._mode = "prompt"
+            elif kind == "B":
+                self._mode = "command"
+            elif kind == "C":
+                self._mode = "output"
+            elif blocks:
+                status = (arg or "").split(";")[0]
+                blocks[-1]["exit_status"] = int(status) if status.lstrip("-").isdigit() else None
+                blocks[-1]["done"] = True
+                self._mode = "idle"
+        self._take_text(self._strip(raw[pos:]), blocks, output)
+        if output and blocks:
+            self._append_output(blocks[-1], "".join(output))
+
+    def _take_text(self, text: str, blocks: list[dict], output: list[str]) -> None:
+        if not text:
+            return
+        if self._mode == "command" and blocks:
+            blocks[-1]["command"] += text
+        elif self._mode in ("output", "idle"):
+            output.append(text)
+
+    def _append_block(self, blocks: list[dict], block: dict) -> None:
+        if blocks:
+            blocks[-1]["done"] = True
+        blocks.append(block)
+        if len(blocks) > MAX_BLOCKS:
+            del blocks[:len(blocks) - MAX_BLOCKS]
+
+    @staticmethod
+    def _append_output(block: dict, line: str) -> None:
+        block["output"].append(line)
+        if len(block["output"]) > MAX_BLOCK_LINES:
+            del block["output"][0]
+            block["dropped"] += 1
+
+    def last_blocks(self, n: int = 1) -> list[dict]:
+        """Return the last *n* command blocks, oldest first.
+
+        Bare prompts (no command typed, no output) are not counted as
+        blocks. Each block is ``{command, output, exit_status, running}``;
+        ``exit_status`` is only known when shell-integration marks are present.
+        """
+        blocks = self._blocks
+        if self._seen:
+            # Apply the pending line to a copy of the open block, leaving
+            # the parser state as the committed lines left it
+            mode, uses_marks = self._mode, self.uses_marks
+            tail = [dict(blocks[-1], output=list(blocks[-1]["output"]))] if blocks else []
+            self._feed(self._seen[-1], tail)
+            self._mode, self.uses_marks = mode, uses_marks
+            blocks = blocks[:-1] + tail
+
+        result = []
+        for i, block in enumerate(reversed(blocks)):
+            if block["command"] == "" and not any(l.strip() for l in block["output"]):
+                continue
+            output = block["output"]
+            while output and not output[-1].strip():
+                output = output[:-1]
+            result.append({
+                "command": block["command"],
+                "output": "\n".join(output),
+                "truncated_lines": block["dropped"],
+                "exit_status": block["exit_status"],
+                "running": i == 0 and not block["done"],
+            })
+            if len(result) >= n:
+                break
+        result.reverse()
+        return result
@@ -1,13 +1,17 @@
 """Session state persistence and resolution."""
 
 import json
+import os
 from difflib import SequenceMatcher
 from pathlib import Path
 
-from .applescript import list_all_sessions
+from . import backends, metrics, offload, profiling, scheduler, topology
 
 SESSION_FILE = Path("/tmp/iterm2-mcp-sessions.json")
 
+# Identifier for the session the calling agent runs in
+SELF = "self"
+
 
 def load_state() -> dict:
     """Load the registered-sessions state file."""
@@ -24,9 +28,45 @@ def save_state(state: dict) -> None:
     SESSION_FILE.write_text(json.dumps(state, indent=2))
 
 
+def _forget_closed(changes: list[dict]) -> None:
+    """Drop registrations of closed sessions and follow renames."""
+    closed = {c["session_id"] for c in changes if c["type"] == "removed"}
+    renamed = {c["session_id"]: c["name"] for c in changes if c["type"] == "renamed"}
+    if not closed and not renamed:
+        return
+    state = load_state()
+    registered = state.get("sessions", {})
+    changed = False
+    for tty, entry in list(registered.items()):
+        sid = entry.get("iterm_session_id")
+        if sid in closed:
+            del registered[tty]
+            changed = True
+        elif sid in renamed:
+            entry["session_name"] = renamed[sid]
+            changed = True
+    if changed:
+        save_state(state)
+
+
+topology.subscribe(_forget_closed)
+
+
+async def list_sessions() -> list[dict]:
+    """Fetch the session inventory and record it in ``topology``."""
+    all_sessions = await backends.get().list_sessions()
+    topology.observe(all_sessions)
+    return all_sessions
+
+
 _FUZZY_THRESHOLD = 0.5
 
+# Offload cost of scoring one candidate, in bytes of escape stripping
+# (~13µs each); fuzzy matching a few hundred sessions moves off the loop
+FUZZY_COST = 256
 
+
+@metrics.instrument("fuzzy_match")
 def fuzzy_match(query: str, candidates: list[dict], key: str = "name") -> list[tuple[float, dict]]:
     """Return (score, candidate) pairs sorted by fuzzy similarity to *query*.
 
@@ -44,13 +84,11 @@ def fuzzy_match(query: str, candidates: list[dict], key: str = "name") -> list[t
     return [(r, c) for r, c in scored if r >= _FUZZY_THRESHOLD]
 
 
-async def resolve_session(identifier: str) -> dict:
-    """Resolve a session_id, tty path, or name to a session dict.
+def match_session(identifier: str, all_sessions: list[dict]) -> dict:
+    """Find a session_id, tty path, or name in an already fetched inventory.
 
     Raises RuntimeError if nothing matches.
     """
-    all_sessions = await list_all_sessions()
-
     # Exact match on session ID
     for s in all_sessions:
         if s["session_id"] == identifier:
@@ -70,3 +108,61 @@ async def resolve_session(identifier: str) -> dict:
         f"No session found matching '{identifier}'. "
         f"Available sessions: {[s['name'] for s in all_sessions]}"
     )
+
+
+def self_session() -> dict:
+    """Return the session the calling agent runs in, without any script.
+
+    iTerm2 exports ``ITERM_SESSION_ID`` ("w0t0p0:<session id>") to every
+    shell. A stdio server inherits it from the agent; in daemon mode the
+    client's proxy sends it in its handshake. The TTY and name come from
+    the last inventory, or from the registration the SessionStart hook
+    writes.
+
+    Raises RuntimeError if the agent is not running inside iTerm2.
+    """
+    client = scheduler.current_client.get()
+    if client is scheduler.LOCAL_CLIENT:
+        env_id, tty = os.environ.get("ITERM_SESSION_ID", ""), ""
+    else:
+        env_id, tty = client.get("iterm_session_id", ""), client.get("tty", "")
+    session_id = env_id.partition(":")[2] or env_id
+    if not session_id:
+        raise RuntimeError(
+            f"Cannot resolve '{SELF}': ITERM_SESSION_ID is not set, so the agent "
+            "is not running inside an iTerm2 session."
+        )
+
+    for s in topology.current():
+        if s["session_id"] == session_id:
+            return dict(s)
+    name = ""
+    for registered_tty, entry in load_state().get("sessions", {}).items():
+        if entry.get("iterm_session_id") == session_id:
+            tty, name = tty or registered_tty, entry.get("session_name") or ""
+            break
+    return {"session_id": session_id, "name": name, "tty": tty,
+            "window_id": None, "window_name": None, "tab_index": None}
+
+
+@metrics.instrument("resolve_session")
+@profiling.traced("resolve")
+async def resolve_session(identifier: str, locate: bool = False) -> dict:
+    """Resolve a session_id, tty path, name, or ``"self"`` to a session dict.
+
+    ``"self"`` needs no script unless *locate* is set and no inventory has
+    seen the session yet: its window is then looked up, for callers that
+    open a tab beside it.
+
+    Raises RuntimeError if nothing matches.
+    """
+    if identifier == SELF:
+        me = self_session()
+        if not locate or me["window_id"] is not None:
+            return me
+        for s in await list_sessions():
+            if s["session_id"] == me["session_id"]:
+                return s
+        raise RuntimeError(f"Session '{SELF}' ({me['session_id']}) is not open in iTerm2.")
+    all_sessions = await list_sessions()
+    return await offload.run(len(all_sessions) * FUZZY_COST, match_session, identifier, all_sessions)
@@ -0,0 +1,80 @@
+"""Startup timing and the background warm-up.
+
+``server.py`` marks how long the process took to import the MCP SDK and
+this package (``imports``), register the tools (``tools``) and start
+serving (``serving``), in milliseconds since it started; ``iterm_stats``
+reports them under ``startup``.
+
+The server's lifespan starts a warm-up task once per process, unless
+``ITERM_MCP_WARMUP=0``. It fetches the session inventory at background
+priority while the client is still handshaking, so the first tool call
+finds the backend connected (the API socket, or osascript and the Apple
+Event connection), the inventory baselined in ``topology`` for
+``iterm_topology_changes`` and ``"self"``, and the pool filling.
+osascript still compiles each script from source when it runs; the
+warm-up does not avoid that cost.
+"""
+
+import asyncio
+import contextlib
+import os
+import sys
+import time
+
+from . import metrics, scheduler
+
+WARMUP = os.environ.get("ITERM_MCP_WARMUP", "1") not in ("", "0")
+
+_started = time.perf_counter()
+_timings: dict[str, float | str] = {}
+_task: asyncio.Task | None = None
+
+
+def started_at(t: float) -> None:
+    """Measure phases from *t*, a ``time.perf_counter()`` taken at process start."""
+    global _started
+    _started = t
+
+
+def mark(phase: str) -> None:
+    """Record the time since process start at which *phase* finished."""
+    ms = round(1000 * (time.perf_counter() - _started), 3)
+    _timings.setdefault(f"{phase}_ms", ms)
+    metrics.set_gauge(f"startup.{phase}_ms", _timings[f"{phase}_ms"])
+
+
+def timings() -> dict:
+    """Return the recorded phase times (and the warm-up's, once it ran)."""
+    return dict(_timings)
+
+
+async def _warm_up() -> None:
+    from . import pool, sessions
+
+    start = time.perf_counter()
+    try:
+        with scheduler.priority(scheduler.BACKGROUND):
+            await sessions.list_sessions()
+    except Exception as e:
+        _timings["warmup_error"] = f"{type(e).__name__}: {e}"
+        print(f"iterm2-mcp warm-up: {e!r}", file=sys.stderr)
+    else:
+        _timings["warmup_ms"] = round(1000 * (time.perf_counter() - start), 3)
+    finally:
+        pool.ensure_started()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(server):
+    """FastMCP lifespan: mark ``serving``, start the event-loop lag
+    monitor and start the warm-up once.
+
+    In daemon mode this runs for every client; only the first starts
+    the warm-up.
+    """
+    global _task
+    mark("serving")
+    metrics.ensure_lag_monitor()
+    if WARMUP and _task is None:
+        _task = asyncio.get_running_loop().create_task(_warm_up())
+    yield {}
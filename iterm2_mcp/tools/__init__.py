@@ -3,4 +3,4 @@
 
 def register_all(mcp=None):
     """Import all tool modules so their @mcp.tool() decorators fire."""
-    from . import session_mgmt, terminals, commands, output  # noqa: F401
+    from . import session_mgmt, terminals, commands, output, jobs, triggers, diagnostics  # noqa: F401
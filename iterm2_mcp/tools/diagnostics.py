@@ -0,0 +1,75 @@
+"""Diagnostics tools: stats, profile, record."""
+
+from .. import metrics, profiling, recording, startup
+from ..encoding import encode
+from .._server import mcp
+
+
+@mcp.tool()
+async def iterm_stats(enable: bool | None = None, reset: bool = False) -> str:
+    """Report per-operation call counts, errors, bytes and latency percentiles.
+
+    Covers every tool handler plus the internal stages (osascript spawn
+    and execute, inventory scan, session resolution, fuzzy matching,
+    contents reads and JSON encoding). Recording is off unless the server
+    was started with ``ITERM_MCP_METRICS=1`` or it is enabled here.
+    Startup phase times are always included.
+
+    Args:
+        enable: Turn recording on (True) or off (False); omit to leave as is.
+        reset:  Clear all recorded metrics after returning them.
+    """
+    if enable is not None:
+        metrics.enable(enable)
+    stats = metrics.snapshot()
+    stats["startup"] = startup.timings()
+    if reset:
+        metrics.reset()
+    return encode(stats)
+
+
+@mcp.tool()
+async def iterm_profile(mode: str = "", sample_rate: float | None = None) -> str:
+    """Turn per-call profiling of tool handlers on or off.
+
+    Sampled calls write a trace file each: ``spans`` mode records the
+    stages of the call (resolve, spawn, wait, parse, strip, encode) as
+    Chrome trace-event JSON for Perfetto; ``cprofile`` mode writes a
+    pstats file for snakeviz or ``python -m pstats``. cProfile covers the
+    whole process, so a profile also includes calls running concurrently
+    with the profiled one.
+
+    Args:
+        mode:        "off", "spans" or "cprofile". Leave empty to only
+                     report the current settings.
+        sample_rate: Fraction of calls to profile, 0-1.
+    """
+    try:
+        profiling.configure(mode or None, sample_rate)
+    except ValueError as e:
+        return encode({"error": str(e)})
+    return encode(profiling.status())
+
+
+@mcp.tool()
+async def iterm_record(path: str = "", stop: bool = False) -> str:
+    """Record every tool call (tool, arguments, latency, response size) to a trace file.
+
+    The trace is JSON lines, appended to *path*, and can be replayed
+    against the simulated iTerm2 with ``python -m benchmarks.replay_trace``
+    to reproduce the load. Arguments are recorded verbatim, including
+    command text.
+
+    Args:
+        path: Start recording to this file (closing any current trace).
+              Leave empty to only report the current trace.
+        stop: Stop recording.
+    """
+    if stop:
+        recording.stop()
+    elif path:
+        try:
+            recording.start(path)
+        except OSError as e:
+            return encode({"error": f"Cannot record to '{path}': {e}"})
+    return encode(recording.status())
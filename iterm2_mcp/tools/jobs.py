@@ -0,0 +1,333 @@
+"""Job runner tools: run_jobs, job_status.
+
+A run spreads a list of shell commands over up to ``parallelism`` worker
+panes and hands each pane its next command as soon as the previous one
+finishes. Each command is sent as ``{ <command>`` and a closing ``}`` line
+followed by a ``printf`` sentinel carrying a per-job token and ``$?``, so
+a trailing ``;`` or ``&`` or a ``#`` comment in the command cannot
+swallow the sentinel. Workers poll only the new part of their pane's
+history for it, at background script priority, so completion, exit
+status and an output tail are known server-side. Job tables are kept in
+memory, so ``iterm_job_status`` answers without touching any pane.
+
+Worker panes are left open when a run ends and are reused by later runs.
+"""
+
+import asyncio
+import re
+import secrets
+import time
+from collections import OrderedDict, deque
+
+from .. import backends, scheduler, topology
+from ..encoding import encode
+from ..sessions import resolve_session
+from .._server import mcp
+from .output import _strip_escape_sequences
+from .terminals import _open_split, _open_tab
+
+# Most worker panes one run may use
+MAX_PARALLELISM = 16
+
+# Seconds between checks of a running job's pane
+POLL_INTERVAL = 0.5
+
+# Lines a pane's screen may span; older lines are history and never change
+SCREEN_LINES = 200
+
+# Most lines fetched from a pane per check
+MAX_FETCH_LINES = 5000
+
+# Finished runs kept for iterm_job_status
+MAX_RUNS = 20
+
+# Printed after each command as "<marker> <token> exit=<status>". The
+# format string keeps the echoed command line from matching.
+SENTINEL_MARKER = "iterm-mcp-job"
+
+_runs: OrderedDict[str, dict] = OrderedDict()
+_finished: dict[str, asyncio.Event] = {}
+_tasks: dict[str, asyncio.Task] = {}
+
+# Panes created by earlier runs, free for reuse
+_idle_workers: list[dict] = []
+
+
+def _forget_closed(changes: list[dict]) -> None:
+    closed = {c["session_id"] for c in changes if c["type"] == "removed"}
+    if closed:
+        _idle_workers[:] = [s for s in _idle_workers if s["session_id"] not in closed]
+
+
+topology.subscribe(_forget_closed)
+
+
+def _summary(run: dict, include_output: bool = True) -> dict:
+    counts = {}
+    for job in run["jobs"]:
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    jobs = run["jobs"] if include_output else [
+        {k: v for k, v in job.items() if k != "output"} for job in run["jobs"]
+    ]
+    return {
+        "run_id": run["run_id"],
+        "status": run["status"],
+        "elapsed_s": round((run["finished_at"] or time.time()) - run["started_at"], 3),
+        "workers": run["workers"],
+        "counts": counts,
+        "error": run["error"],
+        "jobs": jobs,
+    }
+
+
+def _tail(lines: list[str], token: str, n: int) -> str:
+    """Return the last *n* output lines, after the echoed command line."""
+    for i in range(len(lines) - 1, -1, -1):
+        if token in lines[i]:
+            lines = lines[i + 1:]
+            break
+    while lines and not lines[-1].strip():
+        lines = lines[:-1]
+    return "\n".join(lines[-n:]) if n > 0 else ""
+
+
+async def _run_job(job: dict, session_id: str, timeout: float, tail_lines: int) -> bool:
+    """Run one job in the pane; return False if the pane no longer exists."""
+    backend = backends.get()
+    token = secrets.token_hex(4)
+    done = re.compile(rf"^{SENTINEL_MARKER} {token} exit=(\d+)$")
+
+    first, total, _ = await backend.fetch(session_id, 0, 0)
+    cursor = max(first, total - SCREEN_LINES)
+    sentinel = f"printf '\\n%s %s exit=%d\\n' {SENTINEL_MARKER} {token} $?"
+    job.update(status="running", session_id=session_id, started_at=time.time())
+    if not await backend.send_text(session_id, f"{{ {job['command']}\n}}; {sentinel}"):
+        return False
+
+    deadline = job["started_at"] + timeout if timeout > 0 else None
+    lines: list[str] = []
+    while True:
+        if len(lines) < MAX_FETCH_LINES:
+            await asyncio.sleep(POLL_INTERVAL)
+        try:
+            with scheduler.priority(scheduler.BACKGROUND):
+                first, total, lines = await backend.fetch(session_id, cursor, MAX_FETCH_LINES)
+        except scheduler.Shed:
+            lines = []
+            continue
+        lines = [_strip_escape_sequences(line) for line in lines]
+        for i, line in enumerate(lines):
+            m = done.match(line.strip())
+            if m:
+                status = int(m.group(1))
+                job.update(
+                    status="done" if status == 0 else "failed",
+                    exit_status=status,
+                    output=_tail(lines[:i], token, tail_lines),
+                )
+                return True
+        if deadline is not None and time.time() > deadline:
+            await backend.send_keys(session_id, ["\x03"])
+            job.update(status="timed_out", output=_tail(lines, token, tail_lines))
+            return True
+        if len(lines) >= MAX_FETCH_LINES:
+            cursor += len(lines) - SCREEN_LINES
+        else:
+            cursor = max(min(cursor, total), first, total - SCREEN_LINES)
+
+
+async def _worker(run: dict, session: dict, queue: deque, timeout: float, tail_lines: int) -> bool:
+    """Run queued jobs in one pane until the queue is empty or the pane closes."""
+    backend = backends.get()
+    while queue:
+        job = queue.popleft()
+        try:
+            alive = await _run_job(job, session["session_id"], timeout, tail_lines)
+        except RuntimeError as e:
+            job.update(status="failed", error=str(e))
+            try:
+                alive = bool(await backend.session_tty(session["session_id"]))
+            except RuntimeError:
+                # iTerm2 not answering: give the pane up rather than fail the run
+                alive = False
+        else:
+            if not alive:
+                job.update(status="failed", error="Worker pane was closed.")
+        if job["started_at"] is not None:
+            job["duration_s"] = round(time.time() - job["started_at"], 3)
+        if not alive:
+            return False
+    return True
+
+
+async def _acquire_worker(run: dict, index: int, previous: dict | None) -> dict:
+    """Return a reused idle pane, or open a new one next to *previous*."""
+    backend = backends.get()
+    name = f"{run['name']} {index + 1}"
+    while _idle_workers:
+        session = _idle_workers.pop()
+        if await backend.set_name(session["session_id"], name):
+            return session
+    if previous is None:
+        created = await _open_tab(None, name)
+    else:
+        created = await _open_split(previous["session_id"], index % 2 == 1, name)
+        if created is None:
+            raise RuntimeError("Worker pane closed while creating the next one.")
+    return {"session_id": created["session_id"], "tty": created["tty"]}
+
+
+async def _execute(run: dict, sessions: list[dict], parallelism: int, timeout: float, tail_lines: int) -> None:
+    queue = deque(run["jobs"])
+    created: list[dict] = []
+    workers: list[asyncio.Task] = []
+    previous = None
+    try:
+        for index in range(parallelism):
+            if not queue:
+                break
+            if sessions:
+                session = sessions[index]
+            else:
+                try:
+                    session = await _acquire_worker(run, index, previous)
+                except RuntimeError as e:
+                    run["error"] = f"Could not open worker pane: {e}"
+                    break
+                created.append(session)
+            previous = session
+            run["workers"].append(session["session_id"])
+            workers.append(asyncio.ensure_future(_worker(run, session, queue, timeout, tail_lines)))
+        alive = await asyncio.gather(*workers, return_exceptions=True)
+        _idle_workers.extend(s for s, ok in zip(created, alive[:len(created)]) if ok is True)
+        errors = [e for e in alive if isinstance(e, BaseException)]
+        if errors and run["error"] is None:
+            run["error"] = f"Worker failed: {errors[0]}"
+    finally:
+        for task in workers:
+            task.cancel()
+        for job in queue:
+            job.update(status="failed", error=run["error"] or "No worker panes left.")
+        for job in run["jobs"]:
+            if job["status"] == "running":
+                job.update(status="failed", error=run["error"] or "Run ended before the job finished.")
+        run["status"] = "done"
+        run["finished_at"] = time.time()
+        _finished[run["run_id"]].set()
+        _tasks.pop(run["run_id"], None)
+
+
+def _forget_old_runs() -> None:
+    finished = [rid for rid, run in _runs.items() if run["status"] == "done"]
+    for rid in finished[:max(0, len(finished) - MAX_RUNS)]:
+        del _runs[rid]
+        del _finished[rid]
+
+
+async def _wait(run_id: str, wait: float) -> None:
+    if wait > 0:
+        try:
+            async with scheduler.released():
+                await asyncio.wait_for(_finished[run_id].wait(), wait)
+        except asyncio.TimeoutError:
+            pass
+
+
+@mcp.tool()
+async def iterm_run_jobs(
+    commands: list[str],
+    parallelism: int = 4,
+    name: str = "job",
+    sessions: str = "",
+    timeout: float = 0,
+    tail_lines: int = 20,
+    wait: float = 0,
+) -> str:
+    """Run shell commands across a set of panes, at most ``parallelism`` at once.
+
+    Worker panes are reused from earlier runs or created (a tab, then
+    splits of it). Each pane runs its next queued command as soon as the
+    previous one finishes; completion and exit status are detected from a
+    sentinel printed after each command, so the panes' shell must be
+    POSIX-like (bash, zsh). Returns immediately with a ``run_id`` unless
+    ``wait`` is set; poll with iterm_job_status.
+
+    Args:
+        commands:    Shell commands, one per job.
+        parallelism: Most jobs running at once (default 4, at most 16).
+        name:        Name prefix for the worker panes (default "job").
+        sessions:    Optional comma-separated session IDs, TTYs, or names of
+                     existing panes to use as workers instead.
+        timeout:     Seconds after which a job is interrupted with Ctrl+C
+                     and marked timed_out (default 0 = no limit).
+        tail_lines:  Output lines kept per job (default 20, at most 200).
+        wait:        Seconds to wait for the run to finish before returning.
+    """
+    commands = [c for c in commands if c.strip()]
+    if not commands:
+        return encode({"error": "commands must contain at least one command."})
+    if not 1 <= parallelism <= MAX_PARALLELISM:
+        return encode({"error": f"parallelism must be between 1 and {MAX_PARALLELISM}."})
+
+    workers = []
+    for identifier in (s.strip() for s in sessions.split(",") if s.strip()):
+        session = await resolve_session(identifier)
+        workers.append({"session_id": session["session_id"], "tty": session["tty"]})
+    if workers:
+        parallelism = min(parallelism, len(workers))
+
+    run_id = secrets.token_hex(3)
+    run = {
+        "run_id": run_id,
+        "name": name,
+        "status": "running",
+        "started_at": time.time(),
+        "finished_at": None,
+        "workers": [],
+        "error": None,
+        "jobs": [
+            {
+                "index": i,
+                "command": command,
+                "status": "queued",
+                "exit_status": None,
+                "duration_s": None,
+                "session_id": None,
+                "started_at": None,
+                "output": "",
+                "error": None,
+            }
+            for i, command in enumerate(commands)
+        ],
+    }
+    _runs[run_id] = run
+    _finished[run_id] = asyncio.Event()
+    _forget_old_runs()
+    tail_lines = max(0, min(tail_lines, SCREEN_LINES))
+    _tasks[run_id] = asyncio.get_running_loop().create_task(
+        _execute(run, workers, parallelism, timeout, tail_lines),
+    )
+
+    await _wait(run_id, wait)
+    return encode(_summary(run))
+
+
+@mcp.tool()
+async def iterm_job_status(run_id: str = "", include_output: bool = True, wait: float = 0) -> str:
+    """Report a job run's progress from memory, without reading any pane.
+
+    Args:
+        run_id:         The ``run_id`` from iterm_run_jobs. Omit to list
+                        every known run without its jobs.
+        include_output: Include each job's output tail (default true).
+        wait:           Seconds to wait for the run to finish before returning.
+    """
+    if not run_id:
+        return encode({"runs": [
+            {k: v for k, v in _summary(run).items() if k != "jobs"} for run in _runs.values()
+        ]})
+    run = _runs.get(run_id)
+    if run is None:
+        return encode({"error": f"Unknown run_id '{run_id}'. Known runs: {list(_runs)}"})
+    await _wait(run_id, wait)
+    return encode(_summary(run, include_output))
@@ -1,9 +1,16 @@
-"""Output reading tools: read_output, watch_session."""
+"""Output reading tools: read_output, watch_session, last_command_output,
+read_scrollback, export_output."""
 
-import json
+import asyncio
+import contextlib
+import gzip
+import os
 import re
 
-from .. import applescript
+from .. import backends, metrics, offload, profiling, reducer, scheduler, topology
+from ..encoding import encode
+from ..scrollback import BackendHistory, ScrollbackReader
+from ..segments import CommandSegmenter
 from ..sessions import resolve_session
 from .._server import mcp
 
@@ -22,40 +29,194 @@ _BARE_OSC_PAYLOAD = re.compile(
     r"\d+;\d+;bg;(?:red|green|blue);brightness;\d+",
 )
 
-# In-memory cursor state for watch_session
-_watch_cursors: dict[str, str] = {}
+# In-memory cursor state for watch_session, per (client ID, session ID),
+# so clients sharing the daemon do not consume each other's new output
+_watch_cursors: dict[tuple[str, str], str] = {}
+
+# Incremental command-block parsers for last_command_output, per
+# (client ID, session ID), as each client may pass its own prompt_regex
+_segmenters: dict[tuple[str, str], CommandSegmenter] = {}
+
+# Largest page iterm_read_scrollback will return in one call
+MAX_SCROLLBACK_LINES = 5000
+
+# Seconds between reads when a watch falls back to polling
+UPDATE_POLL_INTERVAL = 0.5
 
 
 def _strip_escape_sequences(text: str) -> str:
-    """Remove terminal escape sequences and leaked OSC payloads."""
+    """Remove terminal escape sequences and leaked OSC payloads.
+
+    Large text is stripped a chunk at a time (see ``offload.chunks``). An
+    OSC sequence still open at the end of a chunk (its payload may span
+    newlines) is carried over to the next one with the lines it starts
+    on, unless that tail is itself longer than a chunk.
+    """
+    if len(text) <= offload.CHUNK_BYTES:
+        return _strip(text)
+    out = []
+    carry = ""
+    for piece in offload.chunks(text):
+        piece = carry + piece
+        cut = _safe_cut(piece)
+        if len(piece) - cut > offload.CHUNK_BYTES:
+            cut = len(piece)
+        piece, carry = piece[:cut], piece[cut:]
+        out.append(_strip(piece))
+    out.append(_strip(carry))
+    return "".join(out)
+
+
+def _safe_cut(text: str) -> int:
+    """Return the last line start (or the end) of *text* that no OSC
+    sequence spans: the last OSC begun before it has ended or broken off."""
+    cut = len(text)
+    while True:
+        start = text.rfind("\x1b]", 0, cut)
+        if start < 0 or text.find("\x07", start + 2, cut) >= 0 or text.find("\x1b", start + 2, cut) >= 0:
+            return cut
+        cut = text.rfind("\n", 0, start) + 1
+
+
+def _strip(text: str) -> str:
     text = _ESCAPE_PATTERNS.sub("", text)
-    text = _BARE_OSC_PAYLOAD.sub("", text)
-    return text
+    return _BARE_OSC_PAYLOAD.sub("", text)
+
+
+@metrics.instrument("get_raw_contents")
+async def _get_raw_contents(session_id: str) -> str:
+    """Read the visible contents of a session by ID, escapes included."""
+    return await backends.get().read_contents(session_id)
+
+
+async def _stripped(raw: str) -> str:
+    with profiling.span("strip", bytes=len(raw)):
+        return await offload.run(len(raw), _strip_escape_sequences, raw)
 
 
+@metrics.instrument("get_contents")
 async def _get_contents(session_id: str) -> str:
     """Read the visible contents of a session by ID."""
-    sid = applescript.escape(session_id)
-    script = f'''
-tell application "iTerm2"
-    repeat with w in windows
-        repeat with t in tabs of w
-            repeat with s in sessions of t
-                if id of s is "{sid}" then
-                    tell s to return contents
-                end if
-            end repeat
-        end repeat
-    end repeat
-    return ""
-end tell
-'''
-    raw = await applescript.run(script)
-    return _strip_escape_sequences(raw)
+    return await _stripped(await _get_raw_contents(session_id))
+
+
+# Chunked scrollback pager sharing the same escape stripping
+_scrollback = ScrollbackReader(BackendHistory(), _strip_escape_sequences)
+
+
+def _client_key(session_id: str) -> tuple[str, str]:
+    return scheduler.current_client.get()["id"], session_id
+
+
+def _forget_closed(changes: list[dict]) -> None:
+    """Drop watch cursors, segmenters and cached history of closed sessions."""
+    closed = {c["session_id"] for c in changes if c["type"] == "removed"}
+    for state in (_watch_cursors, _segmenters):
+        for key in [k for k in state if k[1] in closed]:
+            del state[key]
+    for sid in closed:
+        _scrollback.forget(sid)
+
+
+def _forget_client(client_id: str) -> None:
+    """Drop the watch cursors and segmenters of a disconnected client."""
+    for state in (_watch_cursors, _segmenters):
+        for key in [k for k in state if k[0] == client_id]:
+            del state[key]
+
+
+topology.subscribe(_forget_closed)
+scheduler.on_disconnect(_forget_client)
+
+
+async def _wait_for_update(session_id: str, timeout: float, baseline: str) -> bool:
+    """Wait up to *timeout* seconds for the session's screen to change from
+    *baseline*, its last raw contents.
+
+    If the backend's updates fail (the API connection dropped), the rest
+    of the wait polls the contents instead.
+    """
+    deadline = asyncio.get_running_loop().time() + timeout
+    updates = backends.get().screen_updates(session_id, baseline)
+    try:
+        async with scheduler.released(), contextlib.aclosing(updates):
+            await asyncio.wait_for(anext(updates), timeout)
+    except (asyncio.TimeoutError, StopAsyncIteration):
+        return False
+    except RuntimeError:
+        return await _poll_for_update(session_id, deadline, baseline)
+    return True
+
+
+async def _poll_for_update(session_id: str, deadline: float, baseline: str) -> bool:
+    loop = asyncio.get_running_loop()
+    async with scheduler.released():
+        while (remaining := deadline - loop.time()) > 0:
+            await asyncio.sleep(min(UPDATE_POLL_INTERVAL, remaining))
+            try:
+                if await _get_raw_contents(session_id) != baseline:
+                    return True
+            except RuntimeError:
+                continue
+    return False
+
+
+def _lines_of(text: str, reduce: bool = False) -> list[str]:
+    """``text.splitlines()``, or ``text.split("\\n")`` when reducing, a
+    chunk at a time (less a final empty line)."""
+    lines: list[str] = []
+    for piece in offload.chunks(text):
+        if reduce:
+            parts = piece.split("\n")
+            if piece.endswith("\n"):
+                parts.pop()
+            lines += parts
+        else:
+            lines += piece.splitlines()
+    return lines
+
+
+def _split_lines(raw: str, reduce: bool) -> list[str]:
+    """Split contents into lines, dropping trailing blank lines.
+
+    When reducing, only newlines split so that carriage-return rewrites
+    stay on one line and the reducer can keep their final frame.
+    """
+    all_lines = _lines_of(raw, reduce)
+    while all_lines and not all_lines[-1].strip():
+        all_lines.pop()
+    return all_lines
+
+
+def _joined_lines(raw: str, reduce: bool) -> str:
+    return "\n".join(_split_lines(raw, reduce))
+
+
+def _new_output(previous_text: str, current_text: str) -> str:
+    """Return the part of *current_text* not already in *previous_text*."""
+    if previous_text and current_text.startswith(previous_text):
+        new_text = current_text[len(previous_text):]
+        if new_text.startswith("\n"):
+            new_text = new_text[1:]
+        return new_text
+    return current_text
+
+
+def _command_lines(raw: str) -> list[str]:
+    """Split raw contents into lines, dropping trailing blank ones."""
+    raw_lines = _lines_of(raw)
+    while raw_lines and not _strip_escape_sequences(raw_lines[-1]).strip():
+        raw_lines.pop()
+    return raw_lines
 
 
 @mcp.tool()
-async def iterm_read_output(identifier: str, lines: int = 50) -> str:
+async def iterm_read_output(
+    identifier: str,
+    lines: int = 50,
+    reduce: bool = False,
+    max_bytes: int = reducer.DEFAULT_MAX_BYTES,
+) -> str:
     """Read recent visible output from an iTerm2 session.
 
     Returns the last N lines of visible terminal content.
@@ -63,25 +224,36 @@ async def iterm_read_output(identifier: str, lines: int = 50) -> str:
     Args:
         identifier: A session ID, TTY path, or (partial) session name.
         lines:      Maximum number of lines to return (default 50).
+        reduce:     Collapse repeated lines and progress-bar frames and
+                    truncate long lines before returning (default False).
+        max_bytes:  Byte budget for the output when ``reduce`` is set.
     """
     session = await resolve_session(identifier)
     raw = await _get_contents(session["session_id"])
 
-    all_lines = raw.splitlines()
-    while all_lines and not all_lines[-1].strip():
-        all_lines.pop()
+    all_lines = await offload.run(len(raw), _split_lines, raw, reduce)
     trimmed = all_lines[-lines:] if len(all_lines) > lines else all_lines
 
-    return json.dumps({
+    response = {
         "session_id": session["session_id"],
         "name": session["name"],
-        "line_count": len(trimmed),
-        "output": "\n".join(trimmed),
-    })
+    }
+    if reduce:
+        trimmed, response["reduction"] = await offload.run(
+            sum(map(len, trimmed)), reducer.reduce_lines, trimmed, max_bytes,
+        )
+    response["line_count"] = len(trimmed)
+    response["output"] = "\n".join(trimmed)
+    return await offload.run(len(response["output"]), encode, response)
 
 
 @mcp.tool()
-async def iterm_watch_session(identifier: str) -> str:
+async def iterm_watch_session(
+    identifier: str,
+    reduce: bool = False,
+    max_bytes: int = reducer.DEFAULT_MAX_BYTES,
+    wait: float = 0,
+) -> str:
     """Get only new output since the last watch call for a session.
 
     On the first call for a session this returns the full visible buffer.
@@ -90,34 +262,175 @@ async def iterm_watch_session(identifier: str) -> str:
 
     Args:
         identifier: A session ID, TTY path, or (partial) session name.
+        reduce:     Collapse repeated lines and progress-bar frames and
+                    truncate long lines before returning (default False).
+        max_bytes:  Byte budget for the new output when ``reduce`` is set.
+        wait:       If there is no new output yet, wait up to this many
+                    seconds for the screen to change (default 0).
     """
     session = await resolve_session(identifier)
     sid = session["session_id"]
-    raw = await _get_contents(sid)
+    escaped = await _get_raw_contents(sid)
+    raw = await _stripped(escaped)
 
-    all_lines = raw.splitlines()
-    while all_lines and not all_lines[-1].strip():
-        all_lines.pop()
+    current_text = await offload.run(len(raw), _joined_lines, raw, reduce)
+    key = _client_key(sid)
+    previous_text = _watch_cursors.get(key, "")
 
-    current_text = "\n".join(all_lines)
-    previous_text = _watch_cursors.get(sid, "")
+    if wait > 0 and previous_text and current_text == previous_text:
+        if await _wait_for_update(sid, wait, escaped):
+            raw = await _get_contents(sid)
+            current_text = await offload.run(len(raw), _joined_lines, raw, reduce)
 
-    if previous_text and current_text.startswith(previous_text):
-        new_text = current_text[len(previous_text):]
-        if new_text.startswith("\n"):
-            new_text = new_text[1:]
-    elif previous_text:
-        new_text = current_text
-    else:
-        new_text = current_text
+    new_text = await offload.run(len(current_text), _new_output, previous_text, current_text)
+    _watch_cursors[key] = current_text
+    new_lines = await offload.run(len(new_text), _split_lines, new_text, reduce)
+
+    response = {
+        "session_id": sid,
+        "name": session["name"],
+    }
+    if reduce:
+        new_lines, response["reduction"] = await offload.run(
+            len(new_text), reducer.reduce_lines, new_lines, max_bytes,
+        )
+        new_text = "\n".join(new_lines)
+    response["new_line_count"] = len(new_lines)
+    response["new_output"] = new_text
+    response["is_first_read"] = previous_text == ""
+    return await offload.run(len(new_text), encode, response)
+
+
+@mcp.tool()
+async def iterm_last_command_output(identifier: str, n: int = 1, prompt_regex: str = "") -> str:
+    """Get the last N commands run in a session, each with its own output.
+
+    Output is split at shell prompts, using iTerm2 shell-integration marks
+    when present (which also provide exit statuses) and prompt patterns
+    otherwise. A bare prompt waiting for input is not counted.
+
+    Args:
+        identifier:   A session ID, TTY path, or (partial) session name.
+        n:            Number of most recent command blocks to return (default 1).
+        prompt_regex: Optional regex matching this session's prompt line,
+                      with a ``command`` group capturing the typed command.
+    """
+    session = await resolve_session(identifier)
+    sid = session["session_id"]
+    raw = await _get_raw_contents(sid)
+
+    raw_lines = await offload.run(len(raw), _command_lines, raw)
+
+    patterns = [prompt_regex] if prompt_regex else None
+    key = _client_key(sid)
+    segmenter = _segmenters.get(key)
+    if segmenter is None or (patterns is not None and segmenter.patterns != patterns):
+        try:
+            segmenter = CommandSegmenter(_strip_escape_sequences, patterns)
+        except re.error as e:
+            return encode({"error": f"Invalid prompt_regex: {e}"})
+        _segmenters[key] = segmenter
+    segmenter.update(raw_lines)
+
+    return await offload.run(len(raw), encode, {
+        "session_id": sid,
+        "name": session["name"],
+        "shell_integration": segmenter.uses_marks,
+        "blocks": segmenter.last_blocks(n),
+    })
+
+
+@mcp.tool()
+async def iterm_read_scrollback(identifier: str, cursor: int = 0, lines: int = 500) -> str:
+    """Page through a session's history using a stable line-offset cursor.
+
+    Only the requested range is transferred. With the ``api`` backend,
+    line numbers count from the start of the session's history, so a
+    cursor keeps pointing at the same line while new output arrives. With
+    the default AppleScript backend only the visible screen can be read:
+    line 0 is the top of the screen, numbers shift as output scrolls, and
+    lines scrolled off the screen are gone.
+
+    Args:
+        identifier: A session ID, TTY path, or (partial) session name.
+        cursor:     Absolute line number to start from (default 0), e.g.
+                    the ``next_cursor`` of a previous call.
+        lines:      Number of lines to return (default 500, max 5000).
+    """
+    session = await resolve_session(identifier)
+    page = await _scrollback.read(
+        session["session_id"], cursor, max(0, min(lines, MAX_SCROLLBACK_LINES)),
+    )
+    output = "\n".join(page["lines"])
+    return await offload.run(len(output), encode, {
+        "session_id": session["session_id"],
+        "name": session["name"],
+        "offset": page["offset"],
+        "line_count": len(page["lines"]),
+        "first_line": page["first_line"],
+        "end_line": page["end_line"],
+        "next_cursor": page["next_cursor"],
+        "output": output,
+    })
+
+
+@mcp.tool()
+async def iterm_export_output(identifier: str, path: str, compress: bool = True) -> str:
+    """Write a session's full history to a local file instead of returning it.
+
+    The history is streamed to disk chunk by chunk with escape sequences
+    stripped, so memory use stays bounded regardless of its size. Only a
+    summary is returned.
+
+    Args:
+        identifier: A session ID, TTY path, or (partial) session name.
+        path:       Destination file path. ``.gz`` is appended when
+                    compressing if not already present.
+        compress:   Gzip the output (default True).
+    """
+    session = await resolve_session(identifier)
+    sid = session["session_id"]
+
+    path = os.path.abspath(os.path.expanduser(path))
+    if compress and not path.endswith(".gz"):
+        path += ".gz"
+
+    def open_file():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return (gzip.open if compress else open)(path, "wb")
 
-    _watch_cursors[sid] = current_text
-    new_lines = new_text.splitlines() if new_text else []
+    line_count = 0
+    text_bytes = 0
+    cursor = 0
+    stop = None
+    # Compression and disk writes run on a thread, off the event loop
+    f = await asyncio.to_thread(open_file)
+    try:
+        while True:
+            page = await _scrollback.read(sid, cursor, _scrollback.chunk_lines, use_cache=False)
+            if stop is None:
+                # Export what existed when the export started
+                stop = page["end_line"]
+            lines = page["lines"][:max(0, stop - page["offset"])]
+            if lines:
+                data = ("\n".join(lines) + "\n").encode("utf-8")
+                await asyncio.to_thread(f.write, data)
+                line_count += len(lines)
+                text_bytes += len(data)
+            next_cursor = page["next_cursor"]
+            if not page["lines"] or next_cursor is None or next_cursor <= cursor or next_cursor >= stop:
+                # Done, or the source stopped making progress
+                break
+            cursor = next_cursor
+    finally:
+        await asyncio.to_thread(f.close)
 
-    return json.dumps({
+    return encode({
         "session_id": sid,
         "name": session["name"],
-        "new_line_count": len(new_lines),
-        "new_output": new_text,
-        "is_first_read": previous_text == "",
+        "path": path,
+        "line_count": line_count,
+        "bytes": text_bytes,
+        "file_bytes": await asyncio.to_thread(os.path.getsize, path),
+        "compressed": compress,
     })
@@ -1,27 +1,46 @@
-"""Session management tools: register, list, focus, get_by_name, set_name."""
+"""Session management tools: register, list, topology_changes, focus,
+get_by_name, set_name, set_colors, session_processes."""
 
-import json
 from datetime import datetime, timezone
 
-from .. import applescript
-from ..sessions import load_state, save_state, fuzzy_match, resolve_session
+from .. import backends, colors, offload, processes, topology
+from ..encoding import encode, group_by_window, paginate, parse_fields, project
+from ..sessions import (
+    FUZZY_COST, SELF, fuzzy_match, list_sessions, load_state, match_session, resolve_session, save_state,
+    self_session,
+)
 from .._server import mcp
 
 
 @mcp.tool()
-async def iterm_register_session(tty_path: str) -> str:
+async def iterm_register_session(tty_path: str = "") -> str:
     """Register a TTY as belonging to the current Claude Code session.
 
-    Call this once at session start so other tools know which terminal
-    belongs to this Claude session.
+    The plugin's SessionStart hook normally does this already. Without
+    ``tty_path`` (or with "self"), the agent's own session is registered
+    from ``ITERM_SESSION_ID`` without scanning the session list.
 
     Args:
-        tty_path: The TTY device path (e.g. "/dev/ttys004").
+        tty_path: The TTY device path (e.g. "/dev/ttys004"). Optional.
     """
-    all_sessions = await applescript.list_all_sessions()
-    session = next((s for s in all_sessions if s["tty"] == tty_path), None)
+    try:
+        me = self_session()
+    except RuntimeError as e:
+        if not tty_path or tty_path == SELF:
+            return encode({"error": str(e)})
+        me = None
+    if not tty_path or tty_path == SELF:
+        if not me["tty"]:
+            return encode({"error": "The TTY of this session is unknown; pass tty_path."})
+        tty_path = me["tty"]
+
+    if me is not None and me["tty"] == tty_path:
+        session = me
+    else:
+        all_sessions = await list_sessions()
+        session = next((s for s in all_sessions if s["tty"] == tty_path), None)
     if session is None:
-        return json.dumps({
+        return encode({
             "error": f"No iTerm2 session found with tty {tty_path}. "
                      "Make sure iTerm2 is running and the tty is correct."
         })
@@ -34,7 +53,7 @@ async def iterm_register_session(tty_path: str) -> str:
     }
     save_state(state)
 
-    return json.dumps({
+    return encode({
         "status": "registered",
         "tty": tty_path,
         "iterm_session_id": session["session_id"],
@@ -43,20 +62,59 @@ async def iterm_register_session(tty_path: str) -> str:
 
 
 @mcp.tool()
-async def iterm_list_sessions() -> str:
+async def iterm_list_sessions(fields: str = "", limit: int = 0, cursor: str = "") -> str:
     """List all iTerm2 sessions across every window, tab, and pane.
 
-    Returns a JSON array of session objects with id, name, tty,
-    window info, tab index, and whether it is registered to a Claude session.
+    Returns sessions grouped by window. Each session object has id, name,
+    tty, tab index, and whether it is registered to a Claude session.
+
+    Args:
+        fields: Optional comma-separated session fields to return
+                (e.g. "session_id,name"). Defaults to all fields.
+        limit:  Maximum number of sessions per page (default 0 = all).
+        cursor: The ``next_cursor`` value from a previous page.
     """
-    all_sessions = await applescript.list_all_sessions()
+    all_sessions = await list_sessions()
     state = load_state()
     registered_ttys = set(state.get("sessions", {}).keys())
 
     for s in all_sessions:
         s["registered"] = s["tty"] in registered_ttys
 
-    return json.dumps(all_sessions, indent=2)
+    try:
+        page, next_cursor = paginate(all_sessions, limit, cursor)
+    except ValueError as e:
+        return encode({"error": str(e)})
+
+    return encode({
+        "total": len(all_sessions),
+        "next_cursor": next_cursor,
+        "windows": group_by_window(page, parse_fields(fields)),
+    })
+
+
+@mcp.tool()
+async def iterm_topology_changes(since_version: int = 0, refresh: bool = True) -> str:
+    """Report sessions added, removed, renamed or moved since a version.
+
+    Much cheaper to poll than iterm_list_sessions: only the differences
+    are returned, with the new ``version`` to pass next time. With
+    ``since_version`` 0, or one too old to still be kept, the full session
+    list is returned instead with ``reset`` set.
+
+    Args:
+        since_version: The ``version`` from a previous call (default 0).
+        refresh:       Fetch the inventory first (default true). When
+                       false, only changes already seen by other tool
+                       calls are reported, without running any script.
+    """
+    if refresh or topology.version() == 0:
+        await list_sessions()
+    version = topology.version()
+    changes = topology.changes_since(since_version)
+    if changes is None:
+        return encode({"version": version, "reset": True, "sessions": topology.current()})
+    return encode({"version": version, "reset": False, "changes": changes})
 
 
 @mcp.tool()
@@ -67,43 +125,42 @@ async def iterm_focus_session(identifier: str) -> str:
         identifier: A session ID, TTY path, or (partial) session name.
     """
     session = await resolve_session(identifier)
-    sid = applescript.escape(session["session_id"])
-
-    script = f'''
-tell application "iTerm2"
-    repeat with w in windows
-        repeat with t in tabs of w
-            repeat with s in sessions of t
-                if id of s is "{sid}" then
-                    tell t to select
-                    return "focused"
-                end if
-            end repeat
-        end repeat
-    end repeat
-    return "not_found"
-end tell
-'''
-    result = await applescript.run(script)
-    return json.dumps({
-        "status": "focused" if result == "focused" else "not_found",
+    focused = await backends.get().focus(session["session_id"])
+    return encode({
+        "status": "focused" if focused else "not_found",
         "session_id": session["session_id"],
         "name": session["name"],
     })
 
 
 @mcp.tool()
-async def iterm_get_session_by_name(name: str) -> str:
+async def iterm_get_session_by_name(name: str, fields: str = "", limit: int = 5, cursor: str = "") -> str:
     """Find iTerm2 sessions whose name matches the query (fuzzy).
 
+    Matches are returned best first, paged like iterm_list_sessions.
+
     Args:
-        name: Full or partial session name to search for.
+        name:   Full or partial session name to search for.
+        fields: Optional comma-separated session fields to return
+                (e.g. "session_id,name"). Defaults to all fields.
+        limit:  Maximum number of matches per page (default 5, 0 = all).
+        cursor: The ``next_cursor`` value from a previous page.
     """
-    all_sessions = await applescript.list_all_sessions()
-    matches = fuzzy_match(name, all_sessions)
+    all_sessions = await list_sessions()
+    matches = await offload.run(len(all_sessions) * FUZZY_COST, fuzzy_match, name, all_sessions)
     if not matches:
-        return json.dumps({"error": f"No session matching '{name}'."})
-    return json.dumps([c for _, c in matches[:5]], indent=2)
+        return encode({"error": f"No session matching '{name}'."})
+
+    try:
+        page, next_cursor = paginate([c for _, c in matches], limit, cursor)
+    except ValueError as e:
+        return encode({"error": str(e)})
+
+    return encode({
+        "total": len(matches),
+        "next_cursor": next_cursor,
+        "sessions": project(page, parse_fields(fields)),
+    })
 
 
 @mcp.tool()
@@ -115,28 +172,76 @@ async def iterm_set_session_name(identifier: str, new_name: str) -> str:
         new_name:   The new display name to set.
     """
     session = await resolve_session(identifier)
-    sid = applescript.escape(session["session_id"])
-    safe_name = applescript.escape(new_name)
-
-    script = f'''
-tell application "iTerm2"
-    repeat with w in windows
-        repeat with t in tabs of w
-            repeat with s in sessions of t
-                if id of s is "{sid}" then
-                    tell s to set name to "{safe_name}"
-                    return "renamed"
-                end if
-            end repeat
-        end repeat
-    end repeat
-    return "not_found"
-end tell
-'''
-    result = await applescript.run(script)
-    return json.dumps({
-        "status": "renamed" if result == "renamed" else "not_found",
+    renamed = await backends.get().set_name(session["session_id"], new_name)
+    return encode({
+        "status": "renamed" if renamed else "not_found",
         "session_id": session["session_id"],
         "old_name": session["name"],
         "new_name": new_name,
     })
+
+
+@mcp.tool()
+async def iterm_set_colors(sessions: dict[str, str]) -> str:
+    """Set the tab color of many sessions in one call.
+
+    All sessions are looked up in one inventory and recolored by writing
+    to their TTYs, which stay open for later recolors.
+
+    Args:
+        sessions: Map of session ID, TTY path, (partial) name, or "self" to a
+                  color: a scheme name ("success", "failure", "running",
+                  "alert", ...), "#rrggbb", or "default" to reset it.
+    """
+    all_sessions = await list_sessions()
+    results, errors = [], []
+    for identifier, color in sessions.items():
+        rgb = colors.parse(color)
+        if rgb is None and color != colors.DEFAULT:
+            errors.append({"identifier": identifier, "error": (
+                f"Unknown color '{color}'. Use #rrggbb, '{colors.DEFAULT}' "
+                f"or one of {list(colors.SCHEMES)}."
+            )})
+            continue
+        try:
+            target = self_session()["session_id"] if identifier == SELF else identifier
+            session = match_session(target, all_sessions)
+            if not session["tty"]:
+                raise RuntimeError(f"Session '{session['name']}' has no TTY.")
+            colors.write(session["tty"], rgb)
+        except (OSError, RuntimeError) as e:
+            errors.append({"identifier": identifier, "error": str(e)})
+            continue
+        results.append({"session_id": session["session_id"], "name": session["name"], "color": color})
+    return encode({"colored": results, "errors": errors})
+
+
+@mcp.tool()
+async def iterm_session_processes(identifier: str = "", tree: bool = False) -> str:
+    """Show what is running in sessions: foreground command, CPU, memory.
+
+    All sessions are inspected from one process-table snapshot (cached for
+    about a second). A session is "busy" when a command other than its
+    shell holds the terminal, "idle" at a prompt, and "none" when nothing
+    is attached to its TTY.
+
+    Args:
+        identifier: Optional session ID, TTY path, or (partial) session
+                    name. Defaults to every session.
+        tree:       Also list every process on each session's TTY.
+    """
+    if identifier:
+        sessions = [await resolve_session(identifier)]
+    else:
+        sessions = await list_sessions()
+
+    try:
+        by_tty = await processes.snapshot()
+    except (OSError, RuntimeError) as e:
+        return encode({"error": f"Could not read the process table: {e}"})
+
+    results = []
+    for s in sessions:
+        summary = processes.summarize(by_tty.get(processes.tty_key(s["tty"]), []) if s["tty"] else [], tree)
+        results.append({"session_id": s["session_id"], "name": s["name"], "tty": s["tty"], **summary})
+    return encode({"sessions": results})
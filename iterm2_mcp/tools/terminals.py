@@ -1,52 +1,44 @@
-"""Terminal creation tools: new_tab, split_pane."""
+"""Terminal creation tools: new_tab, split_pane, acquire_session."""
 
 import json
 
-from .. import applescript, colors
+from .. import backends, colors, pool
 from ..sessions import resolve_session
 from .._server import mcp
 
 
-async def _send_command(session_id: str, command: str) -> None:
-    """Send a shell command to a session by ID."""
-    sid = applescript.escape(session_id)
-    safe_cmd = applescript.escape(command)
-    script = f'''
-tell application "iTerm2"
-    repeat with w in windows
-        repeat with t in tabs of w
-            repeat with s in sessions of t
-                if id of s is "{sid}" then
-                    tell s to write text "{safe_cmd}"
-                    return
-                end if
-            end repeat
-        end repeat
-    end repeat
-end tell
-'''
-    await applescript.run(script)
-
-
-async def _set_session_name(session_id: str, name: str) -> None:
-    """Set the display name on a session by ID."""
-    sid = applescript.escape(session_id)
-    safe_name = applescript.escape(name)
-    script = f'''
-tell application "iTerm2"
-    repeat with w in windows
-        repeat with t in tabs of w
-            repeat with s in sessions of t
-                if id of s is "{sid}" then
-                    tell s to set name to "{safe_name}"
-                    return
-                end if
-            end repeat
-        end repeat
-    end repeat
-end tell
-'''
-    await applescript.run(script)
+async def _open_tab(window_id: str | None, name: str = "", command: str = "") -> dict:
+    """Create, color, name and start a tab; return ``{session_id, tty}``."""
+    backend = backends.get()
+    created = await backend.create_tab(window_id)
+    session_id = created["session_id"]
+
+    await colors.apply(session_id, "background_task", created["tty"])
+
+    if name:
+        await backend.set_name(session_id, name)
+
+    if command:
+        await backend.send_text(session_id, command)
+    return created
+
+
+async def _open_split(session_id: str | None, vertical: bool, name: str = "", command: str = "") -> dict | None:
+    """Split, color, name and start a pane; None if *session_id* is gone."""
+    backend = backends.get()
+    created = await backend.split_pane(session_id, vertical)
+    if created is None:
+        return None
+    session_id = created["session_id"]
+
+    await colors.apply(session_id, "split_pane", created["tty"])
+
+    if name:
+        await backend.set_name(session_id, name)
+
+    if command:
+        await backend.send_text(session_id, command)
+    return created
 
 
 @mcp.tool()
@@ -64,41 +56,17 @@ async def iterm_new_tab(
                            which window to create the tab in. Defaults to
                            the frontmost window.
     """
+    window_id = None
     if window_identifier:
-        session = await resolve_session(window_identifier)
-        wid = session["window_id"]
-        window_ref = f"window id {wid}"
-    else:
-        window_ref = "first window"
-
-    script = f'''
-tell application "iTerm2"
-    tell {window_ref}
-        set newTab to (create tab with default profile)
-        tell current session of newTab
-            set sid to id of it
-            set stty to tty of it
-        end tell
-    end tell
-    return sid & "||" & stty
-end tell
-'''
-    raw = await applescript.run(script)
-    p = raw.split("||")
-    session_id = p[0] if len(p) > 0 else ""
-
-    await colors.apply(session_id, "background_task")
+        session = await resolve_session(window_identifier, locate=True)
+        window_id = session["window_id"]
 
-    if name:
-        await _set_session_name(session_id, name)
-
-    if command:
-        await _send_command(session_id, command)
+    created = await _open_tab(window_id, name, command)
 
     return json.dumps({
         "status": "created",
-        "session_id": session_id,
-        "tty": p[1] if len(p) > 1 else "",
+        "session_id": created["session_id"],
+        "tty": created["tty"],
         "name": name,
     })
 
@@ -122,67 +90,86 @@ async def iterm_split_pane(
     if direction not in ("vertical", "horizontal"):
         return json.dumps({"error": "direction must be 'vertical' or 'horizontal'."})
 
-    split_cmd = "split vertically" if direction == "vertical" else "split horizontally"
-
+    session_id = None
     if identifier:
         session = await resolve_session(identifier)
-        sid = applescript.escape(session["session_id"])
-        script = f'''
-tell application "iTerm2"
-    repeat with w in windows
-        repeat with t in tabs of w
-            repeat with s in sessions of t
-                if id of s is "{sid}" then
-                    tell s
-                        set newSession to ({split_cmd} with default profile)
-                    end tell
-                    tell newSession
-                        set rsid to id of it
-                        set rtty to tty of it
-                    end tell
-                    return rsid & "||" & rtty
-                end if
-            end repeat
-        end repeat
-    end repeat
-    return "not_found"
-end tell
-'''
-    else:
-        script = f'''
-tell application "iTerm2"
-    tell first window
-        tell current session of current tab
-            set newSession to ({split_cmd} with default profile)
-        end tell
-        tell newSession
-            set rsid to id of it
-            set rtty to tty of it
-        end tell
-    end tell
-    return rsid & "||" & rtty
-end tell
-'''
-
-    raw = await applescript.run(script)
-    if raw == "not_found":
+        session_id = session["session_id"]
+
+    created = await _open_split(session_id, direction == "vertical", name, command)
+    if created is None:
         return json.dumps({"error": "Session not found for splitting."})
 
-    p = raw.split("||")
-    session_id = p[0] if len(p) > 0 else ""
+    return json.dumps({
+        "status": "created",
+        "direction": direction,
+        "session_id": created["session_id"],
+        "tty": created["tty"],
+        "name": name,
+    })
 
-    await colors.apply(session_id, "split_pane")
 
-    if name:
-        await _set_session_name(session_id, name)
+@mcp.tool()
+async def iterm_acquire_session(
+    name: str,
+    command: str = "",
+    window_identifier: str = "",
+) -> str:
+    """Get a ready shell session, from the pre-warmed pool when possible.
+
+    Pooled sessions (see ITERM_MCP_POOL_SIZE) already have a prompt, so
+    the command starts immediately; they live in the pool's own window
+    unless moved. When the pool is empty or disabled, a new tab is
+    created as with iterm_new_tab.
+
+    Args:
+        name:              Display name for the session.
+        command:           Optional shell command to execute in it.
+        window_identifier: Optional session ID, TTY, or name of a session
+                           whose window the session should be in. Pooled
+                           sessions are only used if the backend can move
+                           them there.
+    """
+    window_id = None
+    if window_identifier:
+        session = await resolve_session(window_identifier, locate=True)
+        window_id = session["window_id"]
+
+    backend = backends.get()
+    acquired = None
+    if not window_id or backend.can_move_sessions:
+        while (pooled := pool.acquire()) is not None:
+            try:
+                if window_id and not await backend.move_to_window(pooled["session_id"], window_id):
+                    if await backend.session_tty(pooled["session_id"]):
+                        # Still open but cannot be moved: keep it pooled
+                        pool.release(pooled)
+                        break
+                    continue
+                # Skip sessions closed while they sat in the pool
+                if not await backend.set_name(pooled["session_id"], name):
+                    continue
+            except RuntimeError:
+                # Not handed out, so it must not be lost either
+                pool.release(pooled)
+                raise
+            acquired = pooled
+            break
+    from_pool = acquired is not None
+
+    if acquired is None:
+        acquired = await backend.create_tab(window_id)
+        await backend.set_name(acquired["session_id"], name)
+    session_id = acquired["session_id"]
+
+    await colors.apply(session_id, "background_task", acquired["tty"])
 
     if command:
-        await _send_command(session_id, command)
+        await backend.send_text(session_id, command)
 
     return json.dumps({
-        "status": "created",
-        "direction": direction,
+        "status": "acquired",
         "session_id": session_id,
-        "tty": p[1] if len(p) > 1 else "",
+        "tty": acquired["tty"],
         "name": name,
+        "pooled": from_pool,
     })
@@ -0,0 +1,363 @@
+"""Trigger tools: add_trigger, remove_trigger.
+
+A trigger is a regex watched for in one session's output. One shared
+capture loop checks every session that has triggers, at background
+script priority, and reads only the lines that appeared since its last
+check: each session keeps an absolute history cursor, as the job runner
+does, and the last line is read again only when its text changed (a
+command still printing, or a prompt coming back). Backends without
+stable line numbers (AppleScript) serve only the screen, so there the
+new lines are found by diffing the screen against the previous check's;
+output that scrolls past within one poll interval is missed. New lines
+are screened with one combined regex per session; only lines it matches
+are tested against each trigger.
+
+Each match is sent to the client that added the trigger as an MCP log
+message (logger ``iterm2-mcp.triggers``) with the session, line and
+timestamp, and can recolor the session's tab.
+"""
+
+import asyncio
+import re
+import secrets
+import sys
+from datetime import datetime, timezone
+
+from mcp.server.fastmcp import Context
+
+from .. import backends, colors, scheduler, topology
+from ..encoding import encode
+from ..sessions import resolve_session
+from .._server import mcp
+from .output import _strip_escape_sequences
+
+# Seconds between checks of the watched sessions
+POLL_INTERVAL = 1.0
+
+# Lines a pane's screen may span; only these are read when a trigger is added
+SCREEN_LINES = 200
+
+# Most lines read from one session per check
+MAX_FETCH_LINES = 5000
+
+# Most triggers active at once
+MAX_TRIGGERS = 100
+
+# Most notifications per trigger per check; the rest are counted
+MAX_NOTIFICATIONS = 10
+
+LOGGER = "iterm2-mcp.triggers"
+
+_triggers: dict[str, dict] = {}
+
+# Per watched session: cursor, last line text, triggers already fired on
+# that line, the combined matcher, the session's name and, for backends
+# without stable line numbers, the screen lines seen by the last check
+_watched: dict[str, dict] = {}
+
+_task: asyncio.Task | None = None
+
+
+def _combine(triggers: list[dict]) -> re.Pattern | None:
+    """One regex matching any line that some trigger matches, if possible.
+
+    Patterns with backreferences would change meaning once their groups
+    are renumbered, so those sessions test each trigger on every line.
+    """
+    parts = []
+    for t in triggers:
+        if re.search(r"\\\d|\(\?P=", t["pattern"]):
+            return None
+        parts.append(f"(?i:{t['pattern']})" if t["ignore_case"] else f"(?:{t['pattern']})")
+    try:
+        return re.compile("|".join(parts))
+    except re.error:
+        return None
+
+
+def _session_triggers(session_id: str) -> list[dict]:
+    return [t for t in _triggers.values() if t["session_id"] == session_id]
+
+
+def _rebuild(session_id: str) -> None:
+    triggers = _session_triggers(session_id)
+    if not triggers:
+        _watched.pop(session_id, None)
+        return
+    _watched[session_id]["matcher"] = _combine(triggers)
+
+
+def _forget_closed(changes: list[dict]) -> None:
+    for c in changes:
+        state = _watched.get(c["session_id"])
+        if state is None:
+            continue
+        if c["type"] == "removed":
+            for t in _session_triggers(c["session_id"]):
+                del _triggers[t["trigger_id"]]
+            del _watched[c["session_id"]]
+        elif c["type"] == "renamed":
+            state["name"] = c["name"]
+
+
+topology.subscribe(_forget_closed)
+
+
+def _visible(lines: list[str]) -> list[str]:
+    lines = [_strip_escape_sequences(line) for line in lines]
+    while lines and not lines[-1].strip():
+        lines.pop()
+    return lines
+
+
+def _scrolled(previous: list[str], current: list[str]) -> int | None:
+    """Return where *previous*'s last line is in *current* after scrolling.
+
+    The lines above it must reappear unchanged, shifted up by as few rows
+    as possible; the last line itself may have grown. None if the screen
+    cannot be matched up (cleared, or scrolled by more than a screen).
+    """
+    if not previous:
+        return None
+    stable = previous[:-1]
+    for shift in range(len(stable)):
+        kept = stable[shift:]
+        if len(current) > len(kept) and current[:len(kept)] == kept:
+            return len(kept)
+    if current and current[0].startswith(previous[-1]):
+        return 0
+    return None
+
+
+async def _start_cursor(session_id: str) -> tuple[int, str | None, list[str]]:
+    """Return the position and text of the last line currently shown, and
+    the visible lines."""
+    backend = backends.get()
+    first, total, _ = await backend.fetch(session_id, 0, 0)
+    start = max(first, total - SCREEN_LINES)
+    first, total, lines = await backend.fetch(session_id, start, SCREEN_LINES)
+    lines = _visible(lines)
+    if not lines:
+        return start, None, lines
+    return start + len(lines) - 1, lines[-1], lines
+
+
+async def _notify(trigger: dict, events: list[dict]) -> None:
+    if trigger["color"]:
+        try:
+            await colors.apply(trigger["session_id"], trigger["color"])
+        except (OSError, RuntimeError) as e:
+            print(f"iterm2-mcp trigger {trigger['trigger_id']}: {e}", file=sys.stderr)
+    if trigger["client"] is None:
+        return
+    shown = events[:MAX_NOTIFICATIONS]
+    if len(events) > len(shown):
+        shown[-1] = {**shown[-1], "suppressed": len(events) - len(shown)}
+    for event in shown:
+        try:
+            await trigger["client"].send_log_message(level="notice", data=event, logger=LOGGER)
+        except Exception:
+            # The client went away; nobody is left to notify
+            _triggers.pop(trigger["trigger_id"], None)
+            _rebuild(trigger["session_id"])
+            return
+
+
+async def _scan(session_id: str, state: dict) -> None:
+    """Test the lines that appeared since the last check against the triggers."""
+    backend = backends.get()
+    cursor = state["cursor"]
+    try:
+        with scheduler.priority(scheduler.BACKGROUND):
+            if backend.stable_lines:
+                first, total, lines = await backend.fetch(session_id, cursor, MAX_FETCH_LINES)
+            else:
+                first, total, lines = await backend.fetch(session_id, 0, SCREEN_LINES)
+    except scheduler.Shed:
+        return
+    except RuntimeError:
+        try:
+            closed = not await backend.session_tty(session_id)
+        except RuntimeError:
+            return
+        if closed:
+            _forget_closed([{"type": "removed", "session_id": session_id}])
+        return
+    if not backend.stable_lines:
+        lines = _visible(lines)
+        row = _scrolled(state["screen"], lines)
+        state["screen"] = lines
+        # Line numbers are screen rows; row is the previous last line's
+        start, cursor = (0, -1) if row is None else (row, row)
+        lines = lines[start:]
+        if not lines:
+            state.update(last_text=None, fired=set())
+            return
+    elif total <= cursor:
+        # The buffer was cleared or trimmed past the cursor
+        state.update(cursor=first, last_text=None, fired=set())
+        return
+    else:
+        start = max(cursor, first)
+        lines = _visible(lines)
+        if not lines:
+            return
+
+    # Triggers already fired on the cursor line are not fired on it again
+    fired = state["fired"] if start == cursor else set()
+    skip = 1 if start == cursor and lines[0] == state["last_text"] else 0
+    triggers = _session_triggers(session_id)
+    matcher = state["matcher"]
+    now = datetime.now(timezone.utc).isoformat()
+    last = len(lines) - 1
+    matches: dict[str, list[dict]] = {}
+    fired_last: set[str] = set()
+    for i in range(skip, len(lines)):
+        line = lines[i]
+        if matcher is not None and not matcher.search(line):
+            continue
+        for t in triggers:
+            if i == 0 and t["trigger_id"] in fired:
+                continue
+            if t["regex"].search(line):
+                matches.setdefault(t["trigger_id"], []).append({
+                    "trigger_id": t["trigger_id"],
+                    "session_id": session_id,
+                    "name": state["name"],
+                    "pattern": t["pattern"],
+                    "line": line,
+                    "line_number": start + i,
+                    "timestamp": now,
+                })
+                if i == last:
+                    fired_last.add(t["trigger_id"])
+    state.update(
+        cursor=start + last,
+        last_text=lines[last],
+        fired=fired_last | fired if last == 0 else fired_last,
+    )
+
+    for trigger_id, events in matches.items():
+        trigger = _triggers.get(trigger_id)
+        if trigger is None:
+            continue
+        trigger["matches"] += len(events)
+        trigger["last_match"] = events[-1]
+        if trigger["once"]:
+            del _triggers[trigger_id]
+            _rebuild(session_id)
+        await _notify(trigger, events)
+
+
+async def _capture_loop() -> None:
+    while _watched:
+        results = await asyncio.gather(
+            *(_scan(sid, state) for sid, state in list(_watched.items())),
+            return_exceptions=True,
+        )
+        for e in results:
+            if isinstance(e, Exception):
+                print(f"iterm2-mcp triggers: {e!r}", file=sys.stderr)
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+def _ensure_loop() -> None:
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(_capture_loop())
+
+
+def clear() -> None:
+    """Remove every trigger and stop the capture loop."""
+    global _task
+    _triggers.clear()
+    _watched.clear()
+    if _task is not None:
+        _task.cancel()
+        _task = None
+
+
+def _public(trigger: dict) -> dict:
+    return {k: v for k, v in trigger.items() if k not in ("regex", "client")}
+
+
+@mcp.tool()
+async def iterm_add_trigger(
+    identifier: str,
+    pattern: str,
+    ctx: Context,
+    color: str = "",
+    once: bool = False,
+    ignore_case: bool = False,
+) -> str:
+    """Get notified when a regex appears in a session's new output.
+
+    Only lines printed after the trigger is added are matched. Each match
+    is sent as an MCP log message (logger "iterm2-mcp.triggers") with the
+    session, line and timestamp. Triggers are removed when their session
+    closes.
+
+    Args:
+        identifier:  A session ID, TTY path, or (partial) session name.
+        pattern:     Regex searched for in each new line (e.g. "ERROR|Traceback").
+        color:       Optional color scheme (e.g. "alert") or "#rrggbb" to
+                     give the session's tab on a match.
+        once:        Remove the trigger after its first match.
+        ignore_case: Match case-insensitively.
+    """
+    try:
+        regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+    except re.error as e:
+        return encode({"error": f"Invalid pattern: {e}"})
+    if color and colors.parse(color) is None:
+        return encode({"error": f"Unknown color '{color}'. Known colors: {list(colors.SCHEMES)}"})
+    if len(_triggers) >= MAX_TRIGGERS:
+        return encode({"error": f"Too many triggers (at most {MAX_TRIGGERS}); remove some first."})
+
+    session = await resolve_session(identifier)
+    sid = session["session_id"]
+    try:
+        client = ctx.session
+    except ValueError:
+        # Called outside an MCP request: matches are recorded but not sent
+        client = None
+
+    state = _watched.get(sid)
+    if state is None:
+        cursor, last_text, screen = await _start_cursor(sid)
+        state = {"cursor": cursor, "last_text": last_text, "fired": set(),
+                 "matcher": None, "name": session["name"], "screen": screen}
+    trigger_id = secrets.token_hex(3)
+    _triggers[trigger_id] = {
+        "trigger_id": trigger_id,
+        "session_id": sid,
+        "pattern": pattern,
+        "ignore_case": ignore_case,
+        "color": color or None,
+        "once": once,
+        "matches": 0,
+        "last_match": None,
+        "regex": regex,
+        "client": client,
+    }
+    if state["last_text"] is not None:
+        # The line already on screen does not count as new output
+        state["fired"].add(trigger_id)
+    _watched[sid] = state
+    _rebuild(sid)
+    _ensure_loop()
+    return encode({"status": "added", "name": session["name"], **_public(_triggers[trigger_id])})
+
+
+@mcp.tool()
+async def iterm_remove_trigger(trigger_id: str) -> str:
+    """Remove a trigger added with iterm_add_trigger.
+
+    Args:
+        trigger_id: The ``trigger_id`` returned by iterm_add_trigger.
+    """
+    trigger = _triggers.pop(trigger_id, None)
+    if trigger is None:
+        return encode({"error": f"Unknown trigger_id '{trigger_id}'. Known triggers: {list(_triggers)}"})
+    _rebuild(trigger["session_id"])
+    return encode({"status": "removed", **_public(trigger)})
@@ -0,0 +1,120 @@
+"""Versioned session inventory and the changes between inventories.
+
+Every inventory fetched through ``sessions.list_sessions`` is compared
+with the previous one. Differences (sessions added, removed, renamed, or
+moved to another window or tab) bump the version and are kept in a
+bounded log, so ``iterm_topology_changes`` can answer with only what
+changed since a client's last version. Listeners registered with
+``subscribe`` receive each batch of changes; modules holding per-session
+state use them to drop it when a session closes.
+"""
+
+import sys
+from collections import deque
+from typing import Callable
+
+from . import metrics
+
+# Changes kept for clients catching up; older versions get a full reset
+MAX_CHANGES = 1000
+
+# Session fields tracked between inventories
+_FIELDS = ("session_id", "name", "tty", "window_id", "window_name", "tab_index")
+
+_version = 0
+_sessions: dict[str, dict] | None = None
+_log: deque[dict] = deque(maxlen=MAX_CHANGES)
+_listeners: list[Callable[[list[dict]], None]] = []
+
+
+def version() -> int:
+    """Return the current inventory version (0 before the first inventory)."""
+    return _version
+
+
+def current() -> list[dict]:
+    """Return the sessions of the latest inventory."""
+    return list((_sessions or {}).values())
+
+
+def reset() -> None:
+    """Forget the inventory and the change log; the next inventory is a new baseline."""
+    global _version, _sessions
+    _version = 0
+    _sessions = None
+    _log.clear()
+
+
+def subscribe(listener: Callable[[list[dict]], None]) -> None:
+    """Call *listener* with each non-empty list of changes."""
+    _listeners.append(listener)
+
+
+def _diff(old: dict[str, dict], new: dict[str, dict]) -> list[dict]:
+    changes = []
+    for sid, s in new.items():
+        before = old.get(sid)
+        if before is None:
+            changes.append({"type": "added", **s})
+            continue
+        if before["name"] != s["name"]:
+            changes.append({"type": "renamed", "session_id": sid,
+                            "old_name": before["name"], "name": s["name"]})
+        if (before["window_id"], before["tab_index"]) != (s["window_id"], s["tab_index"]):
+            changes.append({
+                "type": "moved",
+                "session_id": sid,
+                "name": s["name"],
+                "from": {"window_id": before["window_id"], "tab_index": before["tab_index"]},
+                "to": {"window_id": s["window_id"], "tab_index": s["tab_index"]},
+            })
+    for sid, s in old.items():
+        if sid not in new:
+            changes.append({"type": "removed", "session_id": sid, "name": s["name"], "tty": s["tty"]})
+    return changes
+
+
+@metrics.instrument("topology_diff")
+def observe(sessions: list[dict]) -> list[dict]:
+    """Record a freshly fetched inventory and return its changes.
+
+    The first inventory only sets the baseline (version 1). Later ones
+    bump the version when anything changed and notify the listeners.
+    """
+    global _version, _sessions
+    new = {s["session_id"]: {k: s.get(k) for k in _FIELDS} for s in sessions}
+    if _sessions is None:
+        _sessions = new
+        _version = 1
+        return []
+    changes = _diff(_sessions, new)
+    _sessions = new
+    if not changes:
+        return []
+    _version += 1
+    for change in changes:
+        change["version"] = _version
+        _log.append(change)
+    metrics.set_gauge("topology.version", _version)
+    for listener in _listeners:
+        try:
+            listener(changes)
+        except Exception as e:
+            print(f"iterm2-mcp topology listener: {e}", file=sys.stderr)
+    return changes
+
+
+def changes_since(since_version: int) -> list[dict] | None:
+    """Return the changes after *since_version*, or None if they are no longer kept."""
+    if since_version == _version:
+        return []
+    if since_version < 1 or since_version > _version:
+        # Unknown, e.g. from before a server restart
+        return None
+    oldest = _log[0]["version"] if _log else _version
+    if len(_log) == _log.maxlen:
+        # The oldest version's changes may have been partly evicted
+        oldest += 1
+    if since_version < oldest - 1:
+        return None
+    return [c for c in _log if c["version"] > since_version]
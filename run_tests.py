@@ -47,8 +47,9 @@ async def run_tests():
     # ── Test 1.1: List all sessions ──
     print("\n── Session Listing ──")
     raw = await iterm_list_sessions()
-    sessions = json.loads(raw)
-    ok = isinstance(sessions, list) and len(sessions) > 0
+    windows = json.loads(raw)["windows"]
+    sessions = [s for w in windows for s in w["sessions"]]
+    ok = len(sessions) > 0
     result("1.1", "List all sessions", ok,
            f"got {len(sessions)} sessions" if ok else f"unexpected: {raw[:100]}")
     if not ok:
@@ -59,10 +60,19 @@ async def run_tests():
     first_session = sessions[0]
     first_tty = first_session["tty"]
     has_fields = all(k in first_session for k in
-                     ["session_id", "name", "tty", "window_id", "window_name", "tab_index"])
+                     ["session_id", "name", "tty", "tab_index"])
+    has_fields = has_fields and all(k in windows[0] for k in ["window_id", "window_name"])
     result("1.1b", "Session has all required fields", has_fields,
            "" if has_fields else f"missing fields in {list(first_session.keys())}")
 
+    # ── Test 1.3: Field projection and pagination ──
+    raw = await iterm_list_sessions(fields="session_id,name", limit=1)
+    data = json.loads(raw)
+    page = [s for w in data["windows"] for s in w["sessions"]]
+    ok = (len(page) == 1 and set(page[0]) == {"session_id", "name"}
+          and (data["next_cursor"] is not None) == (len(sessions) > 1))
+    result("1.3", "List sessions with fields and limit", ok, str(data)[:80])
+
     # ── Test 2.1: Register current session ──
     print("\n── Session Registration ──")
     raw = await iterm_register_session(first_tty)
@@ -85,7 +95,7 @@ async def run_tests():
 
     # ── Test 1.2: List sessions shows registered flag ──
     raw = await iterm_list_sessions()
-    sessions = json.loads(raw)
+    sessions = [s for w in json.loads(raw)["windows"] for s in w["sessions"]]
     registered = [s for s in sessions if s.get("registered")]
     ok = len(registered) > 0
     result("1.2", "List sessions shows registered flag", ok,
@@ -96,17 +106,17 @@ async def run_tests():
     target_name = first_session["name"]
     raw = await iterm_get_session_by_name(target_name)
     data = json.loads(raw)
-    ok = isinstance(data, list) and len(data) > 0
+    ok = len(data.get("sessions", [])) > 0
     result("3.1", "Find session by exact name", ok,
-           f"found {len(data)} match(es)" if ok else str(data))
+           f"found {data['total']} match(es)" if ok else str(data))
 
     # ── Test 3.2: Find session by partial name ──
     partial = target_name[:max(4, len(target_name) // 2)]
     raw = await iterm_get_session_by_name(partial)
     data = json.loads(raw)
-    ok = isinstance(data, list) and len(data) > 0
+    ok = len(data.get("sessions", [])) > 0
     result("3.2", f"Find session by partial name '{partial}'", ok,
-           f"found {len(data)} match(es)" if ok else str(data))
+           f"found {data['total']} match(es)" if ok else str(data))
 
     # ── Test 3.3: Find session with no match ──
     raw = await iterm_get_session_by_name("zzz_nonexistent_session_zzz")
@@ -136,7 +146,7 @@ async def run_tests():
     await asyncio.sleep(0.5)
     raw2 = await iterm_get_session_by_name("test-tab-named")
     lookup = json.loads(raw2)
-    ok_name = isinstance(lookup, list) and len(lookup) > 0
+    ok_name = len(lookup.get("sessions", [])) > 0
     result("4.2", "Create new tab with name", ok_create and ok_name,
            "name set correctly" if ok_name else f"name lookup failed: {str(lookup)[:80]}")
 
@@ -175,7 +185,7 @@ async def run_tests():
     await asyncio.sleep(0.5)
     raw2 = await iterm_get_session_by_name("test-split-named")
     lookup = json.loads(raw2)
-    ok_name = isinstance(lookup, list) and len(lookup) > 0
+    ok_name = len(lookup.get("sessions", [])) > 0
     result("4.6", "Split pane with name", ok_create and ok_name,
            "name set correctly" if ok_name else f"name lookup failed: {str(lookup)[:80]}")
 
@@ -350,11 +360,11 @@ async def run_tests():
     await asyncio.sleep(0.3)
     raw = await iterm_get_session_by_name("unique-e2e-test")
     data = json.loads(raw)
-    ok = isinstance(data, list) and any(
-        s.get("session_id") == rename_id for s in data
+    ok = any(
+        s.get("session_id") == rename_id for s in data.get("sessions", [])
     )
     result("8.3", "E2E: create tab → rename → find by partial name", ok,
-           f"found={ok}, matches={len(data) if isinstance(data, list) else data}")
+           f"found={ok}, matches={data.get('total', data)}")
 
     # ── Test 9.1: Send empty command ──
     print("\n── Edge Cases ──")
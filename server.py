@@ -1,10 +1,34 @@
 #!/usr/bin/env python3
-"""iTerm2 MCP Server entrypoint."""
+"""iTerm2 MCP Server entrypoint.
 
-from iterm2_mcp._server import mcp
-from iterm2_mcp.tools import register_all
+    server.py            serve one client over stdio
+    server.py --shared   relay stdio to the shared per-user daemon
+                         (also selected by ITERM_MCP_SHARED=1)
+    server.py --daemon   run the shared daemon in the foreground
+"""
 
-register_all(mcp)
+import time
+
+_STARTED = time.perf_counter()
+
+import sys  # noqa: E402
+
+from iterm2_mcp import daemon  # noqa: E402
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    if "--daemon" in sys.argv:
+        daemon.serve(_STARTED)
+    elif daemon.shared_mode():
+        # The proxy never imports the MCP SDK or the tools
+        daemon.proxy()
+    else:
+        from iterm2_mcp import startup
+
+        startup.started_at(_STARTED)
+        from iterm2_mcp._server import mcp
+        from iterm2_mcp.tools import register_all
+
+        startup.mark("imports")
+        register_all(mcp)
+        startup.mark("tools")
+        mcp.run(transport="stdio")
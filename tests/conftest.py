@@ -0,0 +1,34 @@
+"""Shared fixtures: the server's tools against a simulated iTerm2."""
+
+import json
+
+import pytest
+
+from benchmarks.fake_iterm import FakeITerm
+from iterm2_mcp import applescript, backends, sessions, topology
+from iterm2_mcp._server import mcp
+from iterm2_mcp.tools import register_all
+
+register_all(mcp)
+
+
+@pytest.fixture
+def fake_iterm(tmp_path, monkeypatch):
+    """A ``FakeITerm`` with 4 sessions and no delays, behind the AppleScript backend."""
+    fake = FakeITerm(sessions=4, buffer_lines=100, time_scale=0, tty_dir=str(tmp_path))
+    monkeypatch.setattr(sessions, "SESSION_FILE", tmp_path / "sessions.json")
+    backends.set_backend(backends.create("applescript"))
+    applescript.set_executor(fake.execute)
+    topology.reset()
+    yield fake
+    applescript.set_executor(None)
+    backends.set_backend(None)
+    topology.reset()
+
+
+async def call(tool: str, args: dict) -> dict:
+    """Call *tool* through MCP dispatch and decode its JSON response."""
+    result = await mcp.call_tool(tool, args)
+    if isinstance(result, tuple):
+        result = result[0]
+    return json.loads(result[0].text)
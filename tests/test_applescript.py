@@ -0,0 +1,146 @@
+"""Tests for running scripts (timeouts, retries, the circuit breaker) and
+parsing their results."""
+
+import asyncio
+
+import pytest
+
+from benchmarks.fake_iterm import FakeITerm
+from iterm2_mcp import applescript
+from iterm2_mcp.applescript import parse_source
+
+
+class _ITerm:
+    """An executor that hangs while ``down`` is set, as with a modal dialog."""
+
+    def __init__(self, down: bool = False, hang_first: int = 0):
+        self.down = down
+        self.hang_first = hang_first
+        self.calls = []
+
+    async def __call__(self, script: str) -> str:
+        self.calls.append(script)
+        if self.down or len(self.calls) <= self.hang_first:
+            await asyncio.sleep(60)
+        return "ok"
+
+
+@pytest.fixture
+def iterm(monkeypatch):
+    monkeypatch.setattr(applescript, "breaker", applescript._CircuitBreaker())
+    monkeypatch.setattr(applescript, "BREAKER_PROBE_INTERVAL", 0.01)
+    monkeypatch.setattr(applescript, "BREAKER_PROBE_TIMEOUT", 0.01)
+    fake = _ITerm()
+    applescript.set_executor(fake)
+    yield fake
+    applescript.set_executor(None)
+
+
+def test_reads_are_retried_after_a_timeout(iterm):
+    iterm.hang_first = 1
+
+    result = asyncio.run(applescript.run("read", timeout=0.01, idempotent=True))
+
+    assert result == "ok"
+    assert iterm.calls == ["read", "read"]
+    assert applescript.breaker.timeouts == 0
+
+
+def test_writes_are_not_retried(iterm):
+    iterm.hang_first = 1
+
+    with pytest.raises(applescript.ScriptTimeout):
+        asyncio.run(applescript.run("write", timeout=0.01))
+    assert iterm.calls == ["write"]
+
+
+def test_breaker_opens_probes_and_closes(iterm):
+    iterm.down = True
+
+    async def scenario():
+        for _ in range(applescript.BREAKER_THRESHOLD):
+            with pytest.raises(applescript.ScriptTimeout):
+                await applescript.run("write", timeout=0.01)
+        # Open: fail fast without running anything
+        calls = len(iterm.calls)
+        with pytest.raises(applescript.CircuitOpen):
+            await applescript.run("write", timeout=0.01)
+        assert len(iterm.calls) == calls
+        # Probes that time out keep it open
+        while iterm.calls.count(applescript.PROBE_SCRIPT) < 2:
+            await asyncio.sleep(0.01)
+        assert applescript.breaker.opened_at is not None
+        # The first probe that gets an answer closes it
+        iterm.down = False
+        while applescript.breaker.opened_at is not None:
+            await asyncio.sleep(0.01)
+        return await applescript.run("write", timeout=0.01)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert applescript.breaker.timeouts == 0
+
+
+def test_script_errors_do_not_count_as_timeouts(iterm):
+    async def failing(script):
+        raise RuntimeError("AppleScript error: no such session")
+
+    applescript.set_executor(failing)
+    for _ in range(applescript.BREAKER_THRESHOLD + 1):
+        with pytest.raises(RuntimeError, match="no such session"):
+            asyncio.run(applescript.run("write"))
+    assert applescript.breaker.opened_at is None
+
+
+def test_invalid_timeout_env_is_ignored(monkeypatch, capsys):
+    for raw in ("abc", "-1", "0", "nan", "inf"):
+        monkeypatch.setenv("ITERM_MCP_SCRIPT_TIMEOUT", raw)
+        assert applescript._env_seconds("ITERM_MCP_SCRIPT_TIMEOUT", 10.0) == 10.0
+        assert f"ITERM_MCP_SCRIPT_TIMEOUT={raw!r}" in capsys.readouterr().err
+    monkeypatch.setenv("ITERM_MCP_SCRIPT_TIMEOUT", "2.5")
+    assert applescript._env_seconds("ITERM_MCP_SCRIPT_TIMEOUT", 10.0) == 2.5
+
+
+def test_parse_source_nested_lists():
+    assert parse_source('{{1, 2.5, -3}, {}, {{"a"}, true, false}}') == [[1, 2.5, -3], [], [["a"], True, False]]
+    assert parse_source("{1.0E+3}") == [1000.0]
+
+
+def test_parse_source_strings_with_escapes_and_delimiters():
+    text = r'{"say \"hi\", {ok}", "back\\slash", "tab\there", "two\nlines", "a|b:c"}'
+    assert parse_source(text) == ['say "hi", {ok}', "back\\slash", "tab\there", "two\nlines", "a|b:c"]
+    # A raw newline inside a string, as some results print it
+    assert parse_source('{"one\ntwo"}') == ["one\ntwo"]
+
+
+def test_parse_source_missing_values_and_records():
+    assert parse_source('{"x", missing value}') == ["x", None]
+    assert parse_source('{name:"w", |tab count|:2, tty:missing value}') == {
+        "name": "w", "tab count": 2, "tty": None,
+    }
+    assert parse_source("missing value") is None
+
+
+@pytest.mark.parametrize("text", ["{1, 2", "{1 2}", "{1,}", "{1}}", "{1} 2", "{error}", ""])
+def test_parse_source_rejects_malformed_results(text):
+    with pytest.raises(ValueError):
+        parse_source(text)
+
+
+def test_inventory_round_trips_awkward_names():
+    fake = FakeITerm(sessions=6, panes_per_tab=2, tabs_per_window=2, time_scale=0)
+    awkward = ['say "hi"', "a, {b}", "back\\slash", "two\nlines", "", "plain"]
+    for (_, _, _, s), name in zip(fake.all_sessions(), awkward):
+        s["name"] = name
+    applescript.set_executor(fake.execute)
+    try:
+        sessions = asyncio.run(applescript.list_all_sessions())
+    finally:
+        applescript.set_executor(None)
+
+    assert [s["name"] for s in sessions] == awkward
+    assert [(s["window_id"], s["tab_index"]) for s in sessions] == [
+        (fake.windows[0]["id"], 1), (fake.windows[0]["id"], 1),
+        (fake.windows[0]["id"], 2), (fake.windows[0]["id"], 2),
+        (fake.windows[1]["id"], 1), (fake.windows[1]["id"], 1),
+    ]
+    assert [s["tty"] for s in sessions] == [s["tty"] for _, _, _, s in fake.all_sessions()]
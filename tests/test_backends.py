@@ -0,0 +1,104 @@
+"""Tests for behaviour both backends must share."""
+
+import asyncio
+import contextlib
+import os
+import tempfile
+
+from iterm2 import api_pb2 as pb
+
+from benchmarks.fake_api_server import FakeApiServer
+from benchmarks.fake_iterm import FakeITerm
+from iterm2_mcp import applescript
+from iterm2_mcp.backends.api import ApiBackend
+from iterm2_mcp.backends.applescript import AppleScriptBackend
+
+
+async def _with_api(fake: FakeITerm, scenario):
+    path = os.path.join(tempfile.mkdtemp(), "api.sock")
+    server = await FakeApiServer(fake, time_scale=0).start(path)
+    backend = ApiBackend(path)
+    try:
+        return await scenario(backend)
+    finally:
+        await backend.close()
+        await server.close()
+
+
+async def _changed(backend, session_id: str, baseline: str) -> bool:
+    updates = backend.screen_updates(session_id, baseline)
+    async with contextlib.aclosing(updates):
+        try:
+            await asyncio.wait_for(anext(updates), 2)
+        except asyncio.TimeoutError:
+            return False
+    return True
+
+
+def test_read_contents_is_the_screen_on_both_backends():
+    fake = FakeITerm(sessions=1, buffer_lines=1000, time_scale=0, screen_lines=24)
+    session = fake.windows[0]["tabs"][0][0]
+    applescript.set_executor(fake.execute)
+    try:
+        via_applescript = asyncio.run(AppleScriptBackend().read_contents(session["id"]))
+    finally:
+        applescript.set_executor(None)
+    via_api = asyncio.run(_with_api(fake, lambda b: b.read_contents(session["id"])))
+
+    assert via_api == "\n".join(session["contents"][-24:])
+    # osascript output comes back stripped
+    assert via_applescript == via_api.strip()
+
+
+def test_applescript_updates_count_a_change_since_the_baseline(monkeypatch):
+    monkeypatch.setattr("iterm2_mcp.backends.applescript.POLL_INTERVAL", 0.01)
+    fake = FakeITerm(sessions=1, buffer_lines=100, time_scale=0)
+    session = fake.windows[0]["tabs"][0][0]
+    backend = AppleScriptBackend()
+    applescript.set_executor(fake.execute)
+    try:
+        baseline = asyncio.run(backend.read_contents(session["id"]))
+        fake.type_text(session, "echo landed before the wait")
+        changed = asyncio.run(_changed(backend, session["id"], baseline))
+    finally:
+        applescript.set_executor(None)
+
+    assert changed
+
+
+def test_api_updates_count_a_change_since_the_baseline():
+    fake = FakeITerm(sessions=1, buffer_lines=100, time_scale=0)
+    session = fake.windows[0]["tabs"][0][0]
+
+    async def scenario(backend):
+        baseline = await backend.read_contents(session["id"])
+        fake.type_text(session, "echo landed before the wait")
+        return await _changed(backend, session["id"], baseline)
+
+    assert asyncio.run(_with_api(fake, scenario))
+
+
+class _Socket:
+    """Frames a websocket would deliver, then a clean close."""
+
+    def __init__(self, frames: list[bytes]):
+        self.frames = frames
+
+    async def __aiter__(self):
+        for frame in self.frames:
+            yield frame
+
+
+def test_api_read_loop_skips_undecodable_messages(capsys):
+    backend = ApiBackend("/nonexistent")
+    backend._pb = pb
+
+    async def scenario():
+        future = asyncio.get_running_loop().create_future()
+        backend._pending[7] = future
+        reply = pb.ServerOriginatedMessage(id=7).SerializeToString()
+        await backend._read_loop(_Socket([b"\x0a\xff", reply]))
+        return future.result()
+
+    assert asyncio.run(scenario()).id == 7
+    assert "dropping undecodable message" in capsys.readouterr().err
@@ -0,0 +1,97 @@
+"""Tests for tab colors written to pseudo-terminals."""
+
+import errno
+import os
+import pty
+import select
+from collections import OrderedDict
+
+import pytest
+
+from iterm2_mcp import colors
+
+
+@pytest.fixture
+def handles(monkeypatch):
+    """An empty handle cache, closed afterwards."""
+    cache = OrderedDict()
+    monkeypatch.setattr(colors, "_handles", cache)
+    yield cache
+    for tty in list(cache):
+        colors.close(tty)
+
+
+@pytest.fixture
+def ptys():
+    """Open pseudo-terminals on demand; yields a function returning ``(master, tty path)``."""
+    opened = []
+
+    def open_pty() -> tuple[int, str]:
+        master, slave = pty.openpty()
+        opened.extend((master, slave))
+        return master, os.ttyname(slave)
+
+    yield open_pty
+    for fd in opened:
+        os.close(fd)
+
+
+def _read(master: int) -> bytes:
+    """Read what the terminal received, until it has been quiet for 0.1s."""
+    data = b""
+    while select.select([master], [], [], 0.1)[0]:
+        data += os.read(master, 4096)
+    return data
+
+
+def test_write_sends_osc_6_to_the_tty(handles, ptys):
+    master, tty = ptys()
+
+    colors.write(tty, (124, 58, 237))
+
+    assert _read(master) == (
+        b"\x1b]6;1;bg;red;brightness;124\x07"
+        b"\x1b]6;1;bg;green;brightness;58\x07"
+        b"\x1b]6;1;bg;blue;brightness;237\x07"
+    )
+    colors.write(tty, None)
+    assert _read(master) == b"\x1b]6;1;bg;*;default\x07"
+    assert list(handles) == [tty]
+
+
+class _StaleHandle:
+    closed = False
+
+    def write(self, data):
+        raise OSError(errno.EIO, "Input/output error")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_stale_handle_is_reopened(handles, ptys):
+    master, tty = ptys()
+    stale = _StaleHandle()
+    handles[tty] = stale
+
+    colors.write(tty, (22, 163, 74))
+
+    assert stale.closed
+    assert handles[tty] is not stale
+    assert b"green;brightness;163" in _read(master)
+
+
+def test_least_recently_used_handle_is_evicted(handles, ptys):
+    ttys = [ptys()[1] for _ in range(colors.MAX_HANDLES + 1)]
+    for tty in ttys[:colors.MAX_HANDLES]:
+        colors.write(tty, (1, 2, 3))
+    colors.write(ttys[0], (1, 2, 3))
+
+    colors.write(ttys[-1], (1, 2, 3))
+
+    assert len(handles) == colors.MAX_HANDLES
+    assert ttys[1] not in handles
+    assert ttys[0] in handles and ttys[-1] in handles
@@ -0,0 +1,54 @@
+"""Tests for iterm_export_output against a synthetic history."""
+
+import asyncio
+import gzip
+import json
+
+from benchmarks.fake_iterm import SyntheticHistory
+from iterm2_mcp.scrollback import ScrollbackReader
+from iterm2_mcp.tools import output
+
+
+class _StuckReader:
+    """A pager whose cursor never moves forward."""
+
+    chunk_lines = 500
+
+    async def read(self, session_id, offset, count, use_cache=True):
+        return {"offset": 0, "lines": ["again"], "first_line": 0, "end_line": 100_000, "next_cursor": 0}
+
+
+def _export(monkeypatch, source, path, compress=True) -> dict:
+    async def resolve(identifier):
+        return {"session_id": "s", "name": "bench"}
+
+    if not isinstance(source, _StuckReader):
+        source = ScrollbackReader(source, output._strip_escape_sequences)
+    monkeypatch.setattr(output, "resolve_session", resolve)
+    monkeypatch.setattr(output, "_scrollback", source)
+    return json.loads(asyncio.run(output.iterm_export_output("bench", str(path), compress)))
+
+
+def test_exports_the_whole_history(monkeypatch, tmp_path):
+    result = _export(monkeypatch, SyntheticHistory(lines=12_345), tmp_path / "out.log")
+
+    assert result["path"].endswith("out.log.gz")
+    assert result["line_count"] == 12_345
+    with gzip.open(result["path"], "rt") as f:
+        lines = f.read().splitlines()
+    assert lines[-1] == output._strip_escape_sequences(SyntheticHistory.line(12_344))
+
+
+def test_stops_when_lines_are_reported_but_never_served(monkeypatch, tmp_path):
+    result = _export(
+        monkeypatch, SyntheticHistory(lines=5000, unserved=1234), tmp_path / "out.log", compress=False,
+    )
+
+    assert result["line_count"] == 5000 - 1234
+    assert result["file_bytes"] == result["bytes"]
+
+
+def test_stops_when_the_cursor_makes_no_progress(monkeypatch, tmp_path):
+    result = _export(monkeypatch, _StuckReader(), tmp_path / "out.log", compress=False)
+
+    assert result["line_count"] == 1
@@ -0,0 +1,107 @@
+"""Tests for the job runner against a simulated iTerm2."""
+
+import asyncio
+import subprocess
+
+from conftest import call
+from iterm2_mcp import applescript, backends
+from iterm2_mcp.tools import jobs
+
+
+def _run(args: dict) -> dict:
+    return asyncio.run(call("iterm_run_jobs", dict(args, wait=5)))
+
+
+def test_sentinel_reports_exit_status_and_output(fake_iterm, monkeypatch):
+    monkeypatch.setattr(jobs, "POLL_INTERVAL", 0.01)
+    pane = fake_iterm.windows[0]["tabs"][0][0]
+
+    run = _run({"commands": ["echo hello", "false"], "sessions": pane["id"], "parallelism": 1})
+
+    assert run["status"] == "done"
+    assert [j["status"] for j in run["jobs"]] == ["done", "failed"]
+    assert [j["exit_status"] for j in run["jobs"]] == [0, 1]
+    assert run["jobs"][0]["output"] == "hello"
+
+
+def test_sentinel_survives_separators_and_comments(fake_iterm, monkeypatch):
+    """What the runner types must still print the sentinel in a real bash."""
+    sent = []
+
+    async def capture(session_id, text):
+        sent.append(text)
+        return False
+
+    monkeypatch.setattr(backends.get(), "send_text", capture)
+    pane = fake_iterm.windows[0]["tabs"][0][0]
+    for command in ["echo a;", "true &", "echo b # note"]:
+        job = {"command": command}
+        asyncio.run(jobs._run_job(job, pane["id"], 0, 5))
+        shell = subprocess.run(["bash"], input=sent[-1] + "\n", capture_output=True, text=True, timeout=10)
+        assert f"{jobs.SENTINEL_MARKER} " in shell.stdout, (command, shell.stderr)
+        assert "exit=0" in shell.stdout
+
+
+def test_timed_out_job_is_interrupted(fake_iterm, monkeypatch):
+    monkeypatch.setattr(jobs, "POLL_INTERVAL", 0.01)
+    pane = fake_iterm.windows[0]["tabs"][0][0]
+
+    run = _run({"commands": ["sleep 30", "echo next"], "sessions": pane["id"], "timeout": 0.05})
+
+    assert [j["status"] for j in run["jobs"]] == ["timed_out", "done"]
+    assert any(line.endswith("^C") for line in pane["contents"])
+
+
+def test_closed_pane_fails_its_job_and_the_rest_of_the_queue(fake_iterm, monkeypatch):
+    monkeypatch.setattr(jobs, "POLL_INTERVAL", 0.01)
+    tab = fake_iterm.windows[0]["tabs"][0]
+    pane = tab[0]
+
+    async def scenario():
+        started = await call("iterm_run_jobs", {"commands": ["sleep 30", "echo never"], "sessions": pane["id"]})
+        await asyncio.sleep(0.05)
+        tab.remove(pane)
+        return await call("iterm_job_status", {"run_id": started["run_id"], "wait": 5})
+
+    run = asyncio.run(scenario())
+
+    assert run["status"] == "done"
+    assert [j["status"] for j in run["jobs"]] == ["failed", "failed"]
+    assert run["jobs"][1]["error"] == "No worker panes left."
+
+
+def test_unreachable_iterm_does_not_leave_jobs_running(fake_iterm, monkeypatch):
+    monkeypatch.setattr(jobs, "POLL_INTERVAL", 0.01)
+    backend = backends.get()
+    failing, other = [s for _, _, _, s in fake_iterm.all_sessions()][:2]
+    fetch = backend.fetch
+
+    async def down(*args):
+        raise applescript.CircuitOpen("iTerm2 is not responding.")
+
+    async def fetch_or_fail(session_id, start, count):
+        if session_id == failing["id"]:
+            await down()
+        return await fetch(session_id, start, count)
+
+    async def scenario():
+        started = await call("iterm_run_jobs", {
+            "commands": ["sleep 30", "sleep 30"], "sessions": f"{failing['id']},{other['id']}",
+        })
+        run_id = started["run_id"]
+        await asyncio.sleep(0.05)
+        monkeypatch.setattr(backend, "fetch", fetch_or_fail)
+        monkeypatch.setattr(backend, "session_tty", down)
+        await asyncio.sleep(0.1)
+        during = await call("iterm_job_status", {"run_id": run_id})
+        # The healthy pane's job is unaffected; ending the run must not strand it
+        jobs._tasks[run_id].cancel()
+        return during, await call("iterm_job_status", {"run_id": run_id, "wait": 5})
+
+    during, after = asyncio.run(scenario())
+
+    assert during["status"] == "running"
+    assert [j["status"] for j in during["jobs"]] == ["failed", "running"]
+    assert "not responding" in during["jobs"][0]["error"]
+    assert after["status"] == "done"
+    assert [j["status"] for j in after["jobs"]] == ["failed", "failed"]
@@ -0,0 +1,69 @@
+"""Tests for metrics recorded from several threads."""
+
+import threading
+
+from iterm2_mcp import metrics
+
+
+def test_record_is_thread_safe(monkeypatch):
+    monkeypatch.setattr(metrics, "_stats", {})
+    monkeypatch.setattr(metrics, "_gauges", {})
+
+    def work():
+        for i in range(5000):
+            metrics.record("offloaded", 0.001, bytes_in=1)
+            if i % 500 == 0:
+                metrics.snapshot()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    op = metrics.snapshot()["operations"]["offloaded"]
+    assert op["calls"] == 40_000
+    assert op["bytes_in"] == 40_000
+
+
+def test_record_waits_for_the_lock(monkeypatch):
+    monkeypatch.setattr(metrics, "_stats", {})
+    finished = threading.Event()
+
+    def work():
+        metrics.record("locked", 0.001)
+        finished.set()
+
+    with metrics._lock:
+        thread = threading.Thread(target=work)
+        thread.start()
+        assert not finished.wait(0.05)
+    thread.join(5)
+    assert finished.is_set()
+
+
+def test_copies_are_consistent_while_threads_record(monkeypatch):
+    monkeypatch.setattr(metrics, "_stats", {})
+    monkeypatch.setattr(metrics, "_gauges", {})
+    monkeypatch.setattr(metrics, "_enabled", True)
+    stop = threading.Event()
+
+    def work(n):
+        i = 0
+        while not stop.is_set():
+            metrics.record(f"op{n}.{i % 50}", 0.002)
+            metrics.set_gauge(f"gauge{n}.{i % 50}", i)
+            i += 1
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        for _ in range(30):
+            stats, _ = metrics._copy()
+            assert all(sum(s["buckets"]) == s["calls"] for s in stats.values())
+            metrics.prometheus_text()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
@@ -0,0 +1,99 @@
+"""Tests for output reads: per-client state, watching, escape stripping."""
+
+import asyncio
+import random
+
+from conftest import call
+from iterm2_mcp import backends, offload, scheduler
+from iterm2_mcp.tools import output
+
+
+async def _watch_as(client: dict, session_id: str) -> dict:
+    token = scheduler.current_client.set(client)
+    try:
+        return await call("iterm_watch_session", {"identifier": session_id})
+    finally:
+        scheduler.current_client.reset(token)
+
+
+def test_watch_cursors_are_kept_per_client(fake_iterm):
+    session = fake_iterm.windows[0]["tabs"][0][0]
+    a, b = {"id": "c1"}, {"id": "c2"}
+
+    async def scenario():
+        await _watch_as(a, session["id"])
+        fake_iterm.type_text(session, "echo hello")
+        first = await _watch_as(a, session["id"])
+        second = await _watch_as(b, session["id"])
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert "hello" in first["new_output"]
+    assert second["is_first_read"] is True
+    assert "hello" in second["new_output"]
+
+
+def test_disconnect_drops_the_clients_state(fake_iterm):
+    session = fake_iterm.windows[0]["tabs"][0][0]
+    asyncio.run(_watch_as({"id": "c9"}, session["id"]))
+    assert ("c9", session["id"]) in output._watch_cursors
+
+    scheduler.client_disconnected("c9")
+
+    assert not any(key[0] == "c9" for key in output._watch_cursors)
+
+
+def test_chunked_strip_matches_unchunked_across_open_osc():
+    # A multi-line OSC 1337 payload straddles every chunk boundary
+    line = "\x1b[32mok\x1b[0m 6;1;bg;red;brightness;5 done\n"
+    osc = "\x1b]1337;File=name=x:\n" + "A" * 80 + "\n\x07"
+    text = (line * 900 + osc) * 40
+
+    assert output._strip_escape_sequences(text) == output._strip(text)
+
+
+def test_chunked_strip_matches_unchunked_on_random_buffers():
+    rng = random.Random(48)
+    parts = [
+        "plain line\n", "\x1b[1;31mred\x1b[0m\n", "$ 6;1;bg;green;brightness;200\n",
+        "\x1b]1337;SetMark\x07", "\x1b]1337;File=x:\n" + "B" * 500 + "\n", "\x07",
+        "\x1b]133;A\x1b\\", "\n" * 3,
+    ]
+    for _ in range(20):
+        text = "".join(rng.choice(parts) for _ in range(rng.randint(5_000, 20_000)))
+        assert output._strip_escape_sequences(text) == output._strip(text)
+
+
+def test_read_output_strips_an_osc_split_by_the_chunk_boundary(fake_iterm):
+    session = fake_iterm.windows[0]["tabs"][0][0]
+    # A multi-line OSC opens in the first chunk and closes in the second
+    rows = offload.CHUNK_BYTES // 100
+    osc = ["\x1b]1337;File=y:"] + ["Q" * 99] * 20 + ["\x07done"]
+    session["contents"] = ["x" * 99] * (rows - 10) + osc + ["$ "]
+    fake_iterm.screen_lines = len(session["contents"])
+
+    result = asyncio.run(call("iterm_read_output", {"identifier": session["id"], "lines": 0}))
+
+    assert "Q" not in result["output"]
+    assert "done" in result["output"]
+
+
+def test_watch_falls_back_to_polling_when_updates_fail(fake_iterm, monkeypatch):
+    monkeypatch.setattr(output, "UPDATE_POLL_INTERVAL", 0.01)
+    session = fake_iterm.windows[0]["tabs"][0][0]
+
+    async def dropped(session_id, baseline=None):
+        raise RuntimeError("iTerm2 API connection closed.")
+        yield
+
+    monkeypatch.setattr(backends.get(), "screen_updates", dropped)
+
+    async def scenario():
+        await call("iterm_watch_session", {"identifier": session["id"]})
+        asyncio.get_running_loop().call_later(0.05, fake_iterm.type_text, session, "echo late")
+        return await call("iterm_watch_session", {"identifier": session["id"], "wait": 5})
+
+    result = asyncio.run(scenario())
+
+    assert "late" in result["new_output"]
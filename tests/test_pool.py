@@ -0,0 +1,65 @@
+"""Tests for the session pool and iterm_acquire_session."""
+
+import asyncio
+
+import pytest
+
+from conftest import call
+from iterm2_mcp import applescript, backends, pool, scheduler
+
+
+def test_unmovable_pooled_session_goes_back_to_the_pool(fake_iterm, monkeypatch):
+    backend = backends.get()
+    pooled_session = fake_iterm.windows[0]["tabs"][0][1]
+    pooled_session["name"] = pool.POOL_NAME
+    pooled = {"session_id": pooled_session["id"], "tty": pooled_session["tty"]}
+    monkeypatch.setattr(pool, "ensure_started", lambda: None)
+    monkeypatch.setattr(pool, "_idle", pool.deque([pooled]))
+    monkeypatch.setattr(backend, "can_move_sessions", True)
+    target = fake_iterm.windows[0]["tabs"][0][0]
+
+    result = asyncio.run(call("iterm_acquire_session", {"name": "build", "window_identifier": target["id"]}))
+
+    assert result["pooled"] is False
+    assert list(pool._idle) == [pooled]
+    assert pooled_session["name"] == pool.POOL_NAME
+
+
+def test_created_session_is_set_up_at_read_priority(fake_iterm, monkeypatch):
+    backend = backends.get()
+    seen = []
+    set_name = backend.set_name
+
+    async def record_priority(session_id, name):
+        seen.append(scheduler.current_priority())
+        return await set_name(session_id, name)
+
+    monkeypatch.setattr(backend, "set_name", record_priority)
+    monkeypatch.setattr(pool, "_window_id", fake_iterm.windows[0]["id"])
+
+    async def create():
+        with scheduler.priority(scheduler.BACKGROUND):
+            return await pool._create()
+
+    created = asyncio.run(create())
+
+    assert seen == [scheduler.READ]
+    assert created["session_id"] == fake_iterm.windows[0]["tabs"][-1][0]["id"]
+
+
+def test_pooled_session_goes_back_when_renaming_fails(fake_iterm, monkeypatch):
+    backend = backends.get()
+    pooled_session = fake_iterm.windows[0]["tabs"][0][1]
+    pooled = {"session_id": pooled_session["id"], "tty": pooled_session["tty"]}
+    monkeypatch.setattr(pool, "ensure_started", lambda: None)
+    monkeypatch.setattr(pool, "_idle", pool.deque([pooled]))
+
+    async def unreachable(session_id, name):
+        raise applescript.ScriptTimeout("AppleScript timed out.")
+
+    monkeypatch.setattr(backend, "set_name", unreachable)
+
+    with pytest.raises(Exception, match="timed out"):
+        asyncio.run(call("iterm_acquire_session", {"name": "build"}))
+
+    assert list(pool._idle) == [pooled]
@@ -0,0 +1,79 @@
+"""Tests for process snapshots against real processes on a pseudo-terminal."""
+
+import asyncio
+import fcntl
+import os
+import pty
+import shutil
+import subprocess
+import termios
+import time
+
+import pytest
+
+from iterm2_mcp import processes
+
+pytestmark = pytest.mark.skipif(
+    not (shutil.which("ps") and shutil.which("bash") and shutil.which("sleep")),
+    reason="needs ps, bash and sleep",
+)
+
+
+def _take_terminal():
+    # Become a session leader with the pty slave (stdin) as controlling terminal
+    os.setsid()
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+
+@pytest.fixture
+def terminal():
+    """Run a command on a new pty; yields a function taking the argv."""
+    master, slave = pty.openpty()
+    procs = []
+
+    def spawn(argv: list[str]) -> str:
+        procs.append(subprocess.Popen(
+            argv, stdin=slave, stdout=slave, stderr=slave, preexec_fn=_take_terminal,
+        ))
+        return os.ttyname(slave)
+
+    yield spawn
+    for p in procs:
+        p.kill()
+        p.wait()
+    os.close(master)
+    os.close(slave)
+
+
+def _summary(tty: str, want: int) -> dict:
+    """Summarize the TTY once *want* processes are on it."""
+    deadline = time.monotonic() + 5
+    while True:
+        found = asyncio.run(processes._run_ps()).get(processes.tty_key(tty), [])
+        if len(found) >= want or time.monotonic() > deadline:
+            return processes.summarize(found)
+        time.sleep(0.05)
+
+
+def test_shell_without_a_foreground_job_is_idle(terminal):
+    tty = terminal(["sleep", "30"])
+
+    summary = _summary(tty, 1)
+
+    assert summary["state"] == "idle"
+    assert summary["shell"]["command"] == "sleep 30"
+
+
+def test_foreground_job_makes_the_terminal_busy(terminal):
+    # bash -m runs the command as a job in its own foreground process group
+    tty = terminal(["bash", "-m", "-c", "sleep 30; true"])
+
+    summary = _summary(tty, 2)
+
+    assert summary["state"] == "busy"
+    assert summary["shell"]["command"].startswith("bash")
+    assert summary["foreground"]["command"] == "sleep 30"
+
+
+def test_terminal_without_processes_is_none():
+    assert processes.summarize([])["state"] == "none"
@@ -0,0 +1,66 @@
+"""Tests for per-call profiling."""
+
+import asyncio
+import importlib
+import json
+import threading
+
+from iterm2_mcp import offload, profiling
+
+
+def test_unknown_env_mode_is_ignored(monkeypatch, capsys):
+    monkeypatch.setenv("ITERM_MCP_PROFILE", "1")
+    try:
+        module = importlib.reload(profiling)
+        assert module.status()["mode"] == "off"
+        assert "ignoring ITERM_MCP_PROFILE='1'" in capsys.readouterr().err
+    finally:
+        monkeypatch.delenv("ITERM_MCP_PROFILE")
+        importlib.reload(profiling)
+
+
+def test_cprofile_status_warns_about_concurrent_calls(monkeypatch):
+    monkeypatch.setattr(profiling, "_mode", "cprofile")
+    assert profiling.status()["note"] == profiling.CPROFILE_NOTE
+
+
+def test_spans_are_written_after_the_call_returns(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "TRACE_DIR", tmp_path)
+    monkeypatch.setattr(profiling, "_mode", "spans")
+    monkeypatch.setattr(profiling, "_sample_rate", 1.0)
+    release = threading.Event()
+    writers = []
+    write_spans = profiling._write_spans
+
+    def slow_write(tool, events):
+        writers.append(threading.current_thread())
+        release.wait(5)
+        write_spans(tool, events)
+
+    monkeypatch.setattr(profiling, "_write_spans", slow_write)
+
+    @profiling.wrap("demo")
+    async def handler():
+        with profiling.span("stage"):
+            await offload.run(offload.THRESHOLD, _offloaded_stage)
+            return "ok"
+
+    async def scenario():
+        # The call returns while its trace is still being written
+        result = await asyncio.wait_for(handler(), 1)
+        release.set()
+        await asyncio.gather(*profiling._writes)
+        return result
+
+    assert asyncio.run(scenario()) == "ok"
+    assert writers and writers[0] is not threading.main_thread()
+    [path] = tmp_path.iterdir()
+    events = {e["name"]: e for e in json.loads(path.read_text())["traceEvents"]}
+    assert list(events) == ["offloaded", "stage", "demo"]
+    assert events["demo"]["tid"] == events["stage"]["tid"] == threading.main_thread().ident
+    assert events["offloaded"]["tid"] != events["stage"]["tid"]
+
+
+def _offloaded_stage() -> None:
+    with profiling.span("offloaded"):
+        pass
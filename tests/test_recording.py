@@ -0,0 +1,45 @@
+"""Tests for recording tool calls and replaying the trace."""
+
+import asyncio
+
+from benchmarks import replay_trace
+from conftest import call
+from iterm2_mcp import recording
+
+
+def test_recorded_trace_replays(fake_iterm, monkeypatch, tmp_path):
+    monkeypatch.setenv("ITERM_SESSION_ID", "")
+    trace = tmp_path / "trace.jsonl"
+    name = fake_iterm.windows[0]["tabs"][0][1]["name"]
+
+    async def session():
+        await call("iterm_list_sessions", {"fields": "session_id,name"})
+        await call("iterm_send_command", {"identifier": name, "command": "echo hi"})
+        await call("iterm_read_output", {"identifier": name, "lines": 5})
+        await call("iterm_get_session_by_name", {"name": "qqqq"})
+
+    recording.start(str(trace))
+    try:
+        asyncio.run(session())
+    finally:
+        recording.stop()
+
+    calls = replay_trace.load(str(trace))
+    assert [c["tool"] for c in calls] == [
+        "iterm_list_sessions", "iterm_send_command", "iterm_read_output", "iterm_get_session_by_name",
+    ]
+    assert calls[1]["args"] == {"identifier": name, "command": "echo hi"}
+    assert calls[3]["error"] == "response"
+
+    report = asyncio.run(replay_trace.replay(
+        calls, "applescript", speed=0, concurrency=1, session_count=4,
+        buffer_lines=100, time_scale=0, workdir=str(tmp_path),
+    ))
+
+    assert report["summary"]["calls"] == 4
+    assert report["summary"]["errors"] == 0
+    tools = report["tools"]
+    assert set(tools) == {c["tool"] for c in calls}
+    assert tools["iterm_get_session_by_name"]["error_responses"] == 1
+    assert tools["iterm_read_output"]["error_responses"] == 0
+    assert tools["iterm_send_command"]["error_responses"] == 0
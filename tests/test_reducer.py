@@ -0,0 +1,59 @@
+"""Tests for output payload reduction."""
+
+from iterm2_mcp.reducer import reduce_lines
+
+
+def test_frames_of_one_bar_keep_the_last():
+    lines = [
+        "Downloading [=>        ] 10%",
+        "Downloading [=====>    ] 50%",
+        "Downloading [==========] 100%",
+        "done",
+    ]
+    assert reduce_lines(lines)[0] == ["Downloading [==========] 100%", "done"]
+
+
+def test_tqdm_frames_merge_despite_the_leading_percentage():
+    lines = ["45%|████▌     | 450/1000", "90%|█████████ | 900/1000"]
+    assert reduce_lines(lines)[0] == ["90%|█████████ | 900/1000"]
+
+
+def test_rows_of_percentages_are_not_progress():
+    shards = ["shard 1: 100% passed", "shard 2: 97% passed", "shard 3: 88% passed"]
+    coverage = ["src/a1.py 120 10 92%", "src/a2.py 80 4 95%"]
+    assert reduce_lines(shards)[0] == shards
+    assert reduce_lines(coverage)[0] == coverage
+
+
+def test_bars_with_different_labels_stay_apart():
+    lines = ["shard 1 [====      ] 40%", "shard 2 [=======   ] 70%"]
+    assert reduce_lines(lines)[0] == lines
+
+
+def test_carriage_return_rewrites_keep_the_final_frame():
+    assert reduce_lines(["10%\r50%\r100% ok\r"])[0] == ["100% ok"]
+
+
+def test_identical_runs_collapse_with_a_count():
+    assert reduce_lines(["a", "a", "a", "b"])[0] == ["a ×3", "b"]
+
+
+def test_long_lines_are_truncated():
+    line = reduce_lines(["x" * 50], max_line_bytes=10)[0][0]
+    assert line == "x" * 10 + " …[+40 bytes]"
+
+
+def test_budget_includes_the_omission_marker():
+    lines = [f"line {i:04d}" for i in range(1000)]
+    for max_bytes in (40, 64, 100, 1000):
+        kept, stats = reduce_lines(lines, max_bytes=max_bytes)
+        assert stats["reduced_bytes"] <= max_bytes
+        assert kept[0].startswith("…[")
+        assert kept[-1] == "line 0999"
+        omitted = int(kept[0][2:].split()[0])
+        assert omitted + len(kept) - 1 == 1000
+
+
+def test_budget_too_small_for_the_marker_returns_nothing():
+    kept, stats = reduce_lines([f"line {i:04d}" for i in range(1000)], max_bytes=20)
+    assert kept == [] and stats["reduced_bytes"] == 0
@@ -0,0 +1,54 @@
+"""Tests for tool-slot scheduling."""
+
+import asyncio
+import time
+
+from iterm2_mcp import scheduler
+
+
+def test_waiting_handler_releases_its_slot(monkeypatch):
+    monkeypatch.setattr(scheduler.tools, "limit", 1)
+    order = []
+
+    @scheduler.wrap
+    async def waiter(done: asyncio.Event):
+        async with scheduler.released():
+            await done.wait()
+        order.append("waiter")
+
+    @scheduler.wrap
+    async def quick():
+        order.append("quick")
+
+    async def scenario():
+        done = asyncio.Event()
+        task = asyncio.create_task(waiter(done))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(quick(), 1)
+        done.set()
+        await task
+
+    asyncio.run(scenario())
+
+    assert order == ["quick", "waiter"]
+    assert scheduler.tools._running == 0
+
+
+def test_watch_session_wait_does_not_hold_a_slot(fake_iterm, monkeypatch):
+    from conftest import call
+
+    monkeypatch.setattr(scheduler.tools, "limit", 1)
+    session = fake_iterm.windows[0]["tabs"][0][0]
+
+    async def scenario():
+        await call("iterm_watch_session", {"identifier": session["id"]})
+        start = time.perf_counter()
+        watch = asyncio.create_task(call("iterm_watch_session", {"identifier": session["id"], "wait": 1}))
+        await asyncio.sleep(0.05)
+        await call("iterm_list_sessions", {})
+        listed = time.perf_counter() - start
+        await watch
+        return listed
+
+    assert asyncio.run(scenario()) < 0.5
+    assert scheduler.tools._running == 0
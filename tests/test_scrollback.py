@@ -0,0 +1,111 @@
+"""Tests for cursor-based scrollback paging (no iTerm2 needed)."""
+
+import asyncio
+
+from benchmarks.fake_iterm import FakeITerm, SyntheticHistory
+from iterm2_mcp import applescript
+from iterm2_mcp.backends.applescript import AppleScriptBackend
+from iterm2_mcp.scrollback import ScrollbackReader
+from iterm2_mcp.tools.output import _strip_escape_sequences
+
+
+def _reader(source, **kwargs) -> ScrollbackReader:
+    return ScrollbackReader(source, _strip_escape_sequences, **kwargs)
+
+
+def test_reads_a_range_of_a_huge_history_in_few_fetches():
+    source = SyntheticHistory(lines=5_000_000)
+    reader = _reader(source)
+
+    page = asyncio.run(reader.read("s", 10_000, 500))
+
+    assert page["offset"] == 10_000
+    assert page["end_line"] == 5_000_000
+    assert page["next_cursor"] == 10_500
+    assert page["lines"][0] == _strip_escape_sequences(SyntheticHistory.line(10_000))
+    assert page["lines"][-1] == _strip_escape_sequences(SyntheticHistory.line(10_499))
+    assert source.fetches == 1
+
+
+def test_cursor_stays_on_the_same_line_as_output_grows():
+    source = SyntheticHistory(lines=2_000_000)
+    reader = _reader(source)
+
+    async def scenario():
+        first = await reader.read("s", 1_000_000, 250)
+        source.append(100_000)
+        second = await reader.read("s", first["next_cursor"], 250)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert second["offset"] == 1_000_250
+    assert second["lines"][0] == _strip_escape_sequences(SyntheticHistory.line(1_000_250))
+    # The second page came from the chunk cached by the first
+    assert source.fetches == 1
+
+
+def test_evicted_lines_move_the_page_to_first_line():
+    source = SyntheticHistory(lines=1_000_000, retained=100_000)
+    reader = _reader(source)
+
+    page = asyncio.run(reader.read("s", 0, 300))
+
+    assert page["first_line"] == 900_000
+    assert page["offset"] == 900_000
+    assert len(page["lines"]) == 300
+    assert page["next_cursor"] == 900_300
+
+
+def test_pages_past_a_chunk_straddling_first_line():
+    source = SyntheticHistory(lines=10_000, retained=9_750)
+    reader = _reader(source)
+
+    page = asyncio.run(reader.read("s", 250, 500))
+
+    assert len(page["lines"]) == 500
+    assert page["next_cursor"] == 750
+
+
+def test_paging_ends_when_the_source_serves_fewer_lines_than_end_line():
+    # end_line says 100_000, but the last 40 lines never come back
+    source = SyntheticHistory(lines=100_000, unserved=40)
+    reader = _reader(source)
+
+    async def read_all():
+        cursor, count = 99_000, 0
+        for _ in range(10):
+            page = await reader.read("s", cursor, 500)
+            count += len(page["lines"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return count
+        raise AssertionError("paging did not terminate")
+
+    assert asyncio.run(read_all()) == 960
+
+
+def test_applescript_fetch_keeps_trailing_blank_lines():
+    fake = FakeITerm(sessions=1, buffer_lines=10, time_scale=0)
+    session = fake.windows[0]["tabs"][0][0]
+    session["contents"] += ["done", "", ""]
+    applescript.set_executor(fake.execute)
+    try:
+        first, end, lines = asyncio.run(AppleScriptBackend().fetch(session["id"], 0, 500))
+    finally:
+        applescript.set_executor(None)
+
+    assert (first, end) == (0, 13)
+    assert lines[-3:] == ["done", "", ""]
+
+
+def test_applescript_fetch_sees_only_the_screen():
+    fake = FakeITerm(sessions=1, buffer_lines=1000, time_scale=0, screen_lines=24)
+    session = fake.windows[0]["tabs"][0][0]
+    applescript.set_executor(fake.execute)
+    try:
+        first, end, lines = asyncio.run(AppleScriptBackend().fetch(session["id"], 0, 500))
+    finally:
+        applescript.set_executor(None)
+
+    assert (first, end) == (0, 24)
+    assert lines == session["contents"][-24:]
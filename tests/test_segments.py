@@ -0,0 +1,40 @@
+"""Tests for prompt-aware command segmentation."""
+
+from iterm2_mcp.segments import CommandSegmenter
+from iterm2_mcp.tools.output import _strip_escape_sequences
+
+
+def _segmenter(patterns=None) -> CommandSegmenter:
+    return CommandSegmenter(_strip_escape_sequences, patterns)
+
+
+def test_output_lines_that_look_like_prompts_stay_output():
+    segmenter = _segmenter()
+    segmenter.update([
+        "user@bench:~/proj$ git push",
+        "git@github.com: 50% done",
+        "# comment printed by a script",
+        "$ not a prompt either",
+        "user@bench:~/proj$ ",
+    ])
+
+    [block] = segmenter.last_blocks(1)
+    assert block["command"] == "git push"
+    assert block["output"] == "git@github.com: 50% done\n# comment printed by a script\n$ not a prompt either"
+
+
+def test_bare_dollar_prompt_is_opt_in():
+    segmenter = _segmenter([r"^\$ (?P<command>.*)$"])
+    segmenter.update(["$ make", "ok", "$ "])
+
+    [block] = segmenter.last_blocks(1)
+    assert (block["command"], block["output"]) == ("make", "ok")
+
+
+def test_last_blocks_does_not_change_parser_state():
+    segmenter = _segmenter()
+    segmenter.update(["user@bench:~/proj$ ls", "a b c", "\x1b]133;A\x07user@bench:~/proj$ "])
+
+    segmenter.last_blocks(1)
+
+    assert segmenter.uses_marks is False
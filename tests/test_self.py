@@ -0,0 +1,59 @@
+"""Tests for the "self" identifier and the SessionStart hook."""
+
+import asyncio
+
+from conftest import call
+from hooks import session_start
+from iterm2_mcp import colors, sessions
+
+
+def _agent_session(fake_iterm, monkeypatch) -> dict:
+    """Put the agent in its own (not frontmost) window and export its ID."""
+    window = fake_iterm._new_window()
+    session = fake_iterm._new_session()
+    window["tabs"].append([session])
+    monkeypatch.setenv("ITERM_SESSION_ID", f"w1t0p0:{session['id']}")
+    return session
+
+
+def test_set_colors_understands_self(fake_iterm, monkeypatch):
+    me = _agent_session(fake_iterm, monkeypatch)
+    try:
+        result = asyncio.run(call("iterm_set_colors", {"sessions": {"self": "success"}}))
+    finally:
+        colors.close(me["tty"])
+
+    assert result["errors"] == []
+    assert result["colored"][0]["session_id"] == me["id"]
+    with open(me["tty"]) as f:
+        assert "\x1b]6;1;bg;" in f.read()
+
+
+def test_new_tab_beside_self_on_a_cold_inventory(fake_iterm, monkeypatch):
+    me = _agent_session(fake_iterm, monkeypatch)
+    window = fake_iterm.windows[-1]
+
+    result = asyncio.run(call("iterm_new_tab", {"window_identifier": "self"}))
+
+    assert [tab[0]["id"] for tab in window["tabs"]] == [me["id"], result["session_id"]]
+
+
+def test_session_start_hook_registers_the_terminal(fake_iterm, monkeypatch, capsys):
+    me = _agent_session(fake_iterm, monkeypatch)
+    monkeypatch.setattr(session_start, "_terminal", lambda: me["tty"])
+
+    assert session_start.main() == 0
+
+    assert "iTerm2 session registered" in capsys.readouterr().out
+    entry = sessions.load_state()["sessions"][me["tty"]]
+    assert entry["iterm_session_id"] == me["id"]
+    # No inventory has run: self still knows its TTY from the registration
+    assert sessions.self_session()["tty"] == me["tty"]
+
+
+def test_session_start_hook_outside_iterm(monkeypatch, capsys):
+    monkeypatch.delenv("ITERM_SESSION_ID", raising=False)
+    monkeypatch.setattr(session_start, "_terminal", lambda: "/dev/ttys001")
+
+    assert session_start.main() == 0
+    assert "not running inside iTerm2" in capsys.readouterr().out
@@ -0,0 +1,29 @@
+"""Tests for session lookup and listing."""
+
+import asyncio
+
+from conftest import call
+
+
+def test_get_session_by_name_limit_zero_returns_every_match(fake_iterm):
+    result = asyncio.run(call("iterm_get_session_by_name", {"name": "session", "limit": 0}))
+
+    assert result["total"] == 4
+    assert result["next_cursor"] is None
+    assert len(result["sessions"]) == 4
+
+
+def test_get_session_by_name_pages_with_a_cursor(fake_iterm):
+    async def pages():
+        first = await call("iterm_get_session_by_name", {"name": "session", "limit": 3, "fields": "name"})
+        rest = await call("iterm_get_session_by_name", {
+            "name": "session", "limit": 3, "fields": "name", "cursor": first["next_cursor"],
+        })
+        return first, rest
+
+    first, rest = asyncio.run(pages())
+
+    assert first["next_cursor"] == "3"
+    assert rest["next_cursor"] is None
+    names = [s["name"] for s in first["sessions"] + rest["sessions"]]
+    assert sorted(names) == [f"session-{i}" for i in range(4)]
@@ -0,0 +1,31 @@
+"""Tests for the background warm-up."""
+
+import asyncio
+
+from iterm2_mcp import pool, sessions, startup, topology
+
+
+def test_warm_up_baselines_the_inventory(fake_iterm, monkeypatch):
+    monkeypatch.setattr(startup, "_timings", {})
+    monkeypatch.setattr(pool, "ensure_started", lambda: None)
+
+    asyncio.run(startup._warm_up())
+
+    assert "warmup_ms" in startup.timings()
+    assert topology.version() > 0
+    assert len(topology.current()) == 4
+
+
+def test_pool_starts_even_if_the_warm_up_fails(monkeypatch):
+    async def broken():
+        raise ValueError("unexpected")
+
+    started = []
+    monkeypatch.setattr(startup, "_timings", {})
+    monkeypatch.setattr(sessions, "list_sessions", broken)
+    monkeypatch.setattr(pool, "ensure_started", lambda: started.append(True))
+
+    asyncio.run(startup._warm_up())
+
+    assert started == [True]
+    assert startup.timings()["warmup_error"] == "ValueError: unexpected"
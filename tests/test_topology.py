@@ -0,0 +1,79 @@
+"""Tests for inventory versions and change tracking."""
+
+from collections import deque
+
+import pytest
+
+from iterm2_mcp import topology
+
+
+def _session(sid: str, name: str = "", window: str = "1", tab: int = 1) -> dict:
+    return {"session_id": sid, "name": name or sid, "tty": f"/dev/{sid}",
+            "window_id": window, "window_name": "w", "tab_index": tab}
+
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    topology.reset()
+    monkeypatch.setattr(topology, "_listeners", [])
+    yield
+    topology.reset()
+
+
+def test_first_inventory_is_the_baseline():
+    assert topology.observe([_session("a")]) == []
+    assert topology.version() == 1
+    assert topology.changes_since(1) == []
+
+
+def test_added_removed_renamed_and_moved():
+    topology.observe([_session("a"), _session("b"), _session("c")])
+
+    changes = topology.observe([
+        _session("a", name="build"), _session("b", window="2", tab=3), _session("d"),
+    ])
+
+    by_type = {c["type"]: c for c in changes}
+    assert set(by_type) == {"added", "removed", "renamed", "moved"}
+    assert by_type["added"]["session_id"] == "d"
+    assert by_type["removed"] == {"type": "removed", "session_id": "c", "name": "c", "tty": "/dev/c", "version": 2}
+    assert (by_type["renamed"]["old_name"], by_type["renamed"]["name"]) == ("a", "build")
+    assert by_type["moved"]["from"] == {"window_id": "1", "tab_index": 1}
+    assert by_type["moved"]["to"] == {"window_id": "2", "tab_index": 3}
+    assert topology.version() == 2
+    assert topology.changes_since(1) == changes
+
+
+def test_unchanged_inventory_keeps_the_version():
+    topology.observe([_session("a")])
+    assert topology.observe([_session("a")]) == []
+    assert topology.version() == 1
+
+
+def test_unknown_or_evicted_versions_reset(monkeypatch):
+    monkeypatch.setattr(topology, "_log", deque(maxlen=5))
+    topology.observe([])
+    for i in range(8):
+        topology.observe([_session(f"s{j}") for j in range(i + 1)])
+
+    assert topology.version() == 9
+    assert topology.changes_since(0) is None
+    assert topology.changes_since(42) is None
+    # Only versions 5..9 are still logged
+    assert topology.changes_since(3) is None
+    assert [c["version"] for c in topology.changes_since(5)] == [6, 7, 8, 9]
+
+
+def test_a_failing_listener_does_not_stop_the_others(capsys):
+    seen = []
+
+    def broken(changes):
+        raise KeyError("boom")
+
+    topology.subscribe(broken)
+    topology.subscribe(seen.append)
+    topology.observe([_session("a")])
+    topology.observe([])
+
+    assert [c["type"] for c in seen[0]] == ["removed"]
+    assert "topology listener" in capsys.readouterr().err
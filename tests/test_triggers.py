@@ -0,0 +1,46 @@
+"""Tests for trigger scanning on a screen-only (AppleScript) backend."""
+
+import asyncio
+
+from conftest import call
+from iterm2_mcp import colors
+from iterm2_mcp.tools import triggers
+from iterm2_mcp.tools.triggers import _scrolled
+
+
+def test_scrolled_finds_the_previous_last_line():
+    previous = ["a", "b", "c", "$ make"]
+    assert _scrolled(previous, ["a", "b", "c", "$ make", "ok"]) == 3
+    assert _scrolled(previous, ["c", "$ make", "x", "y"]) == 1
+    assert _scrolled(previous, ["b", "c", "$ make all", "x"]) == 2
+    assert _scrolled(previous, ["p", "q", "r"]) is None
+    assert _scrolled(["$ "], ["$ make", "ok"]) == 0
+
+
+def test_matches_lines_that_scrolled_the_screen(fake_iterm, monkeypatch):
+    monkeypatch.setattr(triggers, "_ensure_loop", lambda: None)
+    session = fake_iterm.windows[0]["tabs"][0][0]
+    trigger = asyncio.run(call("iterm_add_trigger", {"identifier": session["id"], "pattern": "ERROR"}))
+    try:
+        # Ten new lines scroll the 24-row screen; the match is mid-screen
+        fake_iterm.type_text(session, "; ".join(
+            ["echo step"] * 4 + ["echo ERROR disk full"] + ["echo step"] * 5,
+        ))
+        state = triggers._watched[session["id"]]
+        asyncio.run(triggers._scan(session["id"], state))
+        asyncio.run(triggers._scan(session["id"], state))
+        found = triggers._triggers[trigger["trigger_id"]]
+    finally:
+        triggers.clear()
+
+    assert found["matches"] == 1
+    assert found["last_match"]["line"] == "ERROR disk full"
+
+
+def test_a_failing_color_change_does_not_stop_notifications(monkeypatch):
+    async def broken(session_id, color):
+        raise RuntimeError("AppleScript error")
+
+    monkeypatch.setattr(colors, "apply", broken)
+    trigger = {"trigger_id": "t1", "session_id": "s", "color": "alert", "client": None}
+    asyncio.run(triggers._notify(trigger, [{"line": "ERROR"}]))